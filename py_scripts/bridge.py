@@ -0,0 +1,325 @@
+"""
+單一 process 的 FPGA → Unity bridge（取代同時執行
+python_uart_to_json.py + python_json_to_command.py 兩個 process）。
+
+    decoder ──queue──▶ translator ──queue──▶ emitter
+    PacketStream        translate()           CommandWriter
+    decode_record
+
+- 每個 stage 一個 thread，stage 之間是有界的 queue.Queue，直接傳 state dict，
+  不經過 JSON 序列化 / 檔案輪詢。queue 滿時上游會等（backpressure）。
+- 射擊目標只看目前這次狀態轉移（shot_target），SHOOT_INTO_LOAD 不等下一個封包；
+  --check-target 在下一輪開始時核對。
+- 每個狀態在各 stage 的進出都記 monotonic_ns，結束時印出每個 stage 的延遲；
+  --trace 另存 Chrome trace JSON（latency_trace.py）。
+
+Usage:
+    python bridge.py                          # 讀 COM_PORT，寫 ../Commands/NNN.txt
+    python bridge.py --replay game_logs/events.bin --stats
+    python bridge.py --trace bridge_trace.json && python latency_trace.py bridge_trace.json
+    python bridge.py --sim-games 100 --stats --dst /tmp/commands   # 不接硬體（fpga_sim）
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from command_channel import CommandWriter, add_channel_args, open_channel
+from event_log import EventLogWriter, read_log
+from latency_trace import TraceRing, add_trace_args
+from packet_stream import PacketStream, decode_record, print_link_stats
+from python_json_to_command import DST_DIR, TargetCheck, add_check_args, default_state, translate
+from python_uart_to_json import BAUD_RATE, COM_PORT, EVENT_LOG
+
+QUEUE_SIZE = 64         # 每個 stage 之間最多排隊的狀態數
+STATS_WINDOW = 10000    # 延遲統計保留最近幾個狀態
+
+_STOP = object()        # queue 結束標記
+
+
+class _Trace:
+    """一個狀態經過 pipeline 的時間戳（monotonic_ns）"""
+
+    __slots__ = ("seq", "rx", "found", "logged", "decoded", "translate_in", "translate_out", "emit_in", "emit_out")
+
+    def __init__(self, seq, rx, found):
+        self.seq = seq
+        self.rx = rx            # serial 讀到資料（replay 時 = 送出時間）
+        self.found = found      # decoder 拿到完整封包
+        self.logged = self.decoded = self.translate_in = self.translate_out = self.emit_in = self.emit_out = 0
+
+    # latency_trace 的 stage 名稱 ← 欄位
+    STAGES = (("serial_read", "rx"), ("header_found", "found"), ("logged", "logged"), ("parsed", "decoded"),
+              ("detected", "translate_in"), ("translated", "translate_out"), ("command_written", "emit_out"))
+
+    def mark(self, tracer):
+        for stage, field in self.STAGES:
+            t = getattr(self, field)
+            if t:
+                tracer.mark(self.seq, stage, t)
+
+
+# ================================================================
+#   Stats
+# ================================================================
+class PipelineStats:
+    """各 stage 延遲（ns），只保留最近 STATS_WINDOW 個狀態"""
+
+    # (名稱, 起點欄位, 終點欄位)
+    SPANS = (
+        ("serial read → packet", "rx", "found"),
+        ("decode", "found", "decoded"),
+        ("queue → translator", "decoded", "translate_in"),
+        ("translate", "translate_in", "translate_out"),
+        ("queue → emitter", "translate_out", "emit_in"),
+        ("emit", "emit_in", "emit_out"),
+        ("total", "rx", "emit_out"),
+    )
+
+    def __init__(self, window=STATS_WINDOW):
+        self.traces = deque(maxlen=window)
+        self.states = 0
+        self.commands = 0
+
+    def record(self, trace, n_commands):
+        self.traces.append(trace)
+        self.states += 1
+        self.commands += n_commands
+
+    def summary(self):
+        """{span 名稱: (p50, p95, p99, max) 微秒}"""
+        if not self.traces:
+            return {}
+        out = {}
+        for name, start, end in self.SPANS:
+            us = np.array([getattr(t, end) - getattr(t, start) for t in self.traces], dtype=np.float64) / 1e3
+            out[name] = (*np.percentile(us, [50, 95, 99]), us.max())
+        return out
+
+    def print_summary(self):
+        print(f"\n{'='*60}")
+        print(f"Bridge latency ({len(self.traces)} of {self.states} states, {self.commands} commands)")
+        print(f"{'='*60}")
+        print(f"{'stage':<22} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10} {'max us':>10}")
+        for name, (p50, p95, p99, mx) in self.summary().items():
+            print(f"{name:<22} {p50:>10.1f} {p95:>10.1f} {p99:>10.1f} {mx:>10.1f}")
+        print(f"{'='*60}\n")
+
+
+# ================================================================
+#   Stages
+# ================================================================
+def uart_packets(ser, stream=None):
+    """
+    yield (t_rx_ns, packet)；packet 是 PacketStream buffer 的 memoryview。
+    ser 有 eof 屬性（fpga_sim.SimulatedSerial）時，資料送完就結束。
+    stream: 事先建立的 PacketStream（要從外面查 stream.stats() 時傳入）
+    """
+    if stream is None:
+        stream = PacketStream()
+    stream.source = ser
+    while not getattr(ser, "eof", False):
+        stream.fill()
+        for packet in stream.packets():
+            yield stream.last_read_ns, packet
+
+
+def serial_packets(port=COM_PORT, baud=BAUD_RATE, stream=None):
+    import serial
+
+    with serial.Serial(port, baud, timeout=0.1) as ser:
+        print(f"Listening on {port} at {baud}...")
+        yield from uart_packets(ser, stream)
+
+
+def replay_packets(log_path, realtime=False):
+    """
+    yield event log 內的封包（離線重播 / 量測用）。
+    realtime=True 時依照錄製時的間隔送出，否則全速送出（queue 會塞滿）。
+    """
+    start = t0 = None
+    for t_ns, packet in read_log(log_path):
+        if realtime:
+            if start is None:
+                start, t0 = time.monotonic_ns(), t_ns
+            delay = (t_ns - t0) - (time.monotonic_ns() - start)
+            if delay > 0:
+                time.sleep(delay / 1e9)
+        yield time.monotonic_ns(), packet
+
+
+class Bridge:
+    """
+    bridge = Bridge(serial_packets())
+    bridge.run()            # 直到來源結束或 stop()
+    """
+
+    def __init__(self, packets, channel=None, event_log=EVENT_LOG, queue_size=QUEUE_SIZE, tracer=None,
+                 check=None):
+        """
+        packets: iterable of (t_rx_ns, 14-byte packet)
+        channel: command_channel 的 CommandWriter / CommandServer（None = 寫到 DST_DIR）
+        event_log: 同時把原始封包寫入 event log（None = 不寫）
+        tracer: latency_trace.TraceRing；每個狀態送出後記下各 stage 時間（None = 不記）
+        check: python_json_to_command.TargetCheck（None = 不核對射擊目標）
+        """
+        self.packets = packets
+        self.tracer = tracer
+        self.check = check
+        self.channel = channel if channel is not None else CommandWriter(DST_DIR)
+        self.event_log = event_log
+        self.states = queue.Queue(maxsize=queue_size)      # decoder → translator
+        self.commands = queue.Queue(maxsize=queue_size)    # translator → emitter
+        self.stats = PipelineStats()
+        self._stop = threading.Event()
+        self._errors = []
+
+    # ---------------- decoder ----------------
+    def _decode(self):
+        log = EventLogWriter(self.event_log) if self.event_log else None
+        try:
+            for seq, (t_rx, packet) in enumerate(self.packets):
+                trace = _Trace(seq, t_rx, time.monotonic_ns())
+                if self._stop.is_set():
+                    break
+                if log is not None:
+                    log.append(packet, t_rx)
+                    trace.logged = time.monotonic_ns()
+                state = decode_record(packet)
+                trace.decoded = time.monotonic_ns()
+                self._put(self.states, (trace, state))
+        finally:
+            if log is not None:
+                log.close()
+            self._put(self.states, _STOP)
+
+    # ---------------- translator ----------------
+    def _translate(self):
+        old_state = default_state
+        while True:
+            item = self.states.get()
+            if item is _STOP:
+                break
+            trace, new_state = item
+            trace.translate_in = time.monotonic_ns()
+            commands = translate(old_state, new_state)
+            trace.translate_out = time.monotonic_ns()
+            if self.check is not None:
+                self.check(trace.seq, old_state, new_state)
+            old_state = new_state
+            self._put(self.commands, (trace, commands))
+        self._put(self.commands, _STOP)
+
+    # ---------------- emitter ----------------
+    def _emit(self):
+        while True:
+            item = self.commands.get()
+            if item is _STOP:
+                break
+            trace, commands = item
+            trace.emit_in = time.monotonic_ns()
+            self.channel.write_batch(commands)
+            trace.emit_out = time.monotonic_ns()
+            self.stats.record(trace, len(commands))
+            if self.tracer is not None:
+                trace.mark(self.tracer)
+
+    # ---------------- control ----------------
+    def _put(self, q, item):
+        # stop() 之後下游可能不再讀，不能一直卡在滿的 queue 上
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    return
+
+    def _guard(self, stage):
+        def run():
+            try:
+                stage()
+            except BaseException as e:      # run() 在 main thread 重新 raise
+                self._errors.append(e)
+                self._stop.set()
+        return run
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        """啟動三個 stage，等到來源結束（或 Ctrl+C）"""
+        if self.event_log:
+            os.makedirs(os.path.dirname(self.event_log), exist_ok=True)
+
+        threads = [threading.Thread(target=self._guard(stage), name=name, daemon=True)
+                   for name, stage in (("decoder", self._decode),
+                                       ("translator", self._translate),
+                                       ("emitter", self._emit))]
+        for t in threads:
+            t.start()
+        try:
+            # 等 emitter 結束（decoder 結束後 _STOP 會一路傳下去）
+            while threads[-1].is_alive() and not self._errors:
+                threads[-1].join(timeout=0.2)
+        except KeyboardInterrupt:
+            print("\nExiting...")
+            self.stop()
+        if self._errors:
+            raise self._errors[0]
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FPGA UART → Unity command bridge (single process)")
+    parser.add_argument("--port", default=COM_PORT)
+    parser.add_argument("--baud", type=int, default=BAUD_RATE)
+    parser.add_argument("--replay", metavar="EVENTS_BIN", help="從 event log 重播，不開 serial port")
+    parser.add_argument("--sim-games", type=int, metavar="N",
+                        help="不接 FPGA：用 fpga_sim 以 BuckshotEnv 產生 N 局的 UART 資料")
+    parser.add_argument("--realtime", action="store_true",
+                        help="--replay 依錄製間隔、--sim-games 依 baud rate 送出（預設全速）")
+    parser.add_argument("--dst", default=DST_DIR, help="Unity 讀取 command 的資料夾（--transport file）")
+    add_channel_args(parser)
+    parser.add_argument("--no-event-log", action="store_true", help="不寫 game_logs/events.bin")
+    parser.add_argument("--stats", action="store_true", help="結束時印出各 stage 延遲")
+    add_check_args(parser)
+    add_trace_args(parser)
+    args = parser.parse_args()
+
+    link = PacketStream()       # UART 封包檢查 / resync 計數（--replay 不經過）
+    if args.replay:
+        link = None
+        packets = replay_packets(args.replay, args.realtime)
+    elif args.sim_games:
+        from fpga_sim import SimulatedSerial, env_game_packets
+        packets = uart_packets(SimulatedSerial(env_game_packets(args.sim_games), baud=args.baud,
+                                               realtime=args.realtime), link)
+    else:
+        packets = serial_packets(args.port, args.baud, link)
+    event_log = None if args.no_event_log or args.replay or args.sim_games else EVENT_LOG
+    tracer = TraceRing(name="bridge") if args.trace else None
+    check = TargetCheck() if args.check_target else None
+    bridge = Bridge(packets, channel=open_channel(args, args.dst), event_log=event_log, tracer=tracer,
+                    check=check)
+    try:
+        bridge.run()
+    finally:
+        bridge.channel.close()
+        if tracer is not None:
+            print(f"Trace saved to {tracer.save(args.trace)}")
+        if check is not None:
+            print(check.summary())
+        if args.stats:
+            bridge.stats.print_summary()
+            if link is not None:
+                print_link_stats(link)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+離線分析錄好的遊戲 session（FPGA UART 封包）。
+
+    ingest : events.bin / raw UART 擷取檔 / 舊的 state{N}.json 資料夾
+             → 每個 session 一個 NumPy structured array（store/<name>.npy）
+    report : 讀整個 store，以 game 為單位做 vectorized group-by：
+             回合數、每種道具使用次數、每一槍的傷害、每個 FSM 狀態停留的時間
+
+時間欄位 t_ns 是收到封包的 monotonic_ns（event log）或 json 檔的 mtime；
+raw 擷取檔沒有時間（t_ns = -1），不列入時間統計。
+
+Usage:
+    python capture_analytics.py ingest session_logs/*.bin game_logs/ --store analytics
+    python capture_analytics.py report --store analytics --games-csv games.csv
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+from event_log import MAGIC, read_log
+from packet_stream import HP_DEAD, INTO_DONE, PACKET_DTYPE, STATE_MAP, PacketStream, decode_packets
+
+NO_TIME = -1
+CAPTURE_DTYPE = np.dtype([("t_ns", np.int64)] + PACKET_DTYPE.descr)
+
+ITEM_LETTERS = "MCHSBPR"            # 道具編號 8~14（同 python_json_to_command.item_map）
+FIRST_ITEM = 8
+N_ITEMS = len(ITEM_LETTERS)
+# 這些 state 的封包代表「輪到 P0 / P1」；下一包就是該玩家的動作結果
+P0_WAIT = (11, 13)
+P1_WAIT = (12, 14)
+SHOT_RESULTS = (10, 13, 14, 15)     # SHOOT_PROC 之後的狀態
+ITEM_RESULTS = (9, 11, 12)          # ITEM_PROC 之後的狀態
+
+GAME_DTYPE = np.dtype([
+    ("session", np.int32),
+    ("game", np.int32),             # session 內第幾局
+    ("packets", np.int32),
+    ("duration_s", np.float64),     # 第一包到最後一包（沒有時間為 nan）
+    ("winner", np.int8),            # 0 = P0, 1 = P1, -1 = 沒打完
+    ("shots", np.int32, (2,)),      # [P0, P1] 開槍次數（= 回合數）
+    ("damage_taken", np.int32, (2,)),
+    ("items_used", np.int32, (2, N_ITEMS)),
+    ("think_s", np.float64, (2,)),  # 輪到該玩家到他動作的時間總和
+])
+
+
+# ================================================================
+#   Ingest
+# ================================================================
+def _with_time(packets, t_ns):
+    out = np.empty(len(packets), dtype=CAPTURE_DTYPE)
+    out["t_ns"] = t_ns
+    for name in PACKET_DTYPE.names:
+        out[name] = packets[name]
+    return out
+
+
+def _from_event_log(path):
+    records = read_log(path)
+    packets = decode_packets(b"".join(p for _, p in records))
+    return _with_time(packets, np.fromiter((t for t, _ in records), dtype=np.int64, count=len(records)))
+
+
+def _from_raw(data):
+    # 經過 PacketStream 的檢查，錯位 / bit error 的封包不會進 store
+    stream = PacketStream(capacity=1 << 16)
+    chunks = []
+    for start in range(0, len(data), 1 << 15):
+        stream.feed(memoryview(data)[start:start + (1 << 15)])
+        chunks.append(stream.read_batch())
+    packets = np.concatenate(chunks) if chunks else np.empty(0, dtype=PACKET_DTYPE)
+    return _with_time(packets, NO_TIME)
+
+
+def _from_json_dir(path):
+    files = {int(m.group(1)): os.path.join(path, name) for name in os.listdir(path)
+             if (m := re.fullmatch(r"state(\d+)\.json", name))}
+    out = np.empty(len(files), dtype=CAPTURE_DTYPE)
+    for row, n in enumerate(sorted(files)):
+        with open(files[n], encoding="utf-8") as f:
+            s = json.load(f)
+        g, a, r, b = s["game_info"], s["active_items"], s["bullet_report"], s["bullets"]
+        out[row] = (os.stat(files[n]).st_mtime_ns,
+                    g["winner"], g["state_code"], g["turn_player_a"], g["turn_player_b"],
+                    a["saw"], a["reverse"], a["handcuff"],
+                    r["valid"], r["is_live"], r["index"],
+                    s["hp"]["p0"], s["hp"]["p1"],
+                    b["total"], b["remain"], b["filled_count"], b["empty_count"],
+                    b["bitmap_ptr"], b["bitmap_int"],
+                    s["items_p0"][:6], s["items_p1"][:6])
+    return out
+
+
+def load_source(path):
+    """events.bin / raw 擷取檔 / state{N}.json 資料夾 → CAPTURE_DTYPE array"""
+    if os.path.isdir(path):
+        return _from_json_dir(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MAGIC)] == MAGIC:
+        return _from_event_log(path)
+    return _from_raw(data)
+
+
+def ingest(paths, store):
+    """把每個來源存成 store/<檔名>_<內容 hash>.npy；同樣內容再 ingest 會跳過。回傳新增的檔案"""
+    os.makedirs(store, exist_ok=True)
+    added = []
+    for path in paths:
+        arr = load_source(path)
+        if len(arr) == 0:
+            continue
+        stem = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        digest = hashlib.sha1(arr.tobytes()).hexdigest()[:10]
+        dst = os.path.join(store, f"{stem}_{digest}.npy")
+        if not os.path.exists(dst):
+            np.save(dst, arr)
+            added.append(dst)
+    return added
+
+
+def load_store(store):
+    """store 內所有 session 接在一起 → (CAPTURE_DTYPE array, 每包的 session 編號, session 名稱 list)"""
+    files = sorted(glob.glob(os.path.join(store, "*.npy")))
+    arrays = [np.load(f, mmap_mode="r") for f in files]
+    names = [os.path.splitext(os.path.basename(f))[0] for f in files]
+    if not arrays:
+        return np.empty(0, dtype=CAPTURE_DTYPE), np.empty(0, dtype=np.int32), names
+    session = np.repeat(np.arange(len(arrays), dtype=np.int32), [len(a) for a in arrays])
+    return np.concatenate(arrays), session, names
+
+
+def export_parquet(arr, session, path):
+    """攤平成一欄一個 field 的 Parquet（需要 pyarrow）"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("--parquet requires pyarrow (pip install pyarrow)")
+    columns = {"session": session}
+    for name in CAPTURE_DTYPE.names:
+        col = arr[name]
+        if col.ndim == 1:
+            columns[name] = col
+        else:
+            for i in range(col.shape[1]):
+                columns[f"{name}_{i}"] = col[:, i]
+    pq.write_table(pa.table(columns), path)
+
+
+# ================================================================
+#   Analysis
+# ================================================================
+def _hp(values):
+    hp = values.astype(np.int16)
+    hp[hp == HP_DEAD] = -1
+    return hp
+
+
+def _group_quantiles(groups, values, n_groups, qs):
+    """每個 group 的 quantile（一次 lexsort，不用逐 group 迴圈）→ (n_groups, len(qs))，空的 group 為 nan"""
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    out = np.full((n_groups, len(qs)), np.nan)
+    has = counts > 0
+    for j, q in enumerate(qs):
+        idx = starts[has] + np.floor(q * (counts[has] - 1)).astype(np.intp)
+        out[has, j] = sorted_values[idx]
+    return out
+
+
+class SessionAnalysis:
+    """
+    a = SessionAnalysis(*load_store("analytics")[:2])
+    a.games            → GAME_DTYPE array（一局一列）
+    a.state_times()    → {state name: (count, mean, p50, p95, total) 秒}
+    """
+
+    def __init__(self, arr, session):
+        self.arr = arr
+        n = len(arr)
+        state = arr["state_code"].astype(np.intp)
+        t = arr["t_ns"]
+
+        # ----- game 切分：session 開頭，或前一包是 INTO_DONE -----
+        first = np.ones(n, dtype=bool)
+        first[1:] = session[1:] != session[:-1]
+        new_game = first.copy()
+        new_game[1:] |= state[:-1] == INTO_DONE
+        game = np.cumsum(new_game) - 1
+        n_games = int(game[-1]) + 1 if n else 0
+        starts = np.flatnonzero(new_game)
+
+        # ----- 每個轉移（前一包 → 這一包）是誰的動作 -----
+        prev_state = np.empty_like(state)
+        prev_state[0] = -1
+        prev_state[1:] = state[:-1]
+        actor = np.full(n, -1, dtype=np.intp)
+        actor[np.isin(prev_state, P0_WAIT)] = 0
+        actor[np.isin(prev_state, P1_WAIT)] = 1
+        actor[new_game] = -1
+        acted = actor >= 0
+        shot = acted & np.isin(state, SHOT_RESULTS)
+        item = acted & np.isin(state, ITEM_RESULTS)
+
+        # ----- 傷害：被射中的 hp 減少量 -----
+        hp = np.stack([_hp(arr["hp_p0"]), _hp(arr["hp_p1"])], axis=1)
+        prev_hp = np.roll(hp, 1, axis=0)
+        damage = np.where(shot[:, None], np.maximum(prev_hp - hp, 0), 0)
+
+        # ----- 道具：上一包有、這一包變 0 就是被用掉（LOAD 只補空格） -----
+        items = np.concatenate([arr["items_p0"], arr["items_p1"]], axis=1).astype(np.intp)
+        prev_items = np.roll(items, 1, axis=0)
+        used = item[:, None] & (prev_items != 0) & (items == 0)
+        rows, cols = np.nonzero(used)
+        item_key = (game[rows] * 2 + cols // 6) * N_ITEMS + prev_items[rows, cols] - FIRST_ITEM
+
+        # ----- 停留時間：這一包到同 session 下一包 -----
+        dwell = np.full(n, np.nan)
+        if n > 1:
+            ok = ~first[1:] & (t[:-1] != NO_TIME) & (t[1:] != NO_TIME)
+            dwell[:-1][ok] = (t[1:][ok] - t[:-1][ok]) / 1e9
+        timed = ~np.isnan(dwell)
+        think_player = np.where(np.isin(state, P0_WAIT), 0, np.where(np.isin(state, P1_WAIT), 1, -1))
+        thinking = timed & (think_player >= 0)
+
+        games = np.zeros(n_games, dtype=GAME_DTYPE)
+        if n_games:
+            games["session"] = session[starts]
+            session_first_game = np.maximum.accumulate(np.where(first, game, 0))
+            games["game"] = (game - session_first_game)[starts]
+            games["packets"] = np.bincount(game, minlength=n_games)
+            valid_t = np.where(t != NO_TIME, t, np.iinfo(np.int64).max)
+            t0 = np.minimum.reduceat(valid_t, starts)
+            t1 = np.maximum.reduceat(t, starts)
+            games["duration_s"] = np.where(t0 <= t1, (t1 - t0) / 1e9, np.nan)
+            last = np.append(starts[1:], n) - 1
+            winner = arr["winner"][last].astype(np.int8)
+            # winner = {PlayerA, PlayerB}：0b10 → P1（PlayerA），0b01 → P0
+            games["winner"] = np.where(state[last] != INTO_DONE, -1, np.where(winner == 0b10, 1, 0))
+            games["shots"] = np.bincount(game[shot] * 2 + actor[shot], minlength=2 * n_games).reshape(-1, 2)
+            for p in (0, 1):
+                games["damage_taken"][:, p] = np.bincount(game, weights=damage[:, p], minlength=n_games)
+                sel = thinking & (think_player == p)
+                games["think_s"][:, p] = np.bincount(game[sel], weights=dwell[sel], minlength=n_games)
+            games["items_used"] = np.bincount(item_key, minlength=n_games * 2 * N_ITEMS).reshape(-1, 2, N_ITEMS)
+
+        self.games = games
+        self.state = state
+        self.dwell = dwell
+        self.damage_per_shot = damage[shot].sum(axis=1)
+        self.actions = np.bincount(actor[acted], minlength=2)
+
+    def state_times(self):
+        """每個封包 state 的停留時間 {state name: (count, mean, p50, p95, total)}，單位秒"""
+        timed = ~np.isnan(self.dwell)
+        codes, dwell = self.state[timed], self.dwell[timed]
+        counts = np.bincount(codes, minlength=16)
+        totals = np.bincount(codes, weights=dwell, minlength=16)
+        q = _group_quantiles(codes, dwell, 16, (0.5, 0.95))
+        return {STATE_MAP[c]: (int(counts[c]), totals[c] / counts[c], q[c, 0], q[c, 1], totals[c])
+                for c in np.flatnonzero(counts)}
+
+    def print_report(self):
+        g = self.games
+        done = g["winner"] >= 0
+        print(f"\n{'='*64}")
+        print(f"{len(np.unique(g['session']))} sessions, {len(g)} games ({done.sum()} finished), "
+              f"{len(self.arr)} packets")
+        print(f"wins: P0 {np.sum(g['winner'] == 0)}, P1 {np.sum(g['winner'] == 1)}")
+        print(f"{'='*64}")
+
+        shots = g["shots"].sum(axis=0)
+        print(f"turns (shots) per finished game: mean {g['shots'][done].sum(axis=1).mean() if done.any() else 0:.1f}"
+              f"   total P0 {shots[0]}, P1 {shots[1]}")
+        hist = np.bincount(self.damage_per_shot, minlength=3) if len(self.damage_per_shot) else np.zeros(3, int)
+        mean = self.damage_per_shot.mean() if len(self.damage_per_shot) else 0.0
+        print(f"damage per shot: mean {mean:.2f}   " +
+              "  ".join(f"{d} dmg: {n}" for d, n in enumerate(hist)))
+
+        used = g["items_used"].sum(axis=0)
+        print(f"\n{'item':<6}" + "".join(f"{c:>7}" for c in ITEM_LETTERS))
+        for p in (0, 1):
+            print(f"{'P' + str(p):<6}" + "".join(f"{n:>7}" for n in used[p]))
+
+        times = self.state_times()
+        if times:
+            print(f"\n{'state':<20} {'count':>8} {'mean s':>9} {'p50 s':>9} {'p95 s':>9} {'total s':>10}")
+            for name, (count, mean, p50, p95, total) in times.items():
+                print(f"{name:<20} {count:>8} {mean:>9.3f} {p50:>9.3f} {p95:>9.3f} {total:>10.1f}")
+            think = g["think_s"].sum(axis=0)
+            print("think time per action: " + "   ".join(
+                f"P{p} {think[p] / self.actions[p]:.3f} s" for p in (0, 1) if self.actions[p]))
+        print(f"{'='*64}\n")
+
+
+def save_games_csv(games, names, path):
+    header = ["session", "game", "packets", "duration_s", "winner", "shots_p0", "shots_p1",
+              "damage_taken_p0", "damage_taken_p1", "think_s_p0", "think_s_p1"]
+    header += [f"{c}_p{p}" for p in (0, 1) for c in ITEM_LETTERS]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(",".join(header) + "\n")
+        for g in games:
+            row = [names[g["session"]], g["game"], g["packets"], f"{g['duration_s']:.3f}", g["winner"],
+                   *g["shots"], *g["damage_taken"], *(f"{x:.3f}" for x in g["think_s"]),
+                   *g["items_used"].ravel()]
+            f.write(",".join(map(str, row)) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline analytics over recorded FPGA sessions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ingest = sub.add_parser("ingest", help="events.bin / raw 擷取檔 / state{N}.json 資料夾 → store")
+    p_ingest.add_argument("sources", nargs="+")
+    p_ingest.add_argument("--store", default="analytics")
+    p_ingest.add_argument("--parquet", metavar="PATH", help="另外把整個 store 匯出成 Parquet（需要 pyarrow）")
+
+    p_report = sub.add_parser("report", help="印出整個 store 的統計")
+    p_report.add_argument("--store", default="analytics")
+    p_report.add_argument("--games-csv", metavar="PATH", help="一局一列的 CSV")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        added = ingest(args.sources, args.store)
+        print(f"Ingested {len(added)} new session(s) into {args.store}")
+        if args.parquet:
+            arr, session, _ = load_store(args.store)
+            export_parquet(arr, session, args.parquet)
+        return
+
+    arr, session, names = load_store(args.store)
+    if len(arr) == 0:
+        raise SystemExit(f"No sessions in {args.store}")
+    analysis = SessionAnalysis(arr, session)
+    analysis.print_report()
+    if args.games_csv:
+        save_games_csv(analysis.games, names, args.games_csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Unity command 的輸出通道。兩種 transport 有相同的 write_batch(commands) 介面：
+
+- CommandWriter（file，fallback）：寫檔到 Commands/，Unity 輪詢資料夾
+- CommandServer（tcp / unix）：本機 socket server，command 一產生就以
+  換行分隔推給已連線的 Unity，不需要列資料夾
+
+CommandWriter：一次狀態轉移產生的所有 command（通常 2~3 行）寫成一個檔案：
+先寫到 NNNNNN.tmp，再 os.replace 成 NNNNNN.txt。Unity 只讀 *.txt，
+rename 是 atomic，所以不會讀到寫一半的檔案（不再需要每個 command fsync）。
+
+durability:
+    "none" : 不 fsync（預設；當機時最後幾個 command 可能遺失，但 Unity 也跟著重來）
+    "file" : rename 前 fsync 檔案內容
+    "full" : 再 fsync 資料夾，rename 本身也落盤
+"""
+
+import os
+import queue
+import select
+import socket
+import threading
+import time
+
+DURABILITY_MODES = ("none", "file", "full")
+TRANSPORTS = ("file", "tcp", "unix")
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 50007
+BACKLOG_BATCHES = 256       # Unity 未連線 / 讀太慢時最多暫存的 batch 數，滿了 write_batch 就會等
+
+
+class CommandWriter:
+    """
+    writer = CommandWriter(dst_dir)
+    writer.write_batch(["QL", "(3,4)"])     # → dst_dir/000000.txt，一行一個 command
+    """
+
+    def __init__(self, dst_dir, durability="none", start=0):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}, got {durability!r}")
+        self.dst_dir = dst_dir
+        self.durability = durability
+        self.seq = start            # 下一個檔案編號
+        self.command_count = 0
+        os.makedirs(dst_dir, exist_ok=True)
+
+    def write_batch(self, commands):
+        """寫入一批 command（一個檔案），回傳檔案路徑；空的 batch 不寫檔，回傳 None"""
+        if not commands:
+            return None
+        name = f"{self.seq:06d}"
+        tmp = os.path.join(self.dst_dir, name + ".tmp")
+        path = os.path.join(self.dst_dir, name + ".txt")
+
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0))
+        try:
+            os.write(fd, ("\n".join(commands) + "\n").encode("utf-8"))
+            if self.durability != "none":
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp, path)
+        if self.durability == "full":
+            self._fsync_dir()
+
+        self.seq += 1
+        self.command_count += len(commands)
+        return path
+
+    def close(self):
+        pass            # 每個 batch 都已寫完，沒有要釋放的資源
+
+    def _fsync_dir(self):
+        # Windows 無法 open 資料夾；NTFS 的 rename 本身已有 journal
+        if os.name == "nt":
+            return
+        fd = os.open(self.dst_dir, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class CommandServer:
+    """
+    server = CommandServer(port=50007)            # 或 CommandServer(unix_path="/tmp/bs.sock")
+    server.write_batch(["QL", "(3,4)"])           # → client 收到 "#0 2\nQL\n(3,4)\n"
+
+    協定（一行一個，換行分隔）：
+        @<session>      每個連線的第一行；server 每次啟動不同
+        #<seq> <n>      batch header，後面接 n 行 command；seq 從 0 連續遞增
+
+    - 同一時間只服務一個 client（Unity）；斷線後等下一個連線，
+      送到一半失敗的 batch 會在重新連線後整批重送（at-least-once）。
+    - Unity 收齊一整個 batch 才把 command 排進佇列，並記住同一個 session
+      已執行到的 seq：重送的 batch（seq 不大於已執行的）整批丟掉，
+      不會重播開槍 / 道具；斷線時收到一半的 batch 也丟掉，等重送。
+    - 沒有 client 時 batch 先暫存；暫存滿了 write_batch 會阻塞，
+      讓上游（bridge 的 queue）一路 backpressure 回 decoder。
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, backlog=BACKLOG_BATCHES):
+        if unix_path is not None:
+            if os.path.exists(unix_path):
+                os.unlink(unix_path)
+            self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._listener.bind(unix_path)
+            self.address = unix_path
+        else:
+            self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._listener.bind((host, port))
+            self.address = self._listener.getsockname()
+        self._listener.listen(1)
+        self._listener.settimeout(0.2)
+        self.unix_path = unix_path
+
+        self._pending = queue.Queue(maxsize=backlog)
+        self._closed = threading.Event()
+        self.connected = threading.Event()
+        self.seq = 0                # 已交給 server 的 batch 數（= 下一個 batch 的 seq）
+        self.session = f"{os.getpid()}-{time.time_ns()}"
+        self.command_count = 0
+        self.connections = 0
+        self._thread = threading.Thread(target=self._serve, name="command-server", daemon=True)
+        self._thread.start()
+
+    def write_batch(self, commands):
+        """排入一批 command；暫存滿時阻塞。空的 batch 直接略過"""
+        if not commands:
+            return None
+        header = f"#{self.seq} {len(commands)}\n"
+        self._pending.put((header + "\n".join(commands) + "\n").encode("utf-8"))
+        self.seq += 1
+        self.command_count += len(commands)
+        return self.seq - 1
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                conn, _ = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return None             # listener 已關閉
+            conn.settimeout(None)
+            if conn.family == socket.AF_INET:
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connections += 1
+            self.connected.set()
+            return conn
+        return None
+
+    @staticmethod
+    def _peer_closed(conn):
+        # client 不會送資料；可讀只代表 EOF 或錯誤 → 送之前先檢查，避免資料寫進已斷線的 socket
+        readable, _, _ = select.select([conn], [], [], 0)
+        if not readable:
+            return False
+        try:
+            return conn.recv(4096) == b""
+        except OSError:
+            return True
+
+    def _serve(self):
+        retry = None        # 上一個連線送失敗的 batch
+        while not self._closed.is_set():
+            conn = self._accept()
+            if conn is None:
+                break
+            data = retry
+            try:
+                conn.sendall(f"@{self.session}\n".encode("utf-8"))
+                while not self._closed.is_set():
+                    data = retry
+                    if data is None:
+                        try:
+                            data = self._pending.get(timeout=0.2)
+                        except queue.Empty:
+                            if self._peer_closed(conn):
+                                break
+                            continue
+                    if self._peer_closed(conn):
+                        retry = data
+                        break
+                    conn.sendall(data)
+                    retry = None
+                    self._pending.task_done()
+            except OSError:
+                retry = data
+            finally:
+                self.connected.clear()
+                conn.close()
+
+    def drain(self, timeout=None):
+        """等到所有 batch 都送出（或 timeout 秒）；回傳是否送完"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._pending.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, drain_timeout=1.0):
+        """有 client 連線時先等暫存的 batch 送完（最多 drain_timeout 秒）再關閉"""
+        if self.connected.is_set():
+            self.drain(drain_timeout)
+        self._closed.set()
+        self._listener.close()
+        self._thread.join(timeout=1)
+        if self.unix_path is not None and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def add_channel_args(parser):
+    """bridge.py / python_json_to_command.py 共用的 transport 參數"""
+    parser.add_argument("--transport", choices=TRANSPORTS, default="file",
+                        help="file: 寫 Commands/*.txt；tcp / unix: socket 推送給 Unity")
+    parser.add_argument("--command-port", type=int, default=DEFAULT_PORT, help="--transport tcp 的 port")
+    parser.add_argument("--unix-socket", default=None, help="--transport unix 的 socket 路徑")
+    parser.add_argument("--durability", choices=DURABILITY_MODES, default="none",
+                        help="--transport file 的 fsync 模式（預設不 fsync，只靠 atomic rename）")
+
+
+def open_channel(args, dst_dir):
+    """依 add_channel_args 的參數建立 CommandWriter / CommandServer"""
+    if args.transport == "tcp":
+        return CommandServer(port=args.command_port)
+    if args.transport == "unix":
+        os.makedirs(dst_dir, exist_ok=True)
+        return CommandServer(unix_path=args.unix_socket or os.path.join(dst_dir, "commands.sock"))
+    return CommandWriter(dst_dir, args.durability)
@@ -0,0 +1,182 @@
+"""
+Append-only binary event log（取代每個封包一個 state{N}.json）。
+
+檔案格式：
+    header : MAGIC (8 bytes)
+    record : [u32 payload 長度][u64 monotonic_ns][payload][u32 crc32(時間戳 + payload)]
+
+- Writer 每筆 record 只呼叫一次 os.write（unbuffered, append）。
+- Reader 每次 poll 才開檔並以 mmap 讀取，只接受 crc 正確且完整的 record；
+  寫到一半的尾端 record 會在下次 poll 再讀，不會讀到半筆資料。
+- Writer 以 O_TRUNC 開始新 session；reader 發現檔案變小、被刪掉重建
+  （st_dev / st_ino 不同）或第一筆 record 不同時，從頭重讀。
+- 時間戳是 time.monotonic_ns()，同一台機器上跨 process 可直接相減算延遲。
+"""
+
+import mmap
+import os
+import struct
+import time
+import zlib
+
+MAGIC = b"BSEVLOG1"
+_HEAD = struct.Struct("<IQ")     # payload length, t_ns
+_CRC = struct.Struct("<I")
+RECORD_OVERHEAD = _HEAD.size + _CRC.size
+OPEN_RETRIES = 50       # Windows：reader 正在 poll（開著檔案）時截斷會失敗，稍等重試
+
+
+def _file_id(st):
+    """同一個檔案的識別；刪掉重建的檔案會不同（Windows 上 st_ino 是 NTFS file index）"""
+    return st.st_dev, st.st_ino
+
+
+class EventLogWriter:
+    """
+    with EventLogWriter(path) as log:
+        log.append(packet_bytes)
+    """
+
+    def __init__(self, path):
+        # 新 session：截斷舊檔，reader 看到檔案變小會自動從頭讀
+        self.path = path
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND | getattr(os, "O_BINARY", 0)
+        for attempt in range(OPEN_RETRIES):
+            try:
+                self._fd = os.open(path, flags)
+                break
+            except PermissionError:
+                if attempt == OPEN_RETRIES - 1:
+                    raise
+                time.sleep(0.01)
+        os.write(self._fd, MAGIC)
+        self.count = 0
+
+    def append(self, payload, t_ns=None):
+        """寫入一筆 record，回傳使用的時間戳 (ns)"""
+        if t_ns is None:
+            t_ns = time.monotonic_ns()
+        head = _HEAD.pack(len(payload), t_ns)
+        crc = zlib.crc32(payload, zlib.crc32(head[4:]))
+        os.write(self._fd, b"".join((head, payload, _CRC.pack(crc))))
+        self.count += 1
+        return t_ns
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _parse(m, pos):
+    """從 pos 開始解析完整且 crc 正確的 record，回傳 (records, 下一個 offset)"""
+    records = []
+    end = len(m)
+    while end - pos >= RECORD_OVERHEAD:
+        length, t_ns = _HEAD.unpack_from(m, pos)
+        stop = pos + _HEAD.size + length
+        if stop + _CRC.size > end:
+            break                                   # 尾端還沒寫完
+        payload = m[pos + _HEAD.size:stop]
+        crc = zlib.crc32(payload, zlib.crc32(m[pos + 4:pos + _HEAD.size]))
+        if crc != _CRC.unpack_from(m, stop)[0]:
+            break                                   # 寫到一半，下次再讀
+        records.append((t_ns, payload))
+        pos = stop + _CRC.size
+    return records, pos
+
+
+class EventLogReader:
+    """
+    reader = EventLogReader(path)
+    for t_ns, payload in reader.follow(): ...      # 持續 tail
+    records = reader.poll()                       # 目前已完整寫入的新 record
+
+    兩次 poll 之間不持有檔案也不持有 mmap：Windows 上有 mapped section 的檔案
+    不能被截斷，否則重新啟動的 writer（O_TRUNC）會失敗。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._offset = len(MAGIC)
+        self._id = None         # 目前在讀的檔案（_file_id），刪掉重建會變
+        self._first = None      # 第一筆 record 的 header（含時間戳），用來認出被截斷重寫的檔案
+        self.count = 0          # 已讀出的 record 數
+
+    def _restart(self):
+        """檔案被新 session 截斷 / 重建：重新從頭讀"""
+        self._offset = len(MAGIC)
+        self._id = None
+        self._first = None
+        self.count = 0
+
+    def poll(self):
+        """回傳 [(t_ns, payload bytes), ...]，沒有新資料時為空 list"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if self._id is not None and _file_id(st) != self._id:
+            self._restart()
+        if st.st_size < self._offset:
+            if self._offset == len(MAGIC):
+                return []                               # writer 還沒寫完 MAGIC
+            self._restart()
+        if st.st_size <= self._offset:
+            return []
+
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return []
+        with f:
+            st = os.fstat(f.fileno())
+            if self._id is not None and _file_id(st) != self._id:
+                self._restart()                         # stat 與 open 之間被換掉
+            if st.st_size <= self._offset:
+                return []                               # 剛好被截斷，下次 poll 再處理
+            with mmap.mmap(f.fileno(), st.st_size, access=mmap.ACCESS_READ) as m:
+                if m[:len(MAGIC)] != MAGIC:
+                    raise ValueError(f"{self.path} is not an event log")
+                # 同一個檔案被新 writer 截斷後又寫超過 offset：第一筆 record 的時間戳會不同
+                if self._first is not None and m[len(MAGIC):len(MAGIC) + _HEAD.size] != self._first:
+                    self._restart()
+                records, pos = _parse(m, self._offset)
+                if self._first is None and records:
+                    self._first = m[len(MAGIC):len(MAGIC) + _HEAD.size]
+        self._id = _file_id(st)
+        self._offset = pos
+        self.count += len(records)
+        return records
+
+    def follow(self, poll_interval=0.0005, timeout=None):
+        """持續 yield 新 record；timeout 秒內沒有新資料就結束（None = 永遠等）"""
+        last = time.monotonic()
+        while True:
+            records = self.poll()
+            for record in records:
+                yield record
+            if records:
+                last = time.monotonic()
+            elif timeout is not None and time.monotonic() - last > timeout:
+                return
+            else:
+                time.sleep(poll_interval)
+
+    def close(self):
+        pass            # poll 之間不持有檔案，沒有要釋放的資源
+
+
+def read_log(path):
+    """一次讀完整個 log，回傳 [(t_ns, payload), ...]（離線分析用）"""
+    reader = EventLogReader(path)
+    try:
+        return reader.poll()
+    finally:
+        reader.close()
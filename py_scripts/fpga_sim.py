@@ -0,0 +1,529 @@
+"""
+軟體版 FPGA：沒有 DE2-115 時產生 UART 狀態封包（rs232/Game_state.txt 的 14-byte 格式）。
+
+封包來源
+    env_game_packets  : 用 BuckshotEnv 玩遊戲，每個動作產生一個封包（同 Game_PC_Interface.sv：
+                        LOAD / ITEM_PROC / SHOOT_PROC 之後送出下一個狀態）
+    capture_packets   : 錄好的 event log（events.bin）或 raw UART bytes
+
+輸出
+    SimulatedSerial   : 記憶體內、與 pyserial Serial 相容（read / readinto / in_waiting / timeout）
+    PtySerialPort     : Linux pty，slave 路徑可直接給 serial.Serial() 或 bridge.py --port
+
+兩者都可依 115200 baud（8N1，每 byte 10 bits）的真實時間送出，或全速送出，
+並可注入 byte 遺失 / bit 翻轉。
+
+Usage:
+    python fpga_sim.py --games 20 --pty                 # 印出 /dev/pts/N，給 bridge.py --port 使用
+    python fpga_sim.py --capture game_logs/events.bin --out capture.raw --drop 0.001 --flip 0.001
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+from event_log import MAGIC, read_log
+from packet_stream import HEADER, PACKET_SIZE, find_packets
+from python_uart_to_json import BAUD_RATE, STATE_MAP
+
+BITS_PER_BYTE = 10          # 8N1: start + 8 data + stop
+RL_MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python_test", "RL_model")
+
+STATE_CODE = {name: code for code, name in STATE_MAP.items()}
+
+# BuckshotEnv 道具名稱 → FPGA 道具編號（Game_logic.sv: Magnifier 8 ... Reverse 14）
+ITEM_CODES = {
+    "magnifier": 8,
+    "cigarette": 9,
+    "handcuff": 10,
+    "saw": 11,
+    "beer": 12,
+    "phone": 13,
+    "reverse": 14,
+}
+
+
+# ================================================================
+#   封包編碼（parse_packet 的反函數）
+# ================================================================
+def encode_packet(state):
+    """parse_packet 格式的 dict → 14 bytes"""
+    g, a, r = state["game_info"], state["active_items"], state["bullet_report"]
+    hp, b = state["hp"], state["bullets"]
+    items = list(state["items_p0"][:6]) + list(state["items_p1"][:6])
+    return bytes([
+        HEADER,
+        (g["winner"] & 0x03) << 6 | (g["state_code"] & 0x0F) << 2
+        | int(g["turn_player_a"]) << 1 | int(g["turn_player_b"]),
+        int(a["saw"]) << 7 | int(a["reverse"]) << 6 | int(a["handcuff"]) << 5
+        | int(r["valid"]) << 4 | int(r["is_live"]) << 3 | (r["index"] & 0x07),
+        (hp["p0"] & 0x07) << 5 | (hp["p1"] & 0x07) << 1,
+        (b["total"] & 0x0F) << 4 | (b["remain"] & 0x0F),
+        (b["filled_count"] & 0x07) << 5 | (b["empty_count"] & 0x07) << 1,
+        (b["bitmap_ptr"] & 0x0F) << 4,
+        b["bitmap_int"] & 0xFF,
+        *[(hi & 0x0F) << 4 | (lo & 0x0F) for hi, lo in zip(items[0::2], items[1::2])],
+    ])
+
+
+# ================================================================
+#   封包來源：BuckshotEnv
+# ================================================================
+class RandomMaskedPolicy:
+    """沒有模型時的對手 / 玩家：在合法動作中均勻隨機"""
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def predict(self, obs, action_masks=None, deterministic=False):
+        valid = [i for i, m in enumerate(action_masks) if m]
+        return self.rng.choice(valid), None
+
+
+def _recording_env_class():
+    if RL_MODEL_DIR not in sys.path:
+        sys.path.insert(0, RL_MODEL_DIR)
+    from buckshot_env import BuckshotEnv
+
+    class RecordingEnv(BuckshotEnv):
+        """
+        每次裝彈 / 使用道具 / 開槍後記錄 FPGA 會送出的封包。
+        env p1（先手）對應 FPGA P1（playerA、items_p1、紅方），env p2 對應 FPGA P0。
+        """
+
+        def __init__(self, opponent_model):
+            super().__init__(opponent_model)
+            self._debug_logged = True
+            self.packets = []
+            self._game = None
+            self._slots = {}
+            self._report = (False, False, 0)
+
+        # ---------- hooks ----------
+        def _load_new_round(self):
+            if self._game is not self.gs:           # 新的一局：道具欄清空
+                self._game = self.gs
+                self._slots = {"p1": [0] * 6, "p2": [0] * 6}
+            super()._load_new_round()
+            for key in ("p1", "p2"):
+                self._fill_slots(key)
+            self._report = (False, False, 0)
+            self._record(STATE_CODE["INTO_ITEM_P1_WAIT" if self.gs.turn == "p1" else "INTO_ITEM_P0_WAIT"],
+                         next_mover=self.gs.turn)
+
+        def _use_item(self, player, opponent, gs, item):
+            known_before = list(player.bullet_knowledge)
+            reward = super()._use_item(player, opponent, gs, item)
+            key = "p1" if player is gs.p1 else "p2"
+            slots = self._slots[key]
+            slots[slots.index(ITEM_CODES[item])] = 0
+
+            if item in ("magnifier", "phone"):
+                revealed = [i for i, (old, new) in enumerate(zip(known_before, player.bullet_knowledge))
+                            if old is None and new is not None]
+                if revealed:
+                    idx = revealed[0]
+                    self._report = (True, gs.real_bullets[idx] == "live", idx)
+
+            if gs.current_index >= len(gs.real_bullets):
+                self._record(STATE_CODE["ITEM_INTO_LOAD"], actor=key)
+            else:
+                self._record(STATE_CODE["INTO_ITEM_P1_WAIT" if key == "p1" else "INTO_ITEM_P0_WAIT"], actor=key)
+            return reward
+
+        def _shoot(self, gs, shooter, victim, target="enemy"):
+            reward = super()._shoot(gs, shooter, victim, target)
+            key = "p1" if shooter is gs.p1 else "p2"
+            self._report = (False, False, 0)
+            if gs.phase == "game_end":
+                self._record(STATE_CODE["INTO_DONE"], actor=key, winner=key)
+            elif gs.current_index >= len(gs.real_bullets):
+                self._record(STATE_CODE["SHOOT_INTO_LOAD"], next_mover=gs.turn)
+            else:
+                nxt = gs.turn
+                other = gs.p1 if nxt == "p1" else gs.p2
+                handcuff_used = nxt != key and other.handcuffed
+                if handcuff_used:
+                    nxt = key                       # 對手被銬：開槍者繼續（手銬在此時解除）
+                name = "SHOOT_INTO_P1_WAIT" if nxt == "p1" else "SHOOT_INTO_P0_WAIT"
+                self._record(STATE_CODE[name], actor=key, handcuff=False if handcuff_used else None)
+            return reward
+
+        # ---------- helpers ----------
+        def _fill_slots(self, key):
+            """env 只記道具數量；新發的道具放進空的欄位"""
+            player = self.gs.p1 if key == "p1" else self.gs.p2
+            slots = self._slots[key]
+            for item, code in ITEM_CODES.items():
+                for _ in range(getattr(player.items, item) - slots.count(code)):
+                    slots[slots.index(0)] = code
+
+        def _record(self, state_code, actor=None, next_mover=None, winner=None, handcuff=None):
+            gs = self.gs
+            who = actor or next_mover                           # playerA = 1 ⇔ FPGA P1（env p1）
+            n = len(gs.real_bullets)
+            bitmap = sum(1 << i for i, b in enumerate(gs.real_bullets) if b == "live")
+            valid, is_live, idx = self._report
+            if handcuff is None:
+                handcuff = gs.p1.handcuffed or gs.p2.handcuffed
+            state = {
+                "game_info": {
+                    "winner": 0 if winner is None else (0b10 if winner == "p1" else 0b01),
+                    "state_code": state_code,
+                    "state_name": STATE_MAP[state_code],
+                    "turn_player_a": who == "p1",
+                    "turn_player_b": who == "p2",
+                },
+                "active_items": {"saw": gs.saw_active, "reverse": gs.reverse_active, "handcuff": handcuff},
+                "bullet_report": {"valid": valid, "is_live": is_live, "index": idx},
+                "hp": {"p0": max(gs.p2.hp, 0), "p1": max(gs.p1.hp, 0)},
+                "bullets": {
+                    "total": n,
+                    "remain": n - gs.current_index,
+                    "filled_count": gs.live_left,
+                    "empty_count": gs.blank_left,
+                    "bitmap_ptr": gs.current_index,
+                    "bitmap_int": bitmap,
+                    "bitmap_bin": f"{bitmap:08b}",
+                },
+                "items_p0": list(self._slots["p2"]),
+                "items_p1": list(self._slots["p1"]),
+            }
+            self.packets.append(encode_packet(state))
+
+    return RecordingEnv
+
+
+def env_game_packets(n_games, seed=0, policy=None):
+    """
+    用 BuckshotEnv 玩 n_games 局，依序 yield 每個封包（bytes）。
+    policy: 兩邊共用的 predict(obs, action_masks) 物件（None = 隨機合法動作）
+    """
+    policy = policy or RandomMaskedPolicy(seed)
+    env = _recording_env_class()(opponent_model=policy)
+    for game in range(n_games):
+        env.packets.clear()
+        obs, _ = env.reset(seed=seed if game == 0 else None)   # 之後的局接著同一個亂數流
+        yield from env.packets
+        done = False
+        while not done:
+            env.packets.clear()
+            action, _ = policy.predict(obs, action_masks=env.action_masks())
+            obs, _, terminated, truncated, _ = env.step(int(action))
+            done = terminated or truncated
+            yield from env.packets
+
+
+# ================================================================
+#   封包來源：錄製檔
+# ================================================================
+def capture_packets(path):
+    """
+    events.bin → [(t_ns, packet)]（保留錄製時間）
+    其他檔案視為 raw UART bytes → [(None, packet)]
+    """
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC))
+    if head == MAGIC:
+        return [(t_ns, bytes(p)) for t_ns, p in read_log(path)]
+    with open(path, "rb") as f:
+        data = f.read()
+    offsets, _ = find_packets(data)
+    return [(None, data[off:off + PACKET_SIZE]) for off in offsets]
+
+
+# ================================================================
+#   傳輸：時間表 + 錯誤注入
+# ================================================================
+def inject_faults(data, drop_rate=0.0, flip_rate=0.0, rng=None):
+    """每個 byte 以 drop_rate 機率遺失、以 flip_rate 機率翻轉一個 bit"""
+    if not drop_rate and not flip_rate:
+        return bytes(data)
+    rng = rng or random.Random()
+    out = bytearray()
+    for byte in data:
+        if drop_rate and rng.random() < drop_rate:
+            continue
+        if flip_rate and rng.random() < flip_rate:
+            byte ^= 1 << rng.randrange(8)
+        out.append(byte)
+    return bytes(out)
+
+
+class _Transmitter:
+    """
+    把封包排成 UART 的 byte 時間表：第 k 個 byte 在 arrival[k] 秒送達。
+    packets: iterable of bytes 或 (t_ns / None, bytes)；有 t_ns 時保留封包間的間隔。
+    """
+
+    def __init__(self, packets, baud=BAUD_RATE, realtime=True, packet_gap=0.0,
+                 drop_rate=0.0, flip_rate=0.0, seed=None):
+        self.byte_time = BITS_PER_BYTE / baud
+        self.realtime = realtime
+        self.packet_gap = packet_gap
+        self.drop_rate = drop_rate
+        self.flip_rate = flip_rate
+        self._rng = random.Random(seed)
+        self._packets = iter(packets)
+        self._buf = bytearray()
+        self._arrival = []          # 與 _buf 對應的送達時間（相對 start）
+        self._pos = 0
+        self._t = 0.0               # 線路上最後一個 byte 的結束時間
+        self._t0_ns = None          # 錄製檔第一個封包的時間
+        self.exhausted = False
+        self.bytes_sent = 0
+        self.packets_sent = 0
+        self.start = None
+
+    def _schedule_next(self):
+        try:
+            item = next(self._packets)
+        except StopIteration:
+            self.exhausted = True
+            return False
+        t_ns, packet = item if isinstance(item, tuple) else (None, item)
+        start = self._t + (self.packet_gap if self.packets_sent else 0.0)
+        if t_ns is not None:
+            if self._t0_ns is None:
+                self._t0_ns = t_ns
+            start = max(start, (t_ns - self._t0_ns) / 1e9)
+        data = inject_faults(packet, self.drop_rate, self.flip_rate, self._rng)
+        # 丟掉已讀過的部分，避免 buffer 一直長大
+        if self._pos > 4096:
+            del self._buf[:self._pos]
+            del self._arrival[:self._pos]
+            self._pos = 0
+        for k in range(len(data)):
+            self._arrival.append(start + (k + 1) * self.byte_time)
+        self._buf += data
+        self._t = start + len(packet) * self.byte_time
+        self.packets_sent += 1
+        return True
+
+    def now(self):
+        if self.start is None:
+            self.start = time.monotonic()
+        return time.monotonic() - self.start
+
+    def sleep_until(self, t):
+        delay = t - self.now()
+        if delay > 0:
+            time.sleep(delay)
+
+    def available(self, horizon=None):
+        """目前（或 horizon 秒時）已送達、尚未讀取的 byte 數"""
+        if not self.realtime:
+            while len(self._buf) - self._pos < 4096 and self._schedule_next():
+                pass
+            return len(self._buf) - self._pos
+        t = self.now() if horizon is None else horizon
+        while (not self.exhausted) and (len(self._buf) == self._pos or self._arrival[-1] <= t):
+            if not self._schedule_next():
+                break
+        n = self._pos
+        while n < len(self._buf) and self._arrival[n] <= t:
+            n += 1
+        return n - self._pos
+
+    def arrival_of(self, k):
+        """第 k 個（0 起算）未讀 byte 的送達時間；來源沒有那麼多 byte 時回傳 None"""
+        while len(self._buf) - self._pos <= k:
+            if not self._schedule_next():
+                return None
+        return self._arrival[self._pos + k]
+
+    def pending(self):
+        """已排程、尚未讀取的 byte 數"""
+        return len(self._buf) - self._pos
+
+    def take(self, n):
+        data = bytes(self._buf[self._pos:self._pos + n])
+        self._pos += len(data)
+        self.bytes_sent += len(data)
+        return data
+
+    @property
+    def finished(self):
+        return self.exhausted and self._pos == len(self._buf)
+
+
+# ================================================================
+#   In-memory serial
+# ================================================================
+class SimulatedSerial:
+    """
+    pyserial Serial 的替身（只讀）：
+        ser = SimulatedSerial(env_game_packets(10), realtime=True)
+        for packet in PacketStream(ser): ...
+
+    read() 的 timeout 行為與 pyserial 相同：等到 size bytes 或 timeout。
+    資料全部送完後 read 會回傳空 bytes（如同沒有新資料的 Serial）；
+    eof 為 True 表示已經沒有資料。
+    """
+
+    def __init__(self, packets, baud=BAUD_RATE, timeout=0.1, realtime=True, packet_gap=0.0,
+                 drop_rate=0.0, flip_rate=0.0, seed=None):
+        self.port = "sim://fpga"
+        self.baudrate = baud
+        self.timeout = timeout
+        self.is_open = True
+        self._tx = _Transmitter(packets, baud, realtime, packet_gap, drop_rate, flip_rate, seed)
+
+    @property
+    def in_waiting(self):
+        return self._tx.available()
+
+    @property
+    def eof(self):
+        return self._tx.finished
+
+    @property
+    def packets_sent(self):
+        return self._tx.packets_sent
+
+    def read(self, size=1):
+        tx = self._tx
+        if not tx.realtime:
+            tx.available()
+            return tx.take(size)
+
+        deadline = None if self.timeout is None else tx.now() + self.timeout
+        target = tx.arrival_of(size - 1)
+        if target is None:                      # 來源快結束了：剩下的全部
+            size = tx.pending()
+            if size == 0:
+                return b""
+            target = tx.arrival_of(size - 1)
+        if deadline is not None and target > deadline:
+            tx.sleep_until(deadline)
+            return tx.take(tx.available())
+        tx.sleep_until(target)
+        return tx.take(size)
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ================================================================
+#   PTY（Linux）
+# ================================================================
+class PtySerialPort:
+    """
+    建立 pty，在背景 thread 依時間表把封包寫到 master 端：
+        with PtySerialPort(env_game_packets(10)) as pty:
+            ser = serial.Serial(pty.port, 115200)
+    """
+
+    def __init__(self, packets, baud=BAUD_RATE, realtime=True, packet_gap=0.0,
+                 drop_rate=0.0, flip_rate=0.0, seed=None):
+        import tty
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._tx = _Transmitter(packets, baud, realtime, packet_gap, drop_rate, flip_rate, seed)
+        self._stop = threading.Event()
+        self.done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fpga-sim", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        tx = self._tx
+        try:
+            while not self._stop.is_set():
+                nxt = tx.arrival_of(0)
+                if nxt is None:
+                    break
+                if tx.realtime:
+                    tx.sleep_until(nxt)
+                data = memoryview(tx.take(max(tx.available(), 1) if tx.realtime else tx.pending()))
+                while data:                     # pty buffer 滿時 os.write 會阻塞 / 只寫一部分
+                    data = data[os.write(self._master, data):]
+        finally:
+            self.done.set()
+
+    @property
+    def packets_sent(self):
+        return self._tx.packets_sent
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Software FPGA: UART state packets without the DE2-115")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--games", type=int, default=10, help="用 BuckshotEnv 產生幾局")
+    source.add_argument("--capture", help="重播 events.bin 或 raw UART 擷取檔")
+    parser.add_argument("--model", help="雙方使用的模型（.zip / .npz）；預設隨機合法動作")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baud", type=int, default=BAUD_RATE)
+    parser.add_argument("--fast", action="store_true", help="不依 baud rate 等待，全速送出")
+    parser.add_argument("--gap", type=float, default=0.0, help="封包間的額外間隔（秒）")
+    parser.add_argument("--drop", type=float, default=0.0, help="每個 byte 遺失的機率")
+    parser.add_argument("--flip", type=float, default=0.0, help="每個 byte 翻轉一個 bit 的機率")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--pty", action="store_true", help="開 pty，印出 port 路徑後開始送")
+    output.add_argument("--out", help="把（注入錯誤後的）raw bytes 寫到檔案")
+    args = parser.parse_args()
+
+    if args.capture:
+        packets = capture_packets(args.capture)
+    else:
+        policy = None
+        if args.model:
+            if RL_MODEL_DIR not in sys.path:
+                sys.path.insert(0, RL_MODEL_DIR)
+            from actor_policy import load_policy
+            policy = load_policy(args.model, seed=args.seed)
+        packets = env_game_packets(args.games, seed=args.seed, policy=policy)
+
+    options = dict(baud=args.baud, realtime=not args.fast, packet_gap=args.gap,
+                   drop_rate=args.drop, flip_rate=args.flip, seed=args.seed)
+    if args.out:
+        ser = SimulatedSerial(packets, **dict(options, realtime=False))
+        with open(args.out, "wb") as f:
+            while not ser.eof:
+                f.write(ser.read(4096))
+        print(f"Wrote {ser.packets_sent} packets to {args.out}")
+        return
+
+    with PtySerialPort(packets, **options) as pty:
+        print(f"Simulated FPGA on {pty.port} ({'fast' if args.fast else f'{args.baud} baud'})", flush=True)
+        try:
+            pty.done.wait()
+            print(f"Sent {pty.packets_sent} packets; Ctrl+C to close the port")
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+FPGA → Python → Unity 路徑上每個封包的時間戳（monotonic_ns）。
+
+    tracer = TraceRing()
+    tracer.mark(seq, "serial_read", t_ns)       # seq = 第幾個封包（event log 的 record 編號）
+    ...
+    tracer.save("bridge_trace.json")             # Chrome trace-event JSON（chrome://tracing / Perfetto）
+
+- mark() 只把 (seq, stage, t_ns) 放進預先配置好的 ring buffer，滿了覆蓋最舊的。
+- monotonic_ns 在同一台機器上跨 process 可直接比較，所以 python_uart_to_json.py
+  與 python_json_to_command.py 各自存的 trace 可以合併（以 seq 對齊）。
+- CLI 印出各 stage 之間的 p50 / p95 / p99：
+
+    python latency_trace.py uart_trace.json cmd_trace.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from collections import defaultdict
+from time import monotonic_ns
+
+import numpy as np
+
+# 依路徑順序；每個 process 只會用到其中一部分
+STAGES = (
+    "serial_read",          # readinto 回來（封包最後一個 byte 已在 buffer）
+    "header_found",         # PacketStream 找到完整封包
+    "logged",               # 寫入 event log
+    "parsed",               # parse_packet / decode_record 完成
+    "json_written",         # state{N}.json 寫完（--json）
+    "detected",             # python_json_to_command / translator 拿到這個狀態
+    "translated",           # translate() 完成
+    "command_written",      # command 檔 rename 完 / 交給 socket
+)
+DEFAULT_CAPACITY = 1 << 16  # 事件數
+
+
+_ORDER = {stage: i for i, stage in enumerate(STAGES)}
+
+
+def critical_path(marks):
+    """
+    一個封包的 [(t_ns, stage), ...] → 依 STAGES 順序的關鍵路徑。
+    比後面 stage 還晚完成的是旁支（例如讀 event log 時的 json_written），跳過。
+    """
+    chain = []
+    for t, stage in sorted(marks, key=lambda m: (_ORDER.get(m[1], len(_ORDER)), m[0])):
+        while chain and chain[-1][0] > t:
+            chain.pop()
+        chain.append((t, stage))
+    return chain
+
+
+class TraceRing:
+    """固定大小的事件 ring buffer；多個 thread 同時 mark 也安全（itertools.count 的 next 是 atomic）"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, name=None):
+        self.capacity = capacity
+        self.name = name or os.path.basename(sys.argv[0])
+        self._events = [None] * capacity
+        self._next = itertools.count()
+        self.count = 0          # 最近一次 events() 時看到的總事件數
+
+    def mark(self, seq, stage, t_ns=None):
+        """記一筆；t_ns 省略時用現在時間"""
+        if t_ns is None:
+            t_ns = monotonic_ns()
+        self._events[next(self._next) % self.capacity] = (seq, stage, t_ns)
+
+    def events(self):
+        """ring 內的事件（舊 → 新）[(seq, stage, t_ns), ...]"""
+        total = next(self._next)        # 多拿一個號碼沒關係，只用來算位置
+        self.count = total
+        if total <= self.capacity:
+            return [e for e in self._events[:total] if e is not None]
+        start = total % self.capacity
+        return [e for e in self._events[start:] + self._events[:start] if e is not None]
+
+    def chrome_events(self):
+        """Chrome trace-event 格式：每筆 mark 一個 instant event，同一個 seq 相鄰兩筆之間一個 span"""
+        pid = os.getpid()
+        out = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": self.name}}]
+        by_seq = defaultdict(list)
+        for seq, stage, t_ns in self.events():
+            out.append({"name": stage, "ph": "i", "s": "t", "ts": t_ns / 1e3, "pid": pid, "tid": 0,
+                        "args": {"seq": seq}})
+            by_seq[seq].append((t_ns, stage))
+        lanes = {}
+        for seq, marks in by_seq.items():
+            chain = critical_path(marks)
+            for (t0, a), (t1, b) in zip(chain, chain[1:]):
+                span = f"{a} → {b}"
+                out.append({"name": span, "ph": "X", "ts": t0 / 1e3, "dur": (t1 - t0) / 1e3,
+                            "pid": pid, "tid": lanes.setdefault(span, len(lanes) + 1), "args": {"seq": seq}})
+        return out
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.chrome_events(), "displayTimeUnit": "ms"}, f)
+        return path
+
+
+def add_trace_args(parser):
+    parser.add_argument("--trace", metavar="PATH",
+                        help="記錄每個封包各 stage 的時間，結束時存成 Chrome trace JSON（latency_trace.py 可彙整）")
+
+
+# ================================================================
+#   Summary
+# ================================================================
+def load_marks(paths):
+    """合併多個 trace 檔 → {seq: [(t_ns, stage), ...]}"""
+    by_seq = defaultdict(list)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            events = json.load(f)["traceEvents"]
+        for e in events:
+            if e.get("ph") == "i":
+                by_seq[e["args"]["seq"]].append((round(e["ts"] * 1e3), e["name"]))
+    return by_seq
+
+
+def summarize(by_seq):
+    """
+    {span 名稱: µs array}。span 是每個封包關鍵路徑上相鄰的兩個 stage，
+    另加 total（路徑第一個 → 最後一個 stage）。
+    """
+    spans = defaultdict(list)
+    for marks in by_seq.values():
+        chain = critical_path(marks)
+        for (t0, a), (t1, b) in zip(chain, chain[1:]):
+            spans[f"{a} → {b}"].append((t1 - t0) / 1e3)
+        if len(chain) > 1:
+            spans[f"total ({chain[0][1]} → {chain[-1][1]})"].append((chain[-1][0] - chain[0][0]) / 1e3)
+
+    def key(name):
+        first = name.split(" → ")[0].removeprefix("total (")
+        return (name.startswith("total"), _ORDER.get(first, len(_ORDER)), name)
+    return {name: np.asarray(spans[name]) for name in sorted(spans, key=key)}
+
+
+def print_summary(spans):
+    print(f"\n{'='*86}")
+    print(f"{'span':<44} {'n':>7} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'max us':>9}")
+    print(f"{'='*86}")
+    for name, us in spans.items():
+        p50, p95, p99 = np.percentile(us, [50, 95, 99])
+        print(f"{name:<44} {len(us):>7} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f} {us.max():>9.1f}")
+    print(f"{'='*86}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency (p50/p95/p99) from --trace files")
+    parser.add_argument("traces", nargs="+", help="bridge.py / python_uart_to_json.py / python_json_to_command.py 的 --trace 檔")
+    args = parser.parse_args()
+    print_summary(summarize(load_marks(args.traces)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,528 @@
+"""
+FPGA 狀態封包（14 bytes, header 0xA5）的串流解碼。
+
+- PacketStream: 以預先配置的 buffer + readinto 讀 UART / 檔案，
+  用 bytes.find 找 header，yield 每個封包的 memoryview（不複製）。
+  每包先經過 PacketValidator 檢查；不合理的封包丟掉並重新對齊（resync）。
+- decode_record: 單一封包 → PacketRecord（查 256 項的表，不做 shift / mask），
+  parse_packet 格式的巢狀 dict 用到時才建。
+- decode_packets: 一次把多個封包解成 NumPy structured array，
+  欄位與 python_uart_to_json.parse_packet 的 bit-field 一一對應。
+- decode_capture: 離線解整份擷取檔（raw bytes）。
+"""
+
+from collections import Counter
+from time import monotonic_ns
+
+import numpy as np
+
+PACKET_SIZE = 14
+HEADER = 0xA5
+_HEADER_BYTE = bytes([HEADER])
+
+# 狀態名稱對照表 (方便 Debug 用，不影響 JSON 數值)
+STATE_MAP = {
+    0: "IDLE", 1: "LOAD", 2: "ITEM_P0", 3: "ITEM_P1",
+    4: "ITEM_PROC", 5: "SHOOT_P0", 6: "SHOOT_P1",
+    7: "SHOOT_PROC", 8: "DONE", 9: "ITEM_INTO_LOAD", 10: "SHOOT_INTO_LOAD",
+    11: "INTO_ITEM_P0_WAIT", 12: "INTO_ITEM_P1_WAIT", 13: "SHOOT_INTO_P0_WAIT", 14: "SHOOT_INTO_P1_WAIT",
+    15: "INTO_DONE"
+}
+
+# ----- 封包欄位的合理範圍（依 game_logic/Game_logic.sv） -----
+MAX_HP = 4                          # Use_Item：香菸最多補到 4
+HP_DEAD = 0x07                      # hp 的 4-bit -1（1 血被鋸子打）截成 3 bits
+MAX_BULLETS = 8
+ITEM_CODES = frozenset((0, 8, 9, 10, 11, 12, 13, 14))     # 同 python_json_to_command.item_map
+# FPGA 只在 LOAD / ITEM_PROC / SHOOT_PROC 後一個 cycle 送出，封包裡只會有 9~15
+ITEM_INTO_LOAD, SHOOT_INTO_LOAD, INTO_ITEM_P0_WAIT, INTO_ITEM_P1_WAIT = 9, 10, 11, 12
+INTO_DONE = 15
+PACKET_STATES = frozenset(range(9, 16))
+# 前一包 → 下一包可能的 state：INTO_LOAD 之後一定經過 LOAD；INTO_DONE 之後要 reset 開新局
+NEXT_STATES = {
+    ITEM_INTO_LOAD: frozenset((INTO_ITEM_P0_WAIT, INTO_ITEM_P1_WAIT)),
+    SHOOT_INTO_LOAD: frozenset((INTO_ITEM_P0_WAIT, INTO_ITEM_P1_WAIT)),
+    **{code: PACKET_STATES for code in range(11, 15)},
+    INTO_DONE: frozenset((INTO_ITEM_P0_WAIT, INTO_ITEM_P1_WAIT)),
+}
+
+# 每個 bit-field 一個欄位（順序同封包 byte 順序）
+PACKET_DTYPE = np.dtype([
+    ("winner", np.uint8),
+    ("state_code", np.uint8),
+    ("turn_player_a", np.bool_),
+    ("turn_player_b", np.bool_),
+    ("saw", np.bool_),
+    ("reverse", np.bool_),
+    ("handcuff", np.bool_),
+    ("rpt_valid", np.bool_),
+    ("rpt_is_live", np.bool_),
+    ("rpt_index", np.uint8),
+    ("hp_p0", np.uint8),
+    ("hp_p1", np.uint8),
+    ("total", np.uint8),
+    ("remain", np.uint8),
+    ("filled_count", np.uint8),
+    ("empty_count", np.uint8),
+    ("bitmap_ptr", np.uint8),
+    ("bitmap", np.uint8),
+    ("items_p0", np.uint8, (6,)),
+    ("items_p1", np.uint8, (6,)),
+])
+
+
+# ================================================================
+#   Per-packet decode (lookup tables)
+# ================================================================
+# 每個 byte 值 → 該 byte 所有 bit-field（順序同 Game_state.txt）
+# Byte 1: { Winner(2), State(4), PlayerA(1), PlayerB(1) }
+_BYTE1 = tuple((v >> 6, (v >> 2) & 0x0F, bool(v & 0x02), bool(v & 0x01)) for v in range(256))
+# Byte 2: { Saw(1), Rev(1), Handcuff(1), RptValid(1), Report(1), RptIdx(3) }
+_BYTE2 = tuple((bool(v & 0x80), bool(v & 0x40), bool(v & 0x20), bool(v & 0x10), bool(v & 0x08), v & 0x07)
+               for v in range(256))
+# Byte 3 / 5: { X(3), 1'b0, Y(3), 1'b0 }
+_PAIR3 = tuple((v >> 5, (v >> 1) & 0x07) for v in range(256))
+# Byte 4 / 8~13: 兩個 4-bit（高 nibble 在前）
+_NIBBLES = tuple((v >> 4, v & 0x0F) for v in range(256))
+# Byte 7: bitmap 的二進位字串（parse_packet 的 "bitmap_bin"）
+_BITMAP_BIN = tuple(f"{v:08b}" for v in range(256))
+
+
+class PacketRecord(dict):
+    """
+    一個封包的所有欄位（屬性名稱同 PACKET_DTYPE）。
+
+    同時是 parse_packet 格式的 lazy dict：record["hp"]["p0"] 第一次讀到
+    某個 section 時才由 __missing__ 建出來並存進 dict，之後是一般 dict 查表。
+    dict 本身只含讀過的 section；要完整內容（存 JSON）用 to_dict()。
+    """
+
+    __slots__ = ("winner", "state_code", "turn_player_a", "turn_player_b",
+                 "saw", "reverse", "handcuff", "rpt_valid", "rpt_is_live", "rpt_index",
+                 "hp_p0", "hp_p1", "total", "remain", "filled_count", "empty_count",
+                 "bitmap_ptr", "bitmap", "items_p0", "items_p1")
+
+    # ---------------- parse_packet 相容的 dict ----------------
+    def _game_info(self):
+        return {
+            "winner": self.winner,
+            "state_code": self.state_code,
+            "state_name": STATE_MAP.get(self.state_code, "UNKNOWN"),
+            "turn_player_a": self.turn_player_a,
+            "turn_player_b": self.turn_player_b,
+        }
+
+    def _active_items(self):
+        return {"saw": self.saw, "reverse": self.reverse, "handcuff": self.handcuff}
+
+    def _bullet_report(self):
+        return {"valid": self.rpt_valid, "is_live": self.rpt_is_live, "index": self.rpt_index}
+
+    def _hp(self):
+        return {"p0": self.hp_p0, "p1": self.hp_p1}
+
+    def _bullets(self):
+        return {
+            "total": self.total,
+            "remain": self.remain,
+            "filled_count": self.filled_count,
+            "empty_count": self.empty_count,
+            "bitmap_ptr": self.bitmap_ptr,
+            "bitmap_int": self.bitmap,
+            "bitmap_bin": _BITMAP_BIN[self.bitmap],
+        }
+
+    _BUILDERS = {
+        "game_info": _game_info,
+        "active_items": _active_items,
+        "bullet_report": _bullet_report,
+        "hp": _hp,
+        "bullets": _bullets,
+        "items_p0": lambda self: list(self.items_p0),
+        "items_p1": lambda self: list(self.items_p1),
+    }
+
+    def __bool__(self):
+        return True                 # 還沒讀任何 section 時 dict 是空的，但 `if future_state:` 要成立
+
+    def __missing__(self, key):
+        section = self[key] = self._BUILDERS[key](self)
+        return section
+
+    def to_dict(self):
+        """跟 python_uart_to_json.parse_packet 相同的巢狀 dict（存 JSON 用）"""
+        return {key: self[key] for key in self._BUILDERS}
+
+    def __repr__(self):
+        return (f"PacketRecord(state={STATE_MAP.get(self.state_code, self.state_code)}, "
+                f"hp=({self.hp_p0},{self.hp_p1}), items_p0={self.items_p0}, items_p1={self.items_p1})")
+
+
+def decode_record(packet):
+    """14-byte 封包（bytes / bytearray / memoryview）→ PacketRecord"""
+    r = PacketRecord.__new__(PacketRecord)
+    r.winner, r.state_code, r.turn_player_a, r.turn_player_b = _BYTE1[packet[1]]
+    r.saw, r.reverse, r.handcuff, r.rpt_valid, r.rpt_is_live, r.rpt_index = _BYTE2[packet[2]]
+    r.hp_p0, r.hp_p1 = _PAIR3[packet[3]]
+    r.total, r.remain = _NIBBLES[packet[4]]
+    r.filled_count, r.empty_count = _PAIR3[packet[5]]
+    r.bitmap_ptr = packet[6] >> 4
+    r.bitmap = packet[7]
+    r.items_p0 = _NIBBLES[packet[8]] + _NIBBLES[packet[9]] + _NIBBLES[packet[10]]
+    r.items_p1 = _NIBBLES[packet[11]] + _NIBBLES[packet[12]] + _NIBBLES[packet[13]]
+    return r
+
+
+# ================================================================
+#   Bulk decode
+# ================================================================
+def decode_packets(packets):
+    """
+    packets: (N, 14) uint8 array, or bytes-like of N*14 bytes (header 檢查由呼叫端負責)
+    回傳: (N,) PACKET_DTYPE structured array
+    """
+    b = np.asarray(packets, dtype=np.uint8) if isinstance(packets, np.ndarray) \
+        else np.frombuffer(packets, dtype=np.uint8)
+    b = b.reshape(-1, PACKET_SIZE)
+    out = np.empty(len(b), dtype=PACKET_DTYPE)
+
+    # Byte 1: { Winner(2), State(4), PlayerA(1), PlayerB(1) }
+    out["winner"] = b[:, 1] >> 6
+    out["state_code"] = (b[:, 1] >> 2) & 0x0F
+    out["turn_player_a"] = (b[:, 1] >> 1) & 0x01
+    out["turn_player_b"] = b[:, 1] & 0x01
+
+    # Byte 2: { Saw(1), Rev(1), Handcuff(1), RptValid(1), Report(1), RptIdx(3) }
+    out["saw"] = b[:, 2] >> 7
+    out["reverse"] = (b[:, 2] >> 6) & 0x01
+    out["handcuff"] = (b[:, 2] >> 5) & 0x01
+    out["rpt_valid"] = (b[:, 2] >> 4) & 0x01
+    out["rpt_is_live"] = (b[:, 2] >> 3) & 0x01
+    out["rpt_index"] = b[:, 2] & 0x07
+
+    # Byte 3: { HP_P0(3), 1'b0, HP_P1(3), 1'b0 }
+    out["hp_p0"] = b[:, 3] >> 5
+    out["hp_p1"] = (b[:, 3] >> 1) & 0x07
+
+    # Byte 4: { TotalBullets(4), BulletRemain(4) }
+    out["total"] = b[:, 4] >> 4
+    out["remain"] = b[:, 4] & 0x0F
+
+    # Byte 5: { BulletFilled(3), 1'b0, BulletEmpty(3), 1'b0 }
+    out["filled_count"] = b[:, 5] >> 5
+    out["empty_count"] = (b[:, 5] >> 1) & 0x07
+
+    # Byte 6: { BulletBitmapPtr(4), 4'b0 } / Byte 7: BulletBitmap(8)
+    out["bitmap_ptr"] = b[:, 6] >> 4
+    out["bitmap"] = b[:, 7]
+
+    # Byte 8~13: 每 Byte 兩個 4-bit Item（高 nibble 在前）
+    items = np.empty((len(b), 12), dtype=np.uint8)
+    items[:, 0::2] = b[:, 8:14] >> 4
+    items[:, 1::2] = b[:, 8:14] & 0x0F
+    out["items_p0"] = items[:, :6]
+    out["items_p1"] = items[:, 6:]
+    return out
+
+
+def find_packets(data, start=0, end=None):
+    """
+    在 data[start:end] 中依序找出完整封包的起點。
+
+    與原本逐 byte 丟棄的行為相同：遇到非 0xA5 就跳到下一個 0xA5，
+    找到 header 後整包 14 bytes 視為一個封包。
+
+    回傳: (offsets list, next_start)；next_start 之後是尚未湊滿一包的資料
+    """
+    end = len(data) if end is None else end
+    offsets = []
+    pos = start
+    while end - pos >= PACKET_SIZE:
+        if data[pos] != HEADER:
+            pos = data.find(_HEADER_BYTE, pos, end)
+            if pos < 0:
+                return offsets, end
+            continue
+        offsets.append(pos)
+        pos += PACKET_SIZE
+    return offsets, pos
+
+
+def decode_capture(data):
+    """
+    離線解碼一整段 raw UART bytes。
+
+    回傳: (PACKET_DTYPE array, skipped byte 數)
+    """
+    data = bytes(data)
+    usable = len(data) - len(data) % PACKET_SIZE
+    arr = np.frombuffer(data, dtype=np.uint8)
+    # 快速路徑：沒有錯位時每 14 bytes 一個 header
+    if usable == len(data) and np.all(arr[0::PACKET_SIZE] == HEADER):
+        return decode_packets(arr), 0
+
+    offsets, _ = find_packets(data)
+    idx = np.asarray(offsets, dtype=np.intp)[:, None] + np.arange(PACKET_SIZE)
+    return decode_packets(arr[idx]), len(data) - len(offsets) * PACKET_SIZE
+
+
+# ================================================================
+#   Validation
+# ================================================================
+def _hp(value):
+    return -1 if value == HP_DEAD else value
+
+
+def field_error(buf, off=0):
+    """
+    單一封包的欄位檢查（不看前一包）。回傳拒絕原因，合理時回傳 None。
+    這些欄位錯了幾乎都是錯位（掉 byte）或 bit error，呼叫端應該重新對齊。
+    """
+    b1, b3, b4, b5, b6 = buf[off + 1], buf[off + 3], buf[off + 4], buf[off + 5], buf[off + 6]
+    if b3 & 0x11 or b5 & 0x11 or b6 & 0x0F:
+        return "reserved_bits"
+    state = (b1 >> 2) & 0x0F
+    if state not in PACKET_STATES:
+        return "state"
+    if ((b1 >> 1) ^ b1) & 0x01 == 0:
+        return "turn"                               # PlayerA / PlayerB 一定剛好一個是 1
+    winner = b1 >> 6
+    if winner == 3 or (winner != 0) != (state == INTO_DONE):
+        return "winner"
+    for hp in (b3 >> 5, (b3 >> 1) & 0x07):
+        if not 1 <= hp <= MAX_HP and not (state == INTO_DONE and (hp == 0 or hp == HP_DEAD)):
+            return "hp"
+    total = b4 >> 4
+    if (total > MAX_BULLETS or (b4 & 0x0F) > total or (b6 >> 4) > total
+            or (b5 >> 5) + ((b5 >> 1) & 0x07) > total):
+        return "bullets"
+    for i in range(off + 8, off + PACKET_SIZE):
+        if buf[i] >> 4 not in ITEM_CODES or buf[i] & 0x0F not in ITEM_CODES:
+            return "item"
+    return None
+
+
+class PacketValidator:
+    """
+    檢查封包跟前一個接受的封包是否接得上（state 轉移、hp、道具）。
+
+    中間掉了整包時合法的封包也可能接不上，所以最多連續拒絕
+    max_streak 包；再不接受就以新的封包為準（reanchor），不會一直卡住。
+    """
+
+    def __init__(self, max_streak=1):
+        self.max_streak = max_streak
+        self.prev = None            # 上一個接受的封包（bytes）
+        self.rejected = Counter()   # 拒絕原因 → 次數
+        self.reanchors = 0
+        self._streak = 0
+
+    def transition_error(self, buf, off=0):
+        """跟 prev 比較的檢查；回傳拒絕原因或 None"""
+        prev = self.prev
+        if prev is None:
+            return None
+        old_state, new_state = (prev[1] >> 2) & 0x0F, (buf[off + 1] >> 2) & 0x0F
+        if new_state not in NEXT_STATES[old_state]:
+            return "transition"
+        if old_state == INTO_DONE:
+            return None                             # 新的一局，hp / 道具重新開始
+        # 每包最多一個動作：香菸 +1，或被射中 -1（鋸子 -2）
+        for shift in (5, 1):
+            delta = _hp((buf[off + 3] >> shift) & 0x07) - _hp((prev[3] >> shift) & 0x07)
+            if not -2 <= delta <= 1:
+                return "hp_jump"
+        # 道具只會被用掉（變 0）；LOAD 只補空格，不會換掉原有的道具
+        loaded = old_state == ITEM_INTO_LOAD or old_state == SHOOT_INTO_LOAD
+        for i in range(8, PACKET_SIZE):
+            old, new = prev[i], buf[off + i]
+            if old == new:
+                continue
+            for o, n in ((old >> 4, new >> 4), (old & 0x0F, new & 0x0F)):
+                if o != n and (o if loaded else n) != 0:
+                    return "item_change"
+        return None
+
+    def check(self, buf, off=0):
+        """
+        回傳 (reason, misframed)。reason 為 None 表示接受（並更新 prev）；
+        misframed=True 表示欄位本身不合理，應該從下一個 byte 重新找 header。
+        """
+        reason = field_error(buf, off)
+        if reason is not None:
+            self.rejected[reason] += 1
+            return reason, True
+        reason = self.transition_error(buf, off)
+        if reason is not None:
+            if self._streak < self.max_streak:
+                self._streak += 1
+                self.rejected[reason] += 1
+                return reason, False
+            self.reanchors += 1
+        self._streak = 0
+        self.prev = bytes(buf[off:off + PACKET_SIZE])
+        return None, False
+
+    def reset(self):
+        """來源重新開始（例如 FPGA reset）時清掉前一包"""
+        self.prev = None
+        self._streak = 0
+
+
+# ================================================================
+#   Streaming
+# ================================================================
+class PacketStream:
+    """
+    source: pyserial Serial 或任何有 readinto() 的 binary stream（可為 None，改用 feed()）
+
+    for packet in PacketStream(ser): ...
+        packet 是 buffer 內的 memoryview，只在下一次讀取前有效；
+        要保留請 bytes(packet)。
+    """
+
+    def __init__(self, source=None, capacity=4096, validator=True):
+        """validator: True = 預設的 PacketValidator；None / False = 只認 header（舊行為）"""
+        if capacity < 2 * PACKET_SIZE:
+            raise ValueError(f"capacity must be at least {2 * PACKET_SIZE} bytes")
+        self.source = source
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._head = 0      # 第一個尚未處理的 byte
+        self._tail = 0      # 資料結尾
+        self.validator = PacketValidator() if validator is True else (validator or None)
+        self.packet_count = 0
+        self.skipped_bytes = 0      # 沒有成為封包的 byte（雜訊、被拒絕的封包）
+        self.resync_count = 0       # 失去對齊、重新找 header 的次數
+        self.last_read_ns = 0       # 最近一次讀到資料的時間（latency trace 的 serial_read）
+        self._synced = False
+
+    def stats(self):
+        """目前的計數（可在其他 thread 隨時呼叫）"""
+        v = self.validator
+        rejected = dict(v.rejected) if v is not None else {}
+        return {
+            "packets": self.packet_count,
+            "dropped_bytes": self.skipped_bytes,
+            "rejected": sum(rejected.values()),
+            "resyncs": self.resync_count,
+            "reanchors": v.reanchors if v is not None else 0,
+            "rejected_by_reason": rejected,
+        }
+
+    @property
+    def buffered(self):
+        return self._tail - self._head
+
+    def _compact(self):
+        """把未處理的殘餘資料（< 1 包 + 雜訊）搬到 buffer 開頭"""
+        n = self._tail - self._head
+        if self._head:
+            self._view[:n] = self._view[self._head:self._tail]
+            self._head, self._tail = 0, n
+
+    def _free_view(self, want):
+        """buffer 尾端可寫入的 view（至少 1、最多 want bytes）；空間不足時先 compact"""
+        want = max(1, want)
+        if len(self._buf) - self._tail < want:
+            self._compact()
+        free = len(self._buf) - self._tail
+        if free == 0:
+            raise BufferError("PacketStream buffer full; consume packets() before reading more")
+        return self._view[self._tail:self._tail + min(free, want)]
+
+    def feed(self, data):
+        """
+        手動放入 bytes（離線 / 測試用），之後用 packets() 取出。
+        一次放入的量不能超過剩餘空間（capacity - buffered）。
+        """
+        data = memoryview(data).cast("B")
+        if len(data) > len(self._buf) - self.buffered:
+            raise BufferError(f"feed of {len(data)} bytes exceeds free space "
+                              f"({len(self._buf) - self.buffered} bytes)")
+        if len(data):
+            dst = self._free_view(len(data))
+            dst[:] = data
+            self._tail += len(data)
+
+    def fill(self):
+        """
+        從 source 讀入一次。Serial 會等到至少 1 byte 或 timeout，
+        所以不需要額外 sleep。回傳讀到的 byte 數。
+        """
+        want = getattr(self.source, "in_waiting", None)
+        n = self.source.readinto(self._free_view(len(self._buf) if want is None else want))
+        n = n or 0
+        self._tail += n
+        if n:
+            self.last_read_ns = monotonic_ns()
+        return n
+
+    def _lose_sync(self):
+        if self._synced:
+            self.resync_count += 1
+            self._synced = False
+
+    def _scan(self):
+        """
+        依序 yield buffer 內合格封包的 offset。yield 之前 _head 已前進，
+        中途停止迭代也不會重複；被跳過 / 拒絕的 byte 記到 skipped_bytes。
+        """
+        buf, end, validator = self._buf, self._tail, self.validator
+        pos = self._head
+        while end - pos >= PACKET_SIZE:
+            if buf[pos] != HEADER:
+                self._lose_sync()
+                nxt = buf.find(_HEADER_BYTE, pos, end)
+                nxt = end if nxt < 0 else nxt
+                self.skipped_bytes += nxt - pos
+                pos = self._head = nxt
+                continue
+            if validator is not None:
+                reason, misframed = validator.check(buf, pos)
+                if reason is not None:
+                    if misframed:
+                        # 可能是資料裡的 0xA5 或掉了 byte：從下一個 byte 重新找 header
+                        self._lose_sync()
+                        step = 1
+                    else:
+                        step = PACKET_SIZE
+                    self.skipped_bytes += step
+                    pos = self._head = pos + step
+                    continue
+            self._synced = True
+            self._head = pos + PACKET_SIZE
+            self.packet_count += 1
+            yield pos
+            pos = self._head
+
+    def packets(self):
+        """yield buffer 內所有合格的完整封包（memoryview），並丟棄雜訊與不合理的封包"""
+        for off in self._scan():
+            yield self._view[off:off + PACKET_SIZE]
+
+    def read_batch(self):
+        """讀一次 source，回傳這次湊滿的所有封包（PACKET_DTYPE array）"""
+        if self.source is not None:
+            self.fill()
+        offsets = list(self._scan())
+        arr = np.frombuffer(self._buf, dtype=np.uint8)
+        idx = np.asarray(offsets, dtype=np.intp)[:, None] + np.arange(PACKET_SIZE)
+        return decode_packets(arr[idx])
+
+    def __iter__(self):
+        while True:
+            if self.fill() == 0 and self.source is not None and not hasattr(self.source, "in_waiting"):
+                # 檔案讀到底（Serial timeout 則繼續等）
+                yield from self.packets()
+                return
+            yield from self.packets()
+
+
+def print_link_stats(stream):
+    """印出 PacketStream 的封包檢查 / resync 計數"""
+    st = stream.stats()
+    print(f"UART link: {st['packets']} packets, {st['dropped_bytes']} dropped bytes, "
+          f"{st['rejected']} rejected, {st['resyncs']} resyncs, {st['reanchors']} reanchors")
+    for reason, n in sorted(st["rejected_by_reason"].items(), key=lambda kv: -kv[1]):
+        print(f"    {reason:<14} {n}")
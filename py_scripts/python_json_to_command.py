@@ -1,10 +1,17 @@
+import argparse
 import json
 import os
 import time
 
+from command_channel import add_channel_args, open_channel
+from event_log import EventLogReader
+from latency_trace import TraceRing, add_trace_args
+from packet_stream import STATE_MAP, decode_record
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SRC_FILE = os.path.join(BASE_DIR, "python_code", "game_logs")
 DST_DIR  = os.path.join(BASE_DIR, "Commands")
+EVENT_LOG = os.path.join(SRC_FILE, "events.bin")
 
 # Default state
 # Items Numbering:
@@ -18,7 +25,7 @@ DST_DIR  = os.path.join(BASE_DIR, "Commands")
 default_state = {
     "game_info": {
         "winner": 0,
-        "state_code": 0,
+        "state_code": 9,
         "state_name": "ITEM_INTO_LOAD",
         "turn_player_a": False,
         "turn_player_b": False
@@ -93,15 +100,38 @@ item_p1_position_map = {
     5: "="
 }
 
-def get_changes(old_state, new_state):
-    changes = {}
-    for key in new_state:
-        if key not in old_state or old_state[key] != new_state[key]:
-            changes[key] = new_state[key]
-    return changes
-
-def get_future_state(next_state_num):
-    path = os.path.join(SRC_FILE, f"state{next_state_num}.json")
+# state name → state_code，以及名稱中含 P0 / P1 的狀態（判斷射擊目標用）
+STATE_CODE = {name: code for code, name in STATE_MAP.items()}
+P0_STATES = frozenset(code for code, name in STATE_MAP.items() if "P0" in name)
+P1_STATES = frozenset(code for code, name in STATE_MAP.items() if "P1" in name)
+
+class StateFeed:
+    """
+    依序提供第 N 個 FPGA 狀態（PacketRecord，用法與 state{N}.json 的 dict 相同）。
+    來源是 python_uart_to_json 寫的 event log，tail 時不會讀到寫一半的 record。
+    """
+
+    def __init__(self, log_path=EVENT_LOG):
+        self._parse = decode_record
+        self.reader = EventLogReader(log_path)
+        self._records = self.reader.follow()
+        self.states = {}
+        self.count = 0
+
+    def get(self, n):
+        """回傳第 n 個狀態，還沒收到就等"""
+        while self.count <= n:
+            t_ns, packet = next(self._records)
+            if tracer is not None:
+                tracer.mark(self.count, "detected")
+            self.states[self.count] = self._parse(packet)
+            self.states.pop(self.count - 1, None)   # 只需要保留目前的狀態
+            self.count += 1
+        return self.states[n]
+
+
+def _load_json_state(state_num):
+    path = os.path.join(SRC_FILE, f"state{state_num}.json")
     while not os.path.exists(path):
         time.sleep(0.05)
     
@@ -113,12 +143,16 @@ def get_future_state(next_state_num):
             time.sleep(0.05)
             continue
 
-def write_command_file(filename, content):
-    filepath = os.path.join(DST_DIR, filename)
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write(content)
-        f.flush()
-        os.fsync(f.fileno())
+state_feed = None   # main() 建立；--json 時維持 None
+tracer = None       # --trace 時的 latency_trace.TraceRing
+
+def get_state(state_num):
+    if state_feed is None:
+        state = _load_json_state(state_num)
+        if tracer is not None:
+            tracer.mark(state_num, "detected")
+        return state
+    return state_feed.get(state_num)
 
 def get_p0_use_item_command(old_state, new_state, item_pos_index):
     command = ""
@@ -174,7 +208,31 @@ def get_p1_use_item_command(old_state, new_state, item_pos_index):
     command = item_p1_position_map[item_pos_index] + command
     return command
 
-def get_p0_bullet_change_command(old_state, new_state, future_state=None):
+def shot_target(player, old_state, new_state):
+    """
+    player（0 / 1）這一槍打的是 "self" 還是 "opponent"，只看 old_state → new_state，
+    不等下一個封包。依 Game_logic.sv 的 S_SHOOT_PROC：
+    - 實彈：HP 變少的一方
+    - 對手被銬時打對手：手銬在這一槍解除，回合留在開槍者
+    - → SHOOT_INTO_P0/P1_WAIT：下一個是誰的回合
+    - → SHOOT_INTO_LOAD：打對手（或打自己實彈）才換手，LOAD 不會再改 playerA / playerB，
+      所以封包的 turn bit 不是開槍者 ⇔ 打對手
+    """
+    me, other = ("p0", "p1") if player == 0 else ("p1", "p0")
+    if new_state["hp"][other] < old_state["hp"][other]:
+        return "opponent"
+    if new_state["hp"][me] < old_state["hp"][me]:
+        return "self"
+    if old_state["active_items"]["handcuff"] and not new_state["active_items"]["handcuff"]:
+        return "opponent"
+
+    code = new_state["game_info"]["state_code"]
+    if code in P0_STATES or code in P1_STATES:
+        return "self" if (code in P1_STATES) == (player == 1) else "opponent"
+    # playerA = P1
+    return "self" if new_state["game_info"]["turn_player_a"] == (player == 1) else "opponent"
+
+def get_p0_bullet_change_command(old_state, new_state):
     # Q: Blue->Blue Damage = 1
     # W: Blue->Blue Damage = 2
     # E: Blue->Red Damage = 1
@@ -188,36 +246,7 @@ def get_p0_bullet_change_command(old_state, new_state, future_state=None):
     if old_state["active_items"]["reverse"] == True:
         bullet_command = "B" if bullet_command == "L" else "L"
 
-    # Determine Target
-    target = "self"
-    if new_state["hp"]["p1"] < old_state["hp"]["p1"]:
-        target = "opponent"
-    elif new_state["hp"]["p0"] < old_state["hp"]["p0"]:
-        target = "self"
-    elif "P1" in new_state["game_info"]["state_name"]:
-        target = "opponent"
-    elif "P0" in new_state["game_info"]["state_name"]:
-        target = "self"
-    elif future_state:
-        if "P1" in future_state["game_info"]["state_name"]:
-            target = "opponent"
-        elif "P0" in future_state["game_info"]["state_name"]:
-            target = "self"
-        elif old_state["game_info"]["turn_player_a"] != future_state["game_info"]["turn_player_a"]:
-            target = "opponent"
-        else:
-            target = "self"
-    else:
-        if old_state["active_items"]["handcuff"]:
-            if not new_state["active_items"]["handcuff"]:
-                target = "opponent"
-            else:
-                target = "self"
-        else:
-            if old_state["game_info"]["turn_player_a"] != new_state["game_info"]["turn_player_a"]:
-                target = "opponent"
-            else:
-                target = "self"
+    target = shot_target(0, old_state, new_state)
 
     is_saw = old_state["active_items"]["saw"]
     if target == "opponent":
@@ -228,7 +257,7 @@ def get_p0_bullet_change_command(old_state, new_state, future_state=None):
     command = shoot_command + bullet_command
     return command
 
-def get_p1_bullet_change_command(old_state, new_state, future_state=None):
+def get_p1_bullet_change_command(old_state, new_state):
     # T: Red->Blue Damage = 1
     # Y: Red->Blue Damage = 2
     # U: Red->Red Damage = 1
@@ -242,36 +271,7 @@ def get_p1_bullet_change_command(old_state, new_state, future_state=None):
     if old_state["active_items"]["reverse"] == True:
         bullet_command = "B" if bullet_command == "L" else "L"
     
-    target = "self"
-    
-    if new_state["hp"]["p0"] < old_state["hp"]["p0"]:
-        target = "opponent"
-    elif new_state["hp"]["p1"] < old_state["hp"]["p1"]:
-        target = "self"
-    elif "P0" in new_state["game_info"]["state_name"]:
-        target = "opponent"
-    elif "P1" in new_state["game_info"]["state_name"]:
-        target = "self"
-    elif future_state:
-        if "P0" in future_state["game_info"]["state_name"]:
-            target = "opponent"
-        elif "P1" in future_state["game_info"]["state_name"]:
-            target = "self"
-        elif old_state["game_info"]["turn_player_b"] != future_state["game_info"]["turn_player_b"]:
-            target = "opponent"
-        else:
-            target = "self"
-    else:
-        if old_state["active_items"]["handcuff"]:
-            if not new_state["active_items"]["handcuff"]:
-                target = "opponent"
-            else:
-                target = "self"
-        else:
-            if old_state["game_info"]["turn_player_a"] == new_state["game_info"]["turn_player_a"]:
-                target = "opponent"
-            else:
-                target = "self"
+    target = shot_target(1, old_state, new_state)
 
     is_saw = old_state["active_items"]["saw"]
     if target == "opponent":
@@ -290,321 +290,161 @@ def get_bullet_count_command(old_state, new_state):
     command = f"{{{new_state['bullets']['filled_count']},{new_state['bullets']['empty_count']}}}"
     return command
 
-game_state_num = 0
-command_num = 0
-old_state = default_state
-new_state = default_state
-while True:
-    json_path = os.path.join(SRC_FILE, f"state{game_state_num}.json")
-    if os.path.exists(json_path):
-        try:
-            with open(json_path, "r", encoding="utf-8") as f:
-                new_state = json.load(f)
-        except json.JSONDecodeError:
-            time.sleep(0.05)
-            continue
-        changes = get_changes(old_state, new_state)
-
-        # INTO_DONE CHECK
-        if new_state["game_info"]["state_name"] == "INTO_DONE":
-            if old_state["game_info"]["state_name"] == "INTO_ITEM_P0_WAIT":
-                command = get_p0_bullet_change_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-            elif old_state["game_info"]["state_name"] == "INTO_ITEM_P1_WAIT":
-                command = get_p1_bullet_change_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-            elif old_state["game_info"]["state_name"] == "SHOOT_INTO_P0_WAIT":
-                command = get_p0_bullet_change_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-            elif old_state["game_info"]["state_name"] == "SHOOT_INTO_P1_WAIT":
-                command = get_p1_bullet_change_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-        
-        # SHOOT_INTO_LOAD CHECK
-        elif old_state["game_info"]["state_name"] == "SHOOT_INTO_LOAD":
-            # If new_state state_name is also INTO_LOAD, do nothing
-            if new_state["game_info"]["state_name"] == "SHOOT_INTO_LOAD":
-                pass
-            elif new_state["game_info"]["state_name"] == "ITEM_INTO_LOAD":
-                pass
-            else:
-                # Generate LOAD command
-                # 1. add items
-                b_cmds = "".join([f"[B{i}:{item_map.get(x, '')}]" for i, x in enumerate(new_state["items_p0"][:6])])
-                r_cmds = "".join([f"[R{i}:{item_map.get(x, '')}]" for i, x in enumerate(new_state["items_p1"][:6])])
-                write_command_file(f"{command_num:03d}.txt", b_cmds + r_cmds)
-                command_num += 1
-                # 2. add bullets
-                # filled at first, then empty
-                command = get_bullet_count_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                # Update HP
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-
-        # ITEM_INTO_LOAD CHECK
-        elif old_state["game_info"]["state_name"] == "ITEM_INTO_LOAD":
-            # If new_state state_name is also INTO_LOAD, do nothing
-            if new_state["game_info"]["state_name"] == "SHOOT_INTO_LOAD":
-                pass
-            elif new_state["game_info"]["state_name"] == "ITEM_INTO_LOAD":
-                pass
-            else:
-                # Generate LOAD command
-                # 1. add items
-                with open(os.path.join(DST_DIR, f"{command_num:03d}.txt"), "w", encoding="utf-8") as f:        
-                    b_cmds = "".join([f"[B{i}:{item_map.get(x, '')}]" for i, x in enumerate(new_state["items_p0"][:6])])
-                    r_cmds = "".join([f"[R{i}:{item_map.get(x, '')}]" for i, x in enumerate(new_state["items_p1"][:6])])
-                    f.write(b_cmds + r_cmds)
-                command_num += 1
-                # 2. add bullets
-                # filled at first, then empty
-                with open(os.path.join(DST_DIR, f"{command_num:03d}.txt"), "w", encoding="utf-8") as f:
-                    f.write(f"{{{new_state['bullets']['filled_count']},{new_state['bullets']['empty_count']}}}")
-                command_num += 1
-                # 3. Update HP
-                command = get_hp_command(old_state, new_state)
-                with open(os.path.join(DST_DIR, f"{command_num:03d}.txt"), "w", encoding="utf-8") as f:
-                    f.write(command)
-                command_num += 1
-
-        # INTO_ITEM_P0_WAIT CHECK
-        elif old_state["game_info"]["state_name"] == "INTO_ITEM_P0_WAIT":
-            if new_state["game_info"]["state_name"] == "INTO_ITEM_P0_WAIT":
-                if "items_p0" in changes:
-                    for i in range(6):
-                        if old_state["items_p0"][i] != new_state["items_p0"][i]:
-                            command = get_p0_use_item_command(old_state, new_state, i)
-                            with open(os.path.join(DST_DIR, f"{command_num:03d}.txt"), "w", encoding="utf-8") as f:
-                                f.write(command)
-                            command_num += 1
-                    command = get_hp_command(old_state, new_state)
-                    with open(os.path.join(DST_DIR, f"{command_num:03d}.txt"), "w", encoding="utf-8") as f:
-                        f.write(command)
-                    command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "INTO_ITEM_P1_WAIT":
-                pass
-
-            elif new_state["game_info"]["state_name"] == "SHOOT_INTO_P0_WAIT":
-                command = get_p0_bullet_change_command(old_state, new_state)
-                with open(os.path.join(DST_DIR, f"{command_num:03d}.txt"), "w", encoding="utf-8") as f:
-                    f.write(command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                with open(os.path.join(DST_DIR, f"{command_num:03d}.txt"), "w", encoding="utf-8") as f:
-                    f.write(command)
-                command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "SHOOT_INTO_P1_WAIT":
-                command = get_p0_bullet_change_command(old_state, new_state)
-                with open(os.path.join(DST_DIR, f"{command_num:03d}.txt"), "w", encoding="utf-8") as f:
-                    f.write(command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                with open(os.path.join(DST_DIR, f"{command_num:03d}.txt"), "w", encoding="utf-8") as f:
-                    f.write(command)
-                command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "SHOOT_INTO_LOAD":
-                future_state = get_future_state(game_state_num + 1)
-                command = get_p0_bullet_change_command(old_state, new_state, future_state)
-                with open(os.path.join(DST_DIR, f"{command_num:03d}.txt"), "w", encoding="utf-8") as f:
-                    f.write(command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                with open(os.path.join(DST_DIR, f"{command_num:03d}.txt"), "w", encoding="utf-8") as f:
-                    f.write(command)
-                command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "ITEM_INTO_LOAD":
-                if "items_p0" in changes:
-                    for i in range(6):
-                        if old_state["items_p0"][i] != new_state["items_p0"][i]:
-                            command = get_p0_use_item_command(old_state, new_state, i)
-                            with open(os.path.join(DST_DIR, f"{command_num:03d}.txt"), "w", encoding="utf-8") as f:
-                                f.write(command)
-                            command_num +=1
-
-        # INTO_ITEM_P1_WAIT CHECK
-        elif old_state["game_info"]["state_name"] == "INTO_ITEM_P1_WAIT":
-            if new_state["game_info"]["state_name"] == "INTO_ITEM_P0_WAIT":
-                pass
-
-            elif new_state["game_info"]["state_name"] == "INTO_ITEM_P1_WAIT":
-                if "items_p1" in changes:
-                    for i in range(6):
-                        if old_state["items_p1"][i] != new_state["items_p1"][i]:
-                            command = get_p1_use_item_command(old_state, new_state, i)
-                            write_command_file(f"{command_num:03d}.txt", command)
-                            command_num += 1
-                    command = get_hp_command(old_state, new_state)
-                    write_command_file(f"{command_num:03d}.txt", command)
-                    command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "SHOOT_INTO_P1_WAIT":
-                command = get_p1_bullet_change_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "SHOOT_INTO_P0_WAIT":
-                command = get_p1_bullet_change_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "SHOOT_INTO_LOAD":
-                future_state = get_future_state(game_state_num + 1)
-                command = get_p1_bullet_change_command(old_state, new_state, future_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "ITEM_INTO_LOAD":
-                if "items_p1" in changes:
-                    for i in range(6):
-                        if old_state["items_p1"][i] != new_state["items_p1"][i]:
-                            command = get_p1_use_item_command(old_state, new_state, i)
-                            write_command_file(f"{command_num:03d}.txt", command)
-                            command_num += 1
-
-        # SHOOT_INTO_P0_WAIT CHECK
-        elif old_state["game_info"]["state_name"] == "SHOOT_INTO_P0_WAIT":
-            if new_state["game_info"]["state_name"] == "INTO_ITEM_P0_WAIT":
-                if "items_p0" in changes:
-                    for i in range(6):
-                        if old_state["items_p0"][i] != new_state["items_p0"][i]:
-                            command = get_p0_use_item_command(old_state, new_state, i)
-                            write_command_file(f"{command_num:03d}.txt", command)
-                            command_num += 1
-                    command = get_hp_command(old_state, new_state)
-                    write_command_file(f"{command_num:03d}.txt", command)
-                    command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "INTO_ITEM_P1_WAIT":
-                if "items_p1" in changes:
-                    for i in range(6):
-                        if old_state["items_p1"][i] != new_state["items_p1"][i]:
-                            command = get_p1_use_item_command(old_state, new_state, i)
-                            write_command_file(f"{command_num:03d}.txt", command)
-                            command_num += 1
-                    command = get_hp_command(old_state, new_state)
-                    write_command_file(f"{command_num:03d}.txt", command)
-                    command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "SHOOT_INTO_P0_WAIT":
-                pass
-
-            elif new_state["game_info"]["state_name"] == "SHOOT_INTO_P1_WAIT":
-                command = get_p0_bullet_change_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "SHOOT_INTO_LOAD":
-                future_state = get_future_state(game_state_num + 1)
-                command = get_p0_bullet_change_command(old_state, new_state, future_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "ITEM_INTO_LOAD":
-                if "items_p0" in changes:
-                    for i in range(6):
-                        if old_state["items_p0"][i] != new_state["items_p0"][i]:
-                            command = get_p0_use_item_command(old_state, new_state, i)
-                            write_command_file(f"{command_num:03d}.txt", command)
-                            command_num += 1
-
-        # SHOOT_INTO_P1_WAIT CHECK
-        elif old_state["game_info"]["state_name"] == "SHOOT_INTO_P1_WAIT":
-            if new_state["game_info"]["state_name"] == "INTO_ITEM_P0_WAIT":
-                if "items_p0" in changes:
-                    for i in range(6):
-                        if old_state["items_p0"][i] != new_state["items_p0"][i]:
-                            command = get_p0_use_item_command(old_state, new_state, i)
-                            write_command_file(f"{command_num:03d}.txt", command)
-                            command_num += 1
-                    command = get_hp_command(old_state, new_state)
-                    write_command_file(f"{command_num:03d}.txt", command)
-                    command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "INTO_ITEM_P1_WAIT":
-                if "items_p1" in changes:
-                    for i in range(6):
-                        if old_state["items_p1"][i] != new_state["items_p1"][i]:
-                            command = get_p1_use_item_command(old_state, new_state, i)
-                            write_command_file(f"{command_num:03d}.txt", command)
-                            command_num += 1
-                    command = get_hp_command(old_state, new_state)
-                    write_command_file(f"{command_num:03d}.txt", command)
-                    command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "SHOOT_INTO_P0_WAIT":
-                command = get_p1_bullet_change_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "SHOOT_INTO_P1_WAIT":
-                command = get_p1_bullet_change_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "SHOOT_INTO_LOAD":
-                future_state = get_future_state(game_state_num + 1)
-                command = get_p1_bullet_change_command(old_state, new_state, future_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-                command_num += 1
-                command = get_hp_command(old_state, new_state)
-                write_command_file(f"{command_num:03d}.txt", command)
-
-                command_num += 1
-
-            elif new_state["game_info"]["state_name"] == "ITEM_INTO_LOAD":
-                if "items_p1" in changes:
-                    for i in range(6):
-                        if old_state["items_p1"][i] != new_state["items_p1"][i]:
-                            command = get_p1_use_item_command(old_state, new_state, i)
-                            write_command_file(f"{command_num:03d}.txt", command)
-                            command_num += 1
-        
-        old_state = new_state
-        game_state_num += 1
-    else:
-        time.sleep(0.1)
-        
\ No newline at end of file
+# ================================================================
+#   State transition table
+# ================================================================
+# handler(old_state, new_state) → command list
+def _use_items(player, with_hp=True):
+    """該玩家道具欄有變化：每個被用掉的道具一個 command（+ HP）"""
+    key = f"items_p{player}"
+    use_item_command = get_p0_use_item_command if player == 0 else get_p1_use_item_command
+
+    def handler(old_state, new_state):
+        old_items, new_items = old_state[key], new_state[key]
+        if old_items == new_items:
+            return []
+        commands = [use_item_command(old_state, new_state, i) for i in range(6) if old_items[i] != new_items[i]]
+        if with_hp:
+            commands.append(get_hp_command(old_state, new_state))
+        return commands
+    return handler
+
+
+def _shoot(player):
+    """開槍：子彈 / 目標 command + HP"""
+    bullet_change_command = get_p0_bullet_change_command if player == 0 else get_p1_bullet_change_command
+
+    def handler(old_state, new_state):
+        return [bullet_change_command(old_state, new_state), get_hp_command(old_state, new_state)]
+    return handler
+
+
+def _load(old_state, new_state):
+    """換彈：道具 → 子彈數（filled, empty）→ HP"""
+    b_cmds = "".join([f"[B{i}:{item_map.get(x, '')}]" for i, x in enumerate(new_state["items_p0"][:6])])
+    r_cmds = "".join([f"[R{i}:{item_map.get(x, '')}]" for i, x in enumerate(new_state["items_p1"][:6])])
+    return [b_cmds + r_cmds, get_bullet_count_command(old_state, new_state), get_hp_command(old_state, new_state)]
+
+
+# (old state, new state) → handler；不在表內的轉移不產生 command。
+# FSM（Game_logic.sv）新增狀態時，在 STATE_MAP 加名稱、在這裡加一行即可。
+_TRANSITIONS = {
+    ("INTO_ITEM_P0_WAIT",  "INTO_DONE"):          _shoot(0),
+    ("INTO_ITEM_P1_WAIT",  "INTO_DONE"):          _shoot(1),
+    ("SHOOT_INTO_P0_WAIT", "INTO_DONE"):          _shoot(0),
+    ("SHOOT_INTO_P1_WAIT", "INTO_DONE"):          _shoot(1),
+
+    ("INTO_ITEM_P0_WAIT",  "INTO_ITEM_P0_WAIT"):  _use_items(0),
+    ("INTO_ITEM_P0_WAIT",  "SHOOT_INTO_P0_WAIT"): _shoot(0),
+    ("INTO_ITEM_P0_WAIT",  "SHOOT_INTO_P1_WAIT"): _shoot(0),
+    ("INTO_ITEM_P0_WAIT",  "SHOOT_INTO_LOAD"):    _shoot(0),
+    ("INTO_ITEM_P0_WAIT",  "ITEM_INTO_LOAD"):     _use_items(0, with_hp=False),
+
+    ("INTO_ITEM_P1_WAIT",  "INTO_ITEM_P1_WAIT"):  _use_items(1),
+    ("INTO_ITEM_P1_WAIT",  "SHOOT_INTO_P1_WAIT"): _shoot(1),
+    ("INTO_ITEM_P1_WAIT",  "SHOOT_INTO_P0_WAIT"): _shoot(1),
+    ("INTO_ITEM_P1_WAIT",  "SHOOT_INTO_LOAD"):    _shoot(1),
+    ("INTO_ITEM_P1_WAIT",  "ITEM_INTO_LOAD"):     _use_items(1, with_hp=False),
+
+    ("SHOOT_INTO_P0_WAIT", "INTO_ITEM_P0_WAIT"):  _use_items(0),
+    ("SHOOT_INTO_P0_WAIT", "INTO_ITEM_P1_WAIT"):  _use_items(1),
+    ("SHOOT_INTO_P0_WAIT", "SHOOT_INTO_P1_WAIT"): _shoot(0),
+    ("SHOOT_INTO_P0_WAIT", "SHOOT_INTO_P0_WAIT"): _shoot(0),
+    ("SHOOT_INTO_P0_WAIT", "SHOOT_INTO_LOAD"):    _shoot(0),
+    ("SHOOT_INTO_P0_WAIT", "ITEM_INTO_LOAD"):     _use_items(0, with_hp=False),
+
+    ("SHOOT_INTO_P1_WAIT", "INTO_ITEM_P0_WAIT"):  _use_items(0),
+    ("SHOOT_INTO_P1_WAIT", "INTO_ITEM_P1_WAIT"):  _use_items(1),
+    ("SHOOT_INTO_P1_WAIT", "SHOOT_INTO_P0_WAIT"): _shoot(1),
+    ("SHOOT_INTO_P1_WAIT", "SHOOT_INTO_P1_WAIT"): _shoot(1),
+    ("SHOOT_INTO_P1_WAIT", "SHOOT_INTO_LOAD"):    _shoot(1),
+    ("SHOOT_INTO_P1_WAIT", "ITEM_INTO_LOAD"):     _use_items(1, with_hp=False),
+}
+# 從 *_INTO_LOAD 離開（進入其他任何狀態）就是新的一輪：產生換彈 command
+for _old in ("ITEM_INTO_LOAD", "SHOOT_INTO_LOAD"):
+    for _new in STATE_MAP.values():
+        if _new not in ("ITEM_INTO_LOAD", "SHOOT_INTO_LOAD", "INTO_DONE"):
+            _TRANSITIONS[(_old, _new)] = _load
+
+# 以 state_code 查表（每個封包一次 dict lookup，不比對字串）
+TRANSITIONS = {(STATE_CODE[old], STATE_CODE[new]): handler for (old, new), handler in _TRANSITIONS.items()}
+
+
+def translate(old_state, new_state):
+    """old_state → new_state 的狀態轉移要送給 Unity 的 command 字串（依序）"""
+    handler = TRANSITIONS.get((old_state["game_info"]["state_code"], new_state["game_info"]["state_code"]))
+    return handler(old_state, new_state) if handler is not None else []
+
+
+class TargetCheck:
+    """
+    --check-target：→ SHOOT_INTO_LOAD 的射擊目標是由該封包的 turn bit 推測的（不等下一個封包）。
+    下一輪第一個 INTO_ITEM_P0/P1_WAIT 到了之後核對先手，不一致時印警告並計數。
+    Unity 沒有撤銷動畫的 command；HP / 換彈 command 本來就以新封包為準。
+    fpga_sim 的 BuckshotEnv 每輪隨機決定先手，所以只有接真正的 FPGA 時才有意義。
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.mismatches = 0
+
+    def __call__(self, seq, old_state, new_state):
+        """seq: new_state 的編號"""
+        if old_state["game_info"]["state_code"] != STATE_CODE["SHOOT_INTO_LOAD"]:
+            return
+        code = new_state["game_info"]["state_code"]
+        if code not in P0_STATES and code not in P1_STATES:
+            return
+        self.checked += 1
+        if (code in P1_STATES) != old_state["game_info"]["turn_player_a"]:
+            self.mismatches += 1
+            print(f"[check-target] state {seq - 1}: turn bit 與下一輪先手不一致，射擊目標可能錯誤")
+
+    def summary(self):
+        return f"Target check: {self.mismatches} mismatches in {self.checked} reloads after a shot"
+
+
+def add_check_args(parser):
+    parser.add_argument("--check-target", action="store_true",
+                        help="用下一個封包核對 SHOOT_INTO_LOAD 推測的射擊目標（不一致時印警告）")
+
+def main(args):
+    global state_feed, tracer
+    check = TargetCheck() if args.check_target else None
+    if args.trace:
+        tracer = TraceRing(name="python_json_to_command")
+    # 預設從 binary event log 讀狀態；--json 則沿用舊的 state{N}.json 輪詢
+    if not args.json:
+        state_feed = StateFeed()
+
+    # 每次狀態轉移的 command 一個 batch（檔案 atomic rename 或 socket 推送）
+    channel = open_channel(args, DST_DIR)
+    game_state_num = 0
+    old_state = default_state
+    try:
+        while True:
+            new_state = get_state(game_state_num)
+            commands = translate(old_state, new_state)
+            if check is not None:
+                check(game_state_num, old_state, new_state)
+            if tracer is not None:
+                tracer.mark(game_state_num, "translated")
+            channel.write_batch(commands)
+            if tracer is not None:
+                tracer.mark(game_state_num, "command_written")
+            old_state = new_state
+            game_state_num += 1
+    finally:
+        channel.close()
+        if check is not None:
+            print(check.summary())
+        if tracer is not None:
+            print(f"Trace saved to {tracer.save(args.trace)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FPGA 狀態 → Unity command")
+    parser.add_argument("--json", action="store_true", help="輪詢 game_logs/state{N}.json（舊流程）")
+    add_channel_args(parser)
+    add_check_args(parser)
+    add_trace_args(parser)
+    main(parser.parse_args())
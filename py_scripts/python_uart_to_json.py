@@ -1,22 +1,18 @@
+import argparse
 import serial
-import time
 import json
 import os
 
+from event_log import EventLogWriter, read_log
+from latency_trace import TraceRing, add_trace_args
+from packet_stream import STATE_MAP, PacketStream, print_link_stats
+
 # --- 設定區 ---
 COM_PORT = 'COM4'  # 請確認你的裝置管理員
 BAUD_RATE = 115200
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.join(BASE_DIR, "game_logs")  # JSON 存檔的資料夾名稱
-
-# 狀態名稱對照表 (方便 Debug 用，不影響 JSON 數值)
-STATE_MAP = {
-    0: "IDLE", 1: "LOAD", 2: "ITEM_P0", 3: "ITEM_P1",
-    4: "ITEM_PROC", 5: "SHOOT_P0", 6: "SHOOT_P1", 
-    7: "SHOOT_PROC", 8: "DONE",9: "ITEM_INTO_LOAD",10: "SHOOT_INTO_LOAD",
-    11: "INTO_ITEM_P0_WAIT",12: "INTO_ITEM_P1_WAIT",13: "SHOOT_INTO_P0_WAIT",14: "SHOOT_INTO_P1_WAIT",
-    15: "INTO_DONE"
-}
+EVENT_LOG = os.path.join(OUTPUT_DIR, "events.bin")  # 原始封包 + 時間戳（python_json_to_command 讀這個）
 
 def parse_packet(packet):
     """
@@ -131,57 +127,72 @@ def save_to_json(data, counter):
         json.dump(data, f, indent=4, ensure_ascii=False)
     print(f"[Saved] {filename} (State: {data['game_info']['state_name']})")
 
-def main():
+def export_log_to_json(log_path=EVENT_LOG):
+    """把 event log 轉成舊的 state{N}.json（debug 用）"""
+    for counter, (_, packet) in enumerate(read_log(log_path)):
+        save_to_json(parse_packet(packet), counter)
+
+def main(write_json=False, trace_path=None):
     # 建立輸出目錄
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
         print(f"Created directory: {OUTPUT_DIR}")
 
     state_counter = 0
-    buffer = bytearray()
+    tracer = TraceRing(name="python_uart_to_json") if trace_path else None
 
     try:
         ser = serial.Serial(COM_PORT, BAUD_RATE, timeout=0.1)
         print(f"Listening on {COM_PORT} at {BAUD_RATE}...")
         print(f"Waiting for header 0xA5...")
 
-        while True:
-            # 讀取所有可用的 bytes 到 buffer
-            if ser.in_waiting > 0:
-                chunk = ser.read(ser.in_waiting)
-                buffer.extend(chunk)
-
-                # 處理 buffer，尋找完整封包 (14 bytes)
-                while len(buffer) >= 14:
-                    # 檢查 Header
-                    if buffer[0] == 0xA5:
-                        # 提取一個完整封包
-                        packet = buffer[0:14]
-                        
-                        # 解析數據
-                        parsed_data = parse_packet(packet)
-                        
-                        # 儲存 JSON
-                        save_to_json(parsed_data, state_counter)
-                        state_counter += 1
-                        
-                        # 從 buffer 移除已處理的數據
-                        del buffer[0:14]
-                    else:
-                        # 如果第一個 byte 不是 0xA5，代表錯位，移除第一個 byte 繼續找
-                        # print(f"Skipping byte {hex(buffer[0])}, waiting for header...")
-                        del buffer[0]
-            
-            # 短暫休息避免 CPU 滿載
-            time.sleep(0.01)
+        # PacketStream 以 readinto 讀進預先配置的 buffer，找 0xA5 後
+        # yield 14-byte 封包（memoryview）；錯位的 byte 會自動跳過。
+        # 讀取會等到有資料或 timeout，不需要固定 sleep。
+        # 不合理的封包（錯位 / bit error）會被丟掉，計數見 stream.stats()
+        stream = PacketStream(ser)
+        with EventLogWriter(EVENT_LOG) as log:
+            for packet in stream:
+                if tracer is not None:
+                    tracer.mark(state_counter, "serial_read", stream.last_read_ns)
+                    tracer.mark(state_counter, "header_found")
+
+                # 原始封包 + 時間戳寫入 event log
+                log.append(packet)
+                if tracer is not None:
+                    tracer.mark(state_counter, "logged")
+
+                # 儲存 JSON（debug 用）
+                if write_json:
+                    data = parse_packet(packet)
+                    if tracer is not None:
+                        tracer.mark(state_counter, "parsed")
+                    save_to_json(data, state_counter)
+                    if tracer is not None:
+                        tracer.mark(state_counter, "json_written")
+                state_counter += 1
 
     except serial.SerialException as e:
         print(f"Error: Could not open serial port {COM_PORT}.")
         print(f"Details: {e}")
     except KeyboardInterrupt:
         print("\nExiting...")
+        if 'stream' in locals():
+            print_link_stats(stream)
         if 'ser' in locals() and ser.is_open:
             ser.close()
+    finally:
+        if tracer is not None:
+            print(f"Trace saved to {tracer.save(trace_path)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="FPGA UART → event log (game_logs/events.bin)")
+    parser.add_argument("--json", action="store_true", help="同時輸出 state{N}.json（debug 用）")
+    parser.add_argument("--export-json", action="store_true", help="把現有 event log 轉成 state{N}.json 後結束")
+    add_trace_args(parser)
+    args = parser.parse_args()
+
+    if args.export_json:
+        export_log_to_json()
+    else:
+        main(write_json=args.json, trace_path=args.trace)
@@ -0,0 +1,206 @@
+"""
+Inference-only actor for the Buckshot MLP (33 → 128 → 128 → 10).
+
+Only the policy half of MaskableActorCriticPolicy is kept
+(mlp_extractor.policy_net + action_net); the forward pass is plain NumPy,
+so it can run inside env worker processes without torch.
+
+Exported actors are stored as .npz (one array per ACTOR_SHAPES key) and load
+without importing torch, gymnasium or stable-baselines3:
+
+    python actor_policy.py models/buckshot_final.zip buckshot_actor.npz
+"""
+
+import os
+
+import numpy as np
+
+OBS_DIM = 33
+HIDDEN_DIM = 128
+N_ACTIONS = 10
+
+# 權重名稱與 extract_weights.py 相同
+ACTOR_SHAPES = {
+    "fc1_weight": (HIDDEN_DIM, OBS_DIM),
+    "fc1_bias":   (HIDDEN_DIM,),
+    "fc2_weight": (HIDDEN_DIM, HIDDEN_DIM),
+    "fc2_bias":   (HIDDEN_DIM,),
+    "fc3_weight": (N_ACTIONS, HIDDEN_DIM),
+    "fc3_bias":   (N_ACTIONS,),
+}
+
+# MaskableCategorical 對 invalid action 使用的 logit
+MASKED_LOGIT = -1e8
+
+
+def extract_actor_weights(policy):
+    """
+    Copy the actor weights out of an SB3 MaskableActorCriticPolicy.
+
+    Args:
+        policy: model.policy of a MaskablePPO with net_arch=[128, 128]
+
+    Returns:
+        dict name → float32 numpy array (ACTOR_SHAPES layout)
+    """
+    layers = {
+        "fc1": policy.mlp_extractor.policy_net[0],
+        "fc2": policy.mlp_extractor.policy_net[2],
+        "fc3": policy.action_net,
+    }
+    weights = {}
+    for name, layer in layers.items():
+        weights[f"{name}_weight"] = layer.weight.detach().cpu().numpy().astype(np.float32)
+        weights[f"{name}_bias"] = layer.bias.detach().cpu().numpy().astype(np.float32)
+    return weights
+
+
+def export_actor_npz(model_path, npz_path):
+    """
+    Export the actor of a saved MaskablePPO (.zip) to an .npz file.
+    Only this step needs torch / sb3_contrib.
+    """
+    from sb3_contrib import MaskablePPO
+
+    model = MaskablePPO.load(model_path, device="cpu")
+    np.savez(npz_path, **extract_actor_weights(model.policy))
+
+
+def load_actor_weights(path):
+    """Actor weights (ACTOR_SHAPES dict) from an exported .npz or a MaskablePPO .zip."""
+    if os.path.splitext(path)[1] == ".npz":
+        with np.load(path) as data:
+            return {name: data[name] for name in ACTOR_SHAPES}
+    from sb3_contrib import MaskablePPO
+    return extract_actor_weights(MaskablePPO.load(path, device="cpu").policy)
+
+
+def load_policy(path, seed=None):
+    """
+    Load a policy with a MaskablePPO-style predict().
+    .npz → NumpyActor (no torch import); anything else → MaskablePPO.load
+    """
+    if os.path.splitext(path)[1] == ".npz":
+        return NumpyActor.load(path, seed=seed)
+    from sb3_contrib import MaskablePPO
+    return MaskablePPO.load(path)
+
+
+class NumpyActor:
+    """
+    NumPy 版 actor，predict() 介面與 MaskablePPO.predict 相同，
+    可以直接當作 BuckshotEnv 的 opponent_model。
+
+    predict() 的中間結果都寫在預先配置的 buffer 裡（依 batch 大小成長），
+    回傳的 batch actions 也是 buffer 的 view，下次呼叫前有效。
+    """
+
+    def __init__(self, weights=None, seed=None, batch_size=1):
+        if weights is None:
+            weights = {name: np.zeros(shape, dtype=np.float32) for name, shape in ACTOR_SHAPES.items()}
+        self.weights = {}
+        self.load_weights(weights)
+        self.rng = np.random.default_rng(seed)
+        self._capacity = 0
+        self._alloc_buffers(batch_size)
+
+    @classmethod
+    def load(cls, path, seed=None, batch_size=1):
+        """Load an actor exported by export_actor_npz / save."""
+        return cls(load_actor_weights(path), seed=seed, batch_size=batch_size)
+
+    def save(self, path):
+        np.savez(path, **self.weights)
+
+    def _alloc_buffers(self, n):
+        self._capacity = n
+        self._obs = np.empty((n, OBS_DIM), dtype=np.float32)
+        self._h1 = np.empty((n, HIDDEN_DIM), dtype=np.float32)
+        self._h2 = np.empty((n, HIDDEN_DIM), dtype=np.float32)
+        self._logits = np.empty((n, N_ACTIONS), dtype=np.float32)
+        self._invalid = np.empty((n, N_ACTIONS), dtype=bool)
+        self._row = np.empty((n, 1), dtype=np.float32)
+        self._u = np.empty((n, 1), dtype=np.float64)
+        self._actions = np.empty(n, dtype=np.intp)
+
+    def load_weights(self, weights):
+        """Copy ``weights`` into this actor's own arrays."""
+        for name, shape in ACTOR_SHAPES.items():
+            w = np.asarray(weights[name], dtype=np.float32)
+            if w.shape != shape:
+                raise ValueError(f"{name}: expected shape {shape}, got {w.shape}")
+            if name in self.weights:
+                self.weights[name][...] = w
+            else:
+                self.weights[name] = w.copy()
+
+    def logits(self, obs):
+        """(N, 33) observations → (N, 10) action logits"""
+        w = self.weights
+        h = np.maximum(obs @ w["fc1_weight"].T + w["fc1_bias"], 0.0)
+        h = np.maximum(h @ w["fc2_weight"].T + w["fc2_bias"], 0.0)
+        return h @ w["fc3_weight"].T + w["fc3_bias"]
+
+    def predict(self, obs, action_masks=None, deterministic=False):
+        """
+        Args:
+            obs: (33,) or (N, 33) observation(s)
+            action_masks: (10,) or (N, 10) binary mask (1=valid, 0=invalid)
+            deterministic: If True, pick best action; if False, sample
+
+        Returns:
+            (action, None) like MaskablePPO.predict
+        """
+        obs = np.asarray(obs)
+        single = obs.ndim == 1
+        n = 1 if single else len(obs)
+        if n > self._capacity:
+            self._alloc_buffers(n)
+
+        x, h1, h2, logits = self._obs[:n], self._h1[:n], self._h2[:n], self._logits[:n]
+        actions = self._actions[:n]
+        np.copyto(x, obs.reshape(n, OBS_DIM))
+
+        w = self.weights
+        np.matmul(x, w["fc1_weight"].T, out=h1)
+        h1 += w["fc1_bias"]
+        np.maximum(h1, 0.0, out=h1)
+        np.matmul(h1, w["fc2_weight"].T, out=h2)
+        h2 += w["fc2_bias"]
+        np.maximum(h2, 0.0, out=h2)
+        np.matmul(h2, w["fc3_weight"].T, out=logits)
+        logits += w["fc3_bias"]
+
+        if action_masks is not None:
+            invalid = self._invalid[:n]
+            np.equal(np.asarray(action_masks).reshape(n, N_ACTIONS), 0, out=invalid)
+            np.copyto(logits, MASKED_LOGIT, where=invalid)
+
+        if deterministic:
+            np.argmax(logits, axis=1, out=actions)
+        else:
+            # Sample from softmax distribution (inverse CDF), in place on logits
+            row, u, below = self._row[:n], self._u[:n], self._invalid[:n]
+            np.max(logits, axis=1, keepdims=True, out=row)
+            logits -= row
+            np.exp(logits, out=logits)
+            np.cumsum(logits, axis=1, out=logits)
+            self.rng.random(out=u)
+            u *= logits[:, -1:]
+            np.less_equal(logits, u, out=below)
+            np.sum(below, axis=1, out=actions)
+            np.minimum(actions, N_ACTIONS - 1, out=actions)
+
+        return (int(actions[0]) if single else actions), None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export a MaskablePPO actor to .npz for NumPy inference")
+    parser.add_argument("model", type=str, help="Path to trained model (e.g., models/buckshot_final.zip)")
+    parser.add_argument("output", type=str, help="Output .npz path")
+    args = parser.parse_args()
+
+    export_actor_npz(args.model, args.output)
+    print(f"✓ Actor exported to {args.output}")
@@ -0,0 +1,530 @@
+"""
+Vectorized Buckshot Roulette simulator.
+
+BatchedBuckshotEnv 同時模擬 N 場 BuckshotEnv 對局，所有狀態都以
+structure-of-arrays 的 NumPy 陣列保存：
+
+- hp / handcuffed:  (N, 2)      index 0 = P1, 1 = P2
+- items:            (N, 2, 7)   順序與 ITEM_LIST 相同
+- magazine:         (N,) uint8  live bitmap，bit i = 第 i 顆子彈（與 FPGA byte 7 相同）
+- known / seen_live:(N, 2) uint8 每位玩家的子彈知識 bitmask
+- phase / turn:     (N,) int8   PHASE_* / P1, P2
+
+_use_item / _shoot / _load_new_round / action_masks 的規則與 buckshot_env.py
+完全相同，只是改成對一組遊戲做 masked array 運算。encode() 產生的
+(N, 33) observation 與 StateEncoder.encode 逐位元相同
+（batched_env_check.py 逐步比對 obs 與 action mask）。
+
+這是獨立的模擬器，不是 SB3 VecEnv：step() 回傳的 info 是一個 dict of arrays，
+train.py 不能直接拿來訓練。
+"""
+
+import numpy as np
+
+from buckshot_env import ITEM_LIST, INVALID_ACTION_PENALTY
+from deal_tables import DEAL_SIZES, DEAL_TABLE, MAGAZINE_BLANK, MAGAZINE_LIVE, MAGAZINES, N_MAGAZINES
+from game_state import (
+    GameState, CompactGameState, CompactPlayerState, MAX_BULLETS,
+    P1, P2, PHASE_LOAD, PHASE_ITEM, PHASE_SHOOT, PHASE_GAME_END,
+)
+
+# item index（ITEM_LIST 順序）
+MAGNIFIER, CIGARETTE, BEER, SAW, HANDCUFF, PHONE, REVERSE = range(len(ITEM_LIST))
+
+MAX_ITEM_ACTIONS = 6
+OBS_DIM = 33
+
+_SLOTS = np.arange(MAX_BULLETS)
+
+
+def _bit(index):
+    """Bitmask for bullet ``index`` (0 when the index is past the magazine)."""
+    index = index.astype(np.int32)
+    return np.where(index < MAX_BULLETS, 1 << np.minimum(index, MAX_BULLETS - 1), 0).astype(np.uint8)
+
+
+class BatchedBuckshotEnv:
+    """
+    N 場 BuckshotEnv 的向量化版本。
+    P2 = agent（由 step() 的 actions 控制）
+    P1 = opponent_model 或隨機策略（一次 batch predict 所有等待中的遊戲）
+
+    step() 回傳 (obs, rewards, dones, info)：結束的遊戲會自動 reset（obs 是新局的），
+    info 是 dict of arrays，不是 SB3 的 per-env dict list：
+        info["win"]                  (N,) bool
+        info["terminal_observation"] (dones.sum(), 33)，依 np.flatnonzero(dones) 的順序
+    """
+
+    def __init__(self, num_envs, opponent_model=None, seed=None):
+        self.num_envs = num_envs
+        self.opponent_model = opponent_model
+        self.rng = np.random.default_rng(seed)
+
+        n = num_envs
+        self.hp = np.zeros((n, 2), dtype=np.int8)
+        self.handcuffed = np.zeros((n, 2), dtype=bool)
+        self.items = np.zeros((n, 2, len(ITEM_LIST)), dtype=np.int8)
+
+        self.magazine = np.zeros(n, dtype=np.uint8)
+        self.n_bullets = np.zeros(n, dtype=np.int8)
+        self.current_index = np.zeros(n, dtype=np.int8)
+        self.live_left = np.zeros(n, dtype=np.int8)
+        self.blank_left = np.zeros(n, dtype=np.int8)
+
+        self.known = np.zeros((n, 2), dtype=np.uint8)
+        self.seen_live = np.zeros((n, 2), dtype=np.uint8)
+
+        self.saw_active = np.zeros(n, dtype=bool)
+        self.reverse_active = np.zeros(n, dtype=bool)
+        self.phase = np.full(n, PHASE_LOAD, dtype=np.int8)
+        self.turn = np.full(n, P1, dtype=np.int8)
+
+        # P1 回合內的進度（對應 _opponent_turn 的 local 變數）
+        self._p1_turn_start = np.zeros(n, dtype=bool)
+        self._p1_items_taken = np.zeros(n, dtype=np.int8)
+
+    # ---------------------------------------------------------
+    # reset
+    # ---------------------------------------------------------
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+
+        self._reset_games(np.arange(self.num_envs))
+        return self.encode(P2)
+
+    def _reset_games(self, g):
+        self.hp[g] = 4
+        self.handcuffed[g] = False
+        self.items[g] = 0
+        self.phase[g] = PHASE_LOAD
+        self.turn[g] = P1
+
+        self._load_new_round(g)
+        self._run_opponent()
+
+    # ---------------------------------------------------------
+    # step
+    # ---------------------------------------------------------
+    def step(self, actions):
+        """
+        Args:
+            actions: (N,) P2 actions
+
+        Returns:
+            obs (N, 33), rewards (N,), dones (N,), info dict of arrays（見 class docstring）
+        """
+        actions = np.asarray(actions).astype(np.int64).reshape(self.num_envs)
+        reward = np.zeros(self.num_envs, dtype=np.float64)
+
+        # P2 被手銬：直接跳過，先讓 P1 行動
+        skip = (self.turn == P2) & (self.phase == PHASE_ITEM) & self.handcuffed[:, P2]
+        self.handcuffed[skip, P2] = False
+        self.turn[skip] = P1
+        self._run_opponent()
+
+        # ---------- P2 行動 (item phase / shoot phase) ----------
+        gi = np.flatnonzero(self.phase == PHASE_ITEM)
+        gs = np.flatnonzero(self.phase == PHASE_SHOOT)
+        reward[gi] += self._apply_item_action(gi, actions[gi])
+        reward[gs] += self._apply_shoot_action(gs, actions[gs])
+
+        # ---------- 如果子彈打完，自動 load 下一 round ----------
+        alive = self.phase != PHASE_GAME_END
+        self._load_new_round(np.flatnonzero(alive & (self.current_index >= self.n_bullets)))
+
+        # ---------- P1 對手回合 ----------
+        self._run_opponent()
+
+        dones = self.phase == PHASE_GAME_END
+        win = dones & (self.hp[:, P2] > 0)
+        reward[dones] += np.where(win[dones] & (self.hp[dones, P1] <= 0), 10.0, -10.0)
+
+        obs = self.encode(P2)
+        info = {"win": win, "terminal_observation": obs[dones].copy()}
+
+        done_idx = np.flatnonzero(dones)
+        if len(done_idx):
+            self._reset_games(done_idx)
+            obs[done_idx] = self.encode(P2)[done_idx]
+
+        return obs, reward.astype(np.float32), dones, info
+
+    # ---------------------------------------------------------
+    # 內部邏輯：load new round
+    # ---------------------------------------------------------
+    def _load_new_round(self, g):
+        if len(g) == 0:
+            return
+        rng = self.rng
+
+        # 彈匣查表（combo + 排列一次抽完，見 deal_tables.MAGAZINES）
+        k = rng.integers(N_MAGAZINES, size=len(g))
+        live = MAGAZINE_LIVE[k]
+        blank = MAGAZINE_BLANK[k]
+
+        self.magazine[g] = MAGAZINES[k]
+        self.n_bullets[g] = live + blank
+        self.live_left[g] = live
+        self.blank_left[g] = blank
+        self.current_index[g] = 0
+
+        self.phase[g] = PHASE_ITEM
+        self.turn[g] = rng.integers(2, size=len(g))
+
+        self.saw_active[g] = False
+        self.reverse_active[g] = False
+
+        self.known[g] = 0
+        self.seen_live[g] = 0
+
+        self._give_items(g)
+
+    # ---------------------------------------------------------
+    # 給道具
+    # ---------------------------------------------------------
+    def _give_items(self, g, amount=4):
+        total = self.items[g].sum(axis=2)
+        give_count = np.clip(np.minimum(amount, 6 - total), 0, None)
+
+        # 每位玩家從「give_count 種不重複道具」的所有組合中抽一個（deal_tables.DEAL_TABLE）
+        deal = (self.rng.random((len(g), 2)) * DEAL_SIZES[give_count]).astype(np.int64)
+        self.items[g] += DEAL_TABLE[give_count, deal]
+
+    # ---------------------------------------------------------
+    # P2 行為：item phase
+    # ---------------------------------------------------------
+    def _apply_item_action(self, g, action):
+        reward = np.zeros(len(g), dtype=np.float64)
+
+        # Disallow shooting actions during item phase: heavy penalty
+        reward[action <= 1] = INVALID_ACTION_PENALTY
+
+        # 9 = ready → 進入 shoot phase
+        self.phase[g[action == 9]] = PHASE_SHOOT
+
+        # 2~8 = use item
+        use = (action >= 2) & (action <= 8)
+        item = np.clip(action - 2, 0, len(ITEM_LIST) - 1)
+        has_item = self.items[g, P2, item] > 0
+        reward[use & ~has_item] = -1    # 用不了，輕微懲罰
+
+        ok = use & has_item
+        reward[ok] += self._use_item(g[ok], P2, item[ok])
+        return reward
+
+    # ---------------------------------------------------------
+    # P2 行為：射擊
+    # ---------------------------------------------------------
+    def _apply_shoot_action(self, g, action):
+        reward = np.zeros(len(g), dtype=np.float64)
+
+        bit = _bit(self.current_index[g])
+        known = (self.known[g, P2] & bit) != 0
+        live = (self.seen_live[g, P2] & bit) != 0
+        known_live = known & live
+        known_blank = known & ~live
+
+        # Any non-shoot action during shoot phase - heavy invalid penalty
+        reward[action >= 2] = INVALID_ACTION_PENALTY
+
+        enemy = action == 0
+        reward[enemy & known_blank] -= 2.0
+        reward[enemy & known_live] += np.where(self.saw_active[g[enemy & known_live]], 2.0, 1.0)
+
+        shoot_self = action == 1
+        reward[shoot_self & known_blank] += 2.0
+        reward[shoot_self & known_live] -= 3.0
+
+        shooting = enemy | shoot_self
+        reward[shooting] += self._shoot(g[shooting], P2, shoot_self[shooting])
+        return reward
+
+    # ---------------------------------------------------------
+    # 道具邏輯
+    # ---------------------------------------------------------
+    def _reveal(self, g, player, bit, live):
+        self.known[g, player] |= bit
+        self.seen_live[g, player] = (self.seen_live[g, player] & ~bit) | np.where(live, bit, 0).astype(np.uint8)
+
+    def _use_item(self, g, player, item):
+        """
+        Use ``item`` (ITEM_LIST index, per game) for ``player`` in games ``g``.
+        Returns the reward for each game.
+        """
+        opponent = 1 - player
+        reward = np.zeros(len(g), dtype=np.float64)
+
+        idx = self.current_index[g]
+        n = self.n_bullets[g]
+        has_bullet = idx < n
+        bit = _bit(idx)
+        known = (self.known[g, player] & bit) != 0
+        known_live = known & ((self.seen_live[g, player] & bit) != 0)
+        known_blank = known & ~known_live
+        real_live = (self.magazine[g] & bit) != 0
+
+        # magnifier
+        sel = (item == MAGNIFIER) & has_bullet
+        reward[sel & known] -= 1.0  # Already knew
+        look = sel & ~known
+        deducible = (self.live_left[g] == 0) | (self.blank_left[g] == 0)
+        reward[look] += np.where(deducible[look], -1.0, 1.0)
+        self._reveal(g[look], player, bit[look], real_live[look])
+
+        # cigarette
+        sel = item == CIGARETTE
+        full = sel & (self.hp[g, player] >= 4)
+        self.hp[g[full], player] = 4
+        reward[full] -= 1.0
+        heal = sel & ~full
+        self.hp[g[heal], player] += 1
+        reward[heal] += 1.0
+
+        # beer
+        sel = (item == BEER) & has_bullet
+        reward[sel] += np.where(known[sel] | self.saw_active[g[sel]] | self.reverse_active[g[sel]], -0.5, 0.1)
+        gb = g[sel]
+        self._reveal(gb, player, bit[sel], real_live[sel])
+        self._reveal(gb, opponent, bit[sel], real_live[sel])
+        self.live_left[gb] -= real_live[sel]
+        self.blank_left[gb] -= ~real_live[sel]
+        self.current_index[gb] += 1
+        reward[(item == BEER) & ~has_bullet] -= 1.0
+
+        # saw
+        sel = item == SAW
+        self.saw_active[g[sel]] = True
+        reward[sel] += np.where(known_live[sel], 1.0, np.where(known_blank[sel], -1.0, 0.1))
+
+        # handcuff
+        sel = item == HANDCUFF
+        self.handcuffed[g[sel], opponent] = True
+        reward[sel] += np.where(self.blank_left[g[sel]] + self.live_left[g[sel]] < 2, 0.0, 0.5)
+
+        # phone
+        sel = item == PHONE
+        remaining = n - idx
+        reward[sel & (remaining <= 0)] -= 1.0
+        reveal = sel & (remaining > 0)
+        # 剩 3 顆以內揭示最後一顆，否則從最後 3 顆中隨機選一顆
+        chosen = (n - 1) - np.where(remaining > 3, self.rng.integers(3, size=len(g)), 0)
+        chosen_bit = _bit(chosen)
+        self._reveal(g[reveal], player, chosen_bit[reveal], (self.magazine[g] & chosen_bit)[reveal] != 0)
+        reward[reveal] += 0.5
+
+        # reverse
+        sel = item == REVERSE
+        self.reverse_active[g[sel]] = True
+        reward[sel] += np.where(known_live[sel], -0.1, np.where(known_blank[sel], 0.5, 0.1))
+
+        self.items[g, player, item] -= 1
+        return reward
+
+    # ---------------------------------------------------------
+    # 射擊邏輯
+    # ---------------------------------------------------------
+    def _shoot(self, g, shooter, shoot_self):
+        """
+        ``shooter`` fires the current bullet in games ``g``; ``shoot_self``
+        selects the victim per game. Returns the reward from P2's view.
+        """
+        shooter = np.broadcast_to(np.asarray(shooter, dtype=np.int8), g.shape)
+        victim = np.where(shoot_self, shooter, 1 - shooter)
+
+        bit = _bit(self.current_index[g])
+        orig_live = (self.magazine[g] & bit) != 0
+        self.current_index[g] += 1
+
+        # effect bullet may be flipped by reverse
+        effect_live = orig_live ^ self.reverse_active[g]
+
+        dmg = np.where(self.saw_active[g], 2, 1).astype(np.int8)
+        self.saw_active[g] = False
+
+        # counters follow the original bullet
+        self.live_left[g] -= orig_live
+        self.blank_left[g] -= ~orig_live
+
+        hit = effect_live
+        self.hp[g[hit], victim[hit]] -= dmg[hit]
+
+        # blank on self keeps the turn, everything else passes it
+        keep = ~effect_live & shoot_self
+        self.turn[g[~keep]] = 1 - self.turn[g[~keep]]
+
+        self.reverse_active[g] = False
+
+        # record knowledge using the effect bullet (what players observe)
+        self._reveal(g, P1, bit, effect_live)
+        self._reveal(g, P2, bit, effect_live)
+
+        reward = np.where(effect_live & (shooter == P2), np.where(shoot_self, -1.0, 1.0), 0.0)
+
+        dead = self.hp[g, victim] <= 0
+        self.phase[g] = np.where(dead, PHASE_GAME_END, PHASE_ITEM)
+        return reward
+
+    # ---------------------------------------------------------
+    # P1 對手行為（batch 版 _opponent_turn）
+    # ---------------------------------------------------------
+    def _run_opponent(self):
+        """
+        Run P1 until every game is back on P2's turn or has ended.
+
+        Each loop iteration advances every pending game by one P1 decision,
+        so the opponent model is called once per iteration with the whole
+        batch instead of once per game.
+        """
+        self._p1_turn_start[:] = self.turn == P1
+
+        while True:
+            pending = (self.turn == P1) & (self.phase != PHASE_GAME_END)
+            if not pending.any():
+                return
+
+            # Handle handcuff (skip turn) at the start of each P1 turn
+            start = pending & self._p1_turn_start
+            cuffed = start & self.handcuffed[:, P1]
+            self.handcuffed[cuffed, P1] = False
+            self.turn[cuffed] = P2
+            self.phase[cuffed] = PHASE_ITEM
+            self._end_opponent_turn(cuffed)
+
+            fresh = start & ~cuffed
+            self._p1_turn_start[fresh] = False
+            self._p1_items_taken[fresh] = 0
+
+            # Check if bullets ran out (e.g., from beer usage)
+            acting = pending & ~cuffed
+            empty = acting & (self.current_index >= self.n_bullets)
+            self._load_new_round(np.flatnonzero(empty))
+            self._end_opponent_turn(empty)
+
+            g = np.flatnonzero(acting & ~empty)
+            action = self._opponent_actions(g)
+            in_item = self.phase[g] == PHASE_ITEM
+
+            # ----- item phase -----
+            gi, ai = g[in_item], action[in_item]
+            use = (ai >= 2) & (ai <= 8)
+            item = np.clip(ai - 2, 0, len(ITEM_LIST) - 1)
+            use &= self.items[gi, P1, item] > 0
+            # ready / invalid item / shoot action → shoot phase
+            self.phase[gi[~use]] = PHASE_SHOOT
+
+            gu = gi[use]
+            self._use_item(gu, P1, item[use])
+            self._p1_items_taken[gu] += 1
+            limit = np.zeros(self.num_envs, dtype=bool)
+            limit[gu[self._p1_items_taken[gu] >= MAX_ITEM_ACTIONS]] = True
+            self._end_opponent_turn(limit)
+
+            # ----- shoot phase -----
+            gs, as_ = g[~in_item], action[~in_item]
+            self._shoot(gs, P1, as_ == 1)
+            shot = np.zeros(self.num_envs, dtype=bool)
+            shot[gs] = True
+            self._end_opponent_turn(shot)
+
+    def _end_opponent_turn(self, mask):
+        """Mirror of the loop body in BuckshotEnv.step after each _opponent_turn()."""
+        alive = mask & (self.phase != PHASE_GAME_END)
+        self._load_new_round(np.flatnonzero(alive & (self.current_index >= self.n_bullets)))
+        # If still P1's turn (shot self with blank / new round), start a new turn
+        self._p1_turn_start[alive & (self.turn == P1)] = True
+
+    def _opponent_actions(self, g):
+        if len(g) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        if self.opponent_model is not None:
+            obs = self.encode(P1)[g]
+            masks = self.action_masks(P1)[g]
+            action, _ = self.opponent_model.predict(obs, action_masks=masks, deterministic=False)
+            return np.asarray(action, dtype=np.int64).reshape(len(g))
+
+        # Random action when no model - bias towards ready to avoid infinite loop
+        in_item = self.phase[g] == PHASE_ITEM
+        use_item = self.rng.random(len(g)) < 0.3
+        item_action = np.where(use_item, self.rng.integers(2, 9, size=len(g)), 9)
+        shoot_action = self.rng.integers(0, 2, size=len(g))
+        return np.where(in_item, item_action, shoot_action)
+
+    # ---------------------------------------------------------
+    # Action Masking（用於 MaskablePPO）
+    # ---------------------------------------------------------
+    def action_masks(self, player=P2):
+        """(N, 10) binary masks, same layout as BuckshotEnv.action_masks."""
+        mask = np.zeros((self.num_envs, 10), dtype=np.int8)
+
+        item_phase = self.phase == PHASE_ITEM
+        mask[:, 2:9] = (self.items[:, player] > 0) & item_phase[:, None]
+        mask[:, 9] = item_phase
+
+        shoot_phase = self.phase == PHASE_SHOOT
+        mask[:, 0] = shoot_phase
+        mask[:, 1] = shoot_phase
+        return mask
+
+    # ---------------------------------------------------------
+    # Observation（與 StateEncoder.encode 相同）
+    # ---------------------------------------------------------
+    def encode(self, player=P2):
+        """
+        (N, 33) float32 observations from ``player``'s view.
+        P2 matches state_encoder_p2.StateEncoder, P1 matches state_encoder_p1.
+        """
+        other = 1 - player
+        obs = np.empty((self.num_envs, OBS_DIM), dtype=np.float32)
+
+        # 1. 全域資訊
+        obs[:, 0] = self.live_left
+        obs[:, 1] = self.blank_left
+        obs[:, 2] = self.current_index
+        obs[:, 3] = self.saw_active
+        obs[:, 4] = self.reverse_active
+        obs[:, 5] = self.phase == PHASE_ITEM
+        obs[:, 6] = self.phase == PHASE_SHOOT
+
+        # 2. 自己 / 3. 對手
+        for col, p in ((7, player), (16, other)):
+            obs[:, col] = self.hp[:, p]
+            obs[:, col + 1] = self.handcuffed[:, p]
+            obs[:, col + 2:col + 9] = self.items[:, p]
+
+        # 4. bullet knowledge: 0 = 無子彈, 1 = 未知, 2 = live, 3 = blank
+        known = (self.known[:, player, None] >> _SLOTS) & 1
+        live = (self.seen_live[:, player, None] >> _SLOTS) & 1
+        in_mag = _SLOTS < self.n_bullets[:, None]
+        obs[:, 25:33] = np.where(in_mag, np.where(known == 1, np.where(live == 1, 2, 3), 1), 0)
+        return obs
+
+    # ---------------------------------------------------------
+    # Debug: 單場遊戲轉回 GameState
+    # ---------------------------------------------------------
+    def get_compact_state(self, i) -> CompactGameState:
+        """Snapshot of game ``i`` as a ``CompactGameState``."""
+        p1, p2 = (
+            CompactPlayerState(name, int(self.hp[i, p]), self.items[i, p].tobytes(),
+                               int(self.known[i, p]), int(self.seen_live[i, p]),
+                               bool(self.handcuffed[i, p]))
+            for p, name in ((P1, "Player1"), (P2, "Player2"))
+        )
+        return CompactGameState(
+            p1=p1,
+            p2=p2,
+            turn=int(self.turn[i]),
+            magazine=int(self.magazine[i]),
+            n_bullets=int(self.n_bullets[i]),
+            current_index=int(self.current_index[i]),
+            live_left=int(self.live_left[i]),
+            blank_left=int(self.blank_left[i]),
+            saw_active=bool(self.saw_active[i]),
+            reverse_active=bool(self.reverse_active[i]),
+            phase=int(self.phase[i]),
+        )
+
+    def get_game_state(self, i) -> GameState:
+        """Build the equivalent ``GameState`` for game ``i``."""
+        return self.get_compact_state(i).to_game_state()
@@ -0,0 +1,70 @@
+"""
+BatchedBuckshotEnv vs BuckshotEnv 的 observation / action mask 一致性檢查。
+
+隨機動作跑 N 場 × T 步，每一步把每場遊戲轉回 GameState（get_game_state），
+比較 encode() 與 StateEncoder.encode（P2：state_encoder_p2，P1：state_encoder_p1）
+以及 action_masks() 與 BuckshotEnv.action_masks 是否逐位元相同。
+
+Usage:
+    python batched_env_check.py                   # 64 場 × 2000 步
+    python batched_env_check.py --envs 256 --steps 500 --seed 1
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from batched_env import BatchedBuckshotEnv
+from buckshot_env import BuckshotEnv
+from game_state import P1, P2
+
+
+def check(num_envs=64, steps=2000, seed=0, max_report=5):
+    """回傳 mismatch 數（0 = 全部一致）"""
+    benv = BatchedBuckshotEnv(num_envs, seed=seed)
+    ref = BuckshotEnv()
+    rng = np.random.default_rng(seed)
+    benv.reset()
+
+    mismatches = 0
+    for step in range(steps + 1):
+        obs = {P2: benv.encode(P2), P1: benv.encode(P1)}
+        masks = {P2: benv.action_masks(P2), P1: benv.action_masks(P1)}
+        for i in range(num_envs):
+            ref.gs = benv.get_game_state(i)
+            expected = {
+                (P2, "obs"): (obs[P2][i], ref.encoder.encode(ref.gs)),
+                (P1, "obs"): (obs[P1][i], ref.encoder_p1.encode(ref.gs)),
+                (P2, "mask"): (masks[P2][i], ref.action_masks("p2")),
+                (P1, "mask"): (masks[P1][i], ref.action_masks("p1")),
+            }
+            for (player, what), (got, want) in expected.items():
+                if not np.array_equal(np.asarray(got, dtype=np.float32), np.asarray(want, dtype=np.float32)):
+                    mismatches += 1
+                    if mismatches <= max_report:
+                        print(f"step {step} env {i} P{player + 1} {what}:\n  batched {got}\n  ref     {want}")
+        if step < steps:
+            mask = masks[P2]
+            actions = np.array([rng.choice(np.flatnonzero(m)) if m.any() else 9 for m in mask])
+            benv.step(actions)
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BatchedBuckshotEnv encode / action_masks parity check")
+    parser.add_argument("--envs", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    t = time.time()
+    mismatches = check(args.envs, args.steps, args.seed)
+    checked = args.envs * (args.steps + 1)
+    print(f"{checked:,} states × (P1, P2) × (obs, mask): {mismatches} mismatches ({time.time() - t:.1f}s)")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Batched opponent inference for vectorized self-play.
+
+BuckshotEnv.step_coroutine / reset_coroutine suspend every time P1 needs
+an opponent_model decision. BatchedOpponentVecEnv advances all envs'
+coroutines together, stacks every pending P1 (obs, action_mask) and answers
+them with one opponent_model.predict call per round instead of one
+batch-size-1 call per decision per env.
+
+Wrap it with VecMonitor (not per-env Monitor) to get episode statistics.
+"""
+
+from copy import deepcopy
+
+import numpy as np
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+
+def drive_coroutines(coroutines, models):
+    """
+    Run env coroutines to completion with batched opponent inference.
+
+    Args:
+        coroutines: dict env index → coroutine (step_coroutine / reset_coroutine)
+        models: dict env index → opponent_model answering that env's requests
+
+    Returns:
+        dict env index → the coroutine's return value
+    """
+    results = {}
+    pending = {}  # env index → (obs_p1, action_mask_p1)
+
+    def advance(i, action=None, first=False):
+        try:
+            pending[i] = next(coroutines[i]) if first else coroutines[i].send(action)
+        except StopIteration as stop:
+            results[i] = stop.value
+
+    for i in coroutines:
+        advance(i, first=True)
+
+    while pending:
+        # Envs may hold different opponents; batch per model object
+        groups = {}
+        for i in pending:
+            groups.setdefault(id(models[i]), []).append(i)
+
+        requests, pending = pending, {}
+        for ids in groups.values():
+            obs = np.stack([requests[i][0] for i in ids])
+            masks = np.stack([requests[i][1] for i in ids])
+            actions, _ = models[ids[0]].predict(obs, action_masks=masks, deterministic=False)
+            for i, action in zip(ids, np.asarray(actions).reshape(len(ids))):
+                advance(i, action)
+
+    return results
+
+
+class BatchedOpponentVecEnv(DummyVecEnv):
+    """
+    DummyVecEnv over bare BuckshotEnv instances whose P1 decisions are
+    batched across envs. Behaves like DummyVecEnv otherwise.
+    """
+
+    def _drive(self, coroutines):
+        models = {i: self.envs[i].opponent_model for i in coroutines}
+        return drive_coroutines(coroutines, models)
+
+    def step_wait(self):
+        results = self._drive({i: env.step_coroutine(self.actions[i]) for i, env in enumerate(self.envs)})
+
+        reset_ids = []
+        for env_idx in range(self.num_envs):
+            obs, self.buf_rews[env_idx], terminated, truncated, self.buf_infos[env_idx] = results[env_idx]
+            # convert to SB3 VecEnv api
+            self.buf_dones[env_idx] = terminated or truncated
+            self.buf_infos[env_idx]["TimeLimit.truncated"] = truncated and not terminated
+
+            if self.buf_dones[env_idx]:
+                # save final observation where user can get it, then reset
+                self.buf_infos[env_idx]["terminal_observation"] = obs
+                reset_ids.append(env_idx)
+            else:
+                self._save_obs(env_idx, obs)
+
+        resets = self._drive({i: self.envs[i].reset_coroutine() for i in reset_ids})
+        for env_idx, (obs, self.reset_infos[env_idx]) in resets.items():
+            self._save_obs(env_idx, obs)
+
+        return (self._obs_from_buf(), np.copy(self.buf_rews), np.copy(self.buf_dones), deepcopy(self.buf_infos))
+
+    def reset(self):
+        coroutines = {}
+        for env_idx in range(self.num_envs):
+            maybe_options = {"options": self._options[env_idx]} if self._options[env_idx] else {}
+            coroutines[env_idx] = self.envs[env_idx].reset_coroutine(seed=self._seeds[env_idx], **maybe_options)
+
+        for env_idx, (obs, self.reset_infos[env_idx]) in self._drive(coroutines).items():
+            self._save_obs(env_idx, obs)
+        # Seeds and options are only used once
+        self._reset_seeds()
+        self._reset_options()
+        return self._obs_from_buf()
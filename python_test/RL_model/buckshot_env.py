@@ -2,20 +2,56 @@ import gymnasium as gym
 import numpy as np
 from gymnasium import spaces
 
+from deal_tables import DEALS, N_MAGAZINES, ROUNDS, VALID_COMBOS
 from game_state import GameState
 from state_encoder_p2 import StateEncoder
 from state_encoder_p1 import StateEncoder as StateEncoderP1
 
-import random
-
-VALID_COMBOS = [
-    (1,3),(2,2),(3,1),
-    (2,4),(3,3),(4,2),
-    (3,5),(4,4),(5,3),
-]
-
 ITEM_LIST = ["magnifier", "cigarette", "beer", "saw", "handcuff", "phone" , "reverse"]
 INVALID_ACTION_PENALTY = -8.0
+RNG_BLOCK = 1024    # RandomStream 一次從 Generator 產生的亂數個數
+
+
+class RandomStream:
+    """
+    每個 env 自己的亂數來源：包住一個 np.random.Generator，一次產生 block 個
+    uniform，之後每次抽只是從 list 拿下一個（不用每次呼叫 Generator，
+    也不共用 Python 的全域 random）。同一個 seed → 完全相同的對局。
+    """
+
+    __slots__ = ("generator", "block", "_buf", "_pos")
+
+    def __init__(self, generator, block=RNG_BLOCK):
+        self.generator = generator
+        self.block = block
+        self._buf = []
+        self._pos = 0
+
+    def random(self):
+        """[0, 1) 的 float"""
+        if self._pos == len(self._buf):
+            self._buf = self.generator.random(self.block).tolist()
+            self._pos = 0
+        u = self._buf[self._pos]
+        self._pos += 1
+        return u
+
+    def below(self, n):
+        """0 ~ n-1 的整數"""
+        return int(self.random() * n)
+
+    def randint(self, a, b):
+        """a ~ b（含 b），同 random.randint"""
+        return a + self.below(b - a + 1)
+
+    def choice(self, seq):
+        return seq[self.below(len(seq))]
+
+    def shuffle(self, x):
+        """in-place Fisher-Yates"""
+        for i in range(len(x) - 1, 0, -1):
+            j = self.below(i + 1)
+            x[i], x[j] = x[j], x[i]
 
 
 class BuckshotEnv(gym.Env):
@@ -46,19 +82,31 @@ class BuckshotEnv(gym.Env):
         )
 
         self.gs = None
+        self.rng = RandomStream(self.np_random)
 
     # ---------------------------------------------------------
     # reset
     # ---------------------------------------------------------
     def reset(self, seed=None, options=None):
+        return self._drive(self.reset_coroutine(seed=seed, options=options))
+
+    def reset_coroutine(self, seed=None, options=None):
+        """
+        reset() 的 coroutine 版本：每次 P1 需要 opponent_model 決策時
+        yield (obs_p1, action_mask_p1)，並以 send(action) 接收動作。
+        結束時以 return 回傳 reset() 的結果。
+        """
         super().reset(seed=seed)
+        # reset(seed) 重新 seed 了 np_random：丟掉舊 block，從新的 Generator 開始
+        if seed is not None or self.rng.generator is not self.np_random:
+            self.rng = RandomStream(self.np_random)
 
         self.gs = GameState()
         self._load_new_round()
 
         # If P1 goes first, execute P1's turn before returning to P2
         while self.gs.turn == "p1" and self.gs.phase != "game_end":
-            self._opponent_turn()
+            yield from self._opponent_turn_coroutine()
 
             # Check if bullets ran out after P1's turn
             if self.gs.current_index >= len(self.gs.real_bullets):
@@ -79,6 +127,10 @@ class BuckshotEnv(gym.Env):
     # step
     # ---------------------------------------------------------
     def step(self, action):
+        return self._drive(self.step_coroutine(action))
+
+    def step_coroutine(self, action):
+        """step() 的 coroutine 版本（yield 協定同 reset_coroutine）"""
         gs = self.gs
 
         reward = 0
@@ -93,7 +145,7 @@ class BuckshotEnv(gym.Env):
             gs.phase = "item"
             # After skipping, execute P1's turn(s) before returning
             while gs.turn == "p1" and gs.phase != "game_end":
-                self._opponent_turn()
+                yield from self._opponent_turn_coroutine()
                 if gs.phase == "game_end":
                     done = True
                     reward += self._calc_terminal_reward()
@@ -131,7 +183,7 @@ class BuckshotEnv(gym.Env):
         # ---------- P1 對手回合 (如果有 opponent_model) ----------
         # Keep executing P1's turns until it's P2's turn again or game ends
         while gs.turn == "p1" and gs.phase != "game_end":
-            self._opponent_turn()
+            yield from self._opponent_turn_coroutine()
 
             # Check if game ended after P1's action
             if gs.phase == "game_end":
@@ -163,17 +215,16 @@ class BuckshotEnv(gym.Env):
     def _load_new_round(self):
         gs = self.gs
 
-        live, blank = random.choice(VALID_COMBOS)
+        # 一次抽彈匣（combo + 排列），見 deal_tables.ROUNDS
+        live, blank, bullets = ROUNDS[self.rng.below(N_MAGAZINES)]
         gs.live_left = live
         gs.blank_left = blank
-
-        gs.real_bullets = ["live"] * live + ["blank"] * blank
-        random.shuffle(gs.real_bullets)
+        gs.real_bullets = list(bullets)
 
         gs.current_index = 0
         gs.phase = "item"
         # Randomize who goes first each round for fairness
-        gs.turn = random.choice(["p1", "p2"])
+        gs.turn = self.rng.choice(["p1", "p2"])
 
         gs.saw_active = False
         gs.reverse_active = False
@@ -193,12 +244,9 @@ class BuckshotEnv(gym.Env):
         if total >= 6:
             return
 
-        give_count = min(amount, 6 - total)
-        pool = ITEM_LIST[:]
-        random.shuffle(pool)
-        selected = pool[:give_count]
-
-        for item in selected:
+        # 從 min(amount, 6 - total) 種不重複道具的所有組合（deal_tables.DEALS）中抽一個
+        deals = DEALS[min(amount, 6 - total)]
+        for item in deals[self.rng.below(len(deals))]:
             setattr(player.items, item, getattr(player.items, item) + 1)
 
     # ---------------------------------------------------------
@@ -362,7 +410,7 @@ class BuckshotEnv(gym.Env):
                 candidates = [last_idx - 2, last_idx - 1, last_idx]
                 # Make sure all candidates are >= current_index
                 candidates = [idx for idx in candidates if idx >= gs.current_index]
-                chosen_idx = random.choice(candidates)
+                chosen_idx = self.rng.choice(candidates)
                 player.bullet_knowledge[chosen_idx] = gs.real_bullets[chosen_idx]
                 reward += 0.5
 
@@ -473,6 +521,24 @@ class BuckshotEnv(gym.Env):
     # ---------------------------------------------------------
     def _opponent_turn(self):
         """Execute P1's turn using opponent model or random policy"""
+        self._drive(self._opponent_turn_coroutine())
+
+    def _drive(self, coroutine):
+        """Run a *_coroutine to completion, answering P1 requests with opponent_model.predict."""
+        try:
+            request = next(coroutine)
+            while True:
+                obs_p1, action_mask_p1 = request
+                action, _ = self.opponent_model.predict(obs_p1, action_masks=action_mask_p1, deterministic=False)
+                request = coroutine.send(action)
+        except StopIteration as stop:
+            return stop.value
+
+    def _opponent_request(self):
+        """P1 的 (obs, action_mask)，交給 opponent_model 決策"""
+        return self.encoder_p1.encode(self.gs), self.action_masks(player="p1")
+
+    def _opponent_turn_coroutine(self):
         gs = self.gs
 
         # Handle handcuff (skip turn)
@@ -504,13 +570,11 @@ class BuckshotEnv(gym.Env):
                 return  # Exit to let the new turn start fresh
             # Get action from model or random
             if self.opponent_model:
-                obs_p1 = self.encoder_p1.encode(gs)
-                action_mask_p1 = self.action_masks(player="p1")
-                action, _ = self.opponent_model.predict(obs_p1, action_masks=action_mask_p1, deterministic=False)
+                action = yield self._opponent_request()
             else:
                 # Random action when no model - bias towards ready to avoid infinite loop
-                if random.random() < 0.3:  # 30% chance to use item
-                    action = random.randint(2, 8)
+                if self.rng.random() < 0.3:  # 30% chance to use item
+                    action = self.rng.randint(2, 8)
                 else:
                     action = 9  # ready
 
@@ -550,12 +614,10 @@ class BuckshotEnv(gym.Env):
 
             # Get action from model or random
             if self.opponent_model:
-                obs_p1 = self.encoder_p1.encode(gs)
-                action_mask_p1 = self.action_masks(player="p1")
-                action, _ = self.opponent_model.predict(obs_p1, action_masks=action_mask_p1, deterministic=False)
+                action = yield self._opponent_request()
             else:
                 # Random shoot action (0 or 1)
-                action = random.randint(0, 1)
+                action = self.rng.randint(0, 1)
 
 
             if action == 0:  # shoot enemy (P2)
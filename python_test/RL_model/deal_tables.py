@@ -0,0 +1,70 @@
+"""
+裝彈 / 發道具的查表（BuckshotEnv、BatchedBuckshotEnv 共用）。
+
+合法的彈匣只有 VALID_COMBOS 的各種排列（每種 combo 最多 C(8,4) = 70 種），
+道具則是從 ITEM_LIST 抽 k 種不重複的組合，全部事先列出來，
+每次裝彈 / 發道具只要抽一個整數再查表。
+
+- MAGAZINES:  所有合法彈匣的 live bitmap（bit i = 第 i 顆，與 FPGA UART byte 7 相同）。
+              每種 combo 都重複成 MAGAZINES_PER_COMBO 筆，所以均勻抽一個 index
+              = 均勻抽 combo、再均勻抽排列（與 random.choice + shuffle 同分布）
+- ROUNDS:     同一個 index 的 (live, blank, real_bullets tuple)，給 BuckshotEnv 用
+- DEAL_TABLE: DEAL_TABLE[k, j] = 抽 k 種道具的第 j 種組合（ITEM_LIST 順序的 0/1 向量），
+              j < DEAL_SIZES[k]
+- DEALS:      DEALS[k][j] = 同一個組合的道具名稱 tuple
+"""
+
+from itertools import combinations
+from math import comb, lcm
+
+import numpy as np
+
+from game_state import ITEM_NAMES, MAX_BULLETS
+
+VALID_COMBOS = [
+    (1,3),(2,2),(3,1),
+    (2,4),(3,3),(4,2),
+    (3,5),(4,4),(5,3),
+]
+
+
+# ================================================================
+#   彈匣
+# ================================================================
+MAGAZINES_PER_COMBO = lcm(*(comb(live + blank, live) for live, blank in VALID_COMBOS))   # 840
+
+
+def _build_magazines():
+    bitmaps, counts, rounds = [], [], []
+    for live, blank in VALID_COMBOS:
+        n = live + blank
+        orders = [sum(1 << i for i in pos) for pos in combinations(range(n), live)]
+        bullets = [tuple("live" if (m >> i) & 1 else "blank" for i in range(n)) for m in orders]
+        reps = MAGAZINES_PER_COMBO // len(orders)
+        bitmaps += orders * reps
+        counts += [(live, blank)] * MAGAZINES_PER_COMBO
+        rounds += [(live, blank, b) for b in bullets] * reps
+    return bitmaps, counts, tuple(rounds)
+
+
+_bitmaps, _counts, ROUNDS = _build_magazines()
+MAGAZINES = np.array(_bitmaps, dtype=np.uint8)
+MAGAZINE_LIVE = np.array([c[0] for c in _counts], dtype=np.int8)
+MAGAZINE_BLANK = np.array([c[1] for c in _counts], dtype=np.int8)
+N_MAGAZINES = len(MAGAZINES)
+assert max(live + blank for live, blank in VALID_COMBOS) <= MAX_BULLETS
+del _bitmaps, _counts
+
+
+# ================================================================
+#   發道具
+# ================================================================
+DEALS = tuple(tuple(tuple(ITEM_NAMES[i] for i in items) for items in combinations(range(len(ITEM_NAMES)), k))
+              for k in range(len(ITEM_NAMES) + 1))
+DEAL_SIZES = np.array([len(d) for d in DEALS], dtype=np.int64)
+
+DEAL_TABLE = np.zeros((len(DEALS), DEAL_SIZES.max(), len(ITEM_NAMES)), dtype=np.int8)
+for _k, _deals in enumerate(DEALS):
+    for _j, _items in enumerate(_deals):
+        DEAL_TABLE[_k, _j, [ITEM_NAMES.index(item) for item in _items]] = 1
+del _k, _deals, _j, _items
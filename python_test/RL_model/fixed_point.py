@@ -0,0 +1,215 @@
+"""
+Vectorized bit-true model of the FPGA MLP (ai_model/*.sv), S5.10 by default.
+
+Per output neuron the hardware does (mac_s5_10.sv + fc*_layer_parallel.sv):
+
+    psum    = sext32(bias) <<< FRAC_BITS
+    psum   += in_val * weight          // 16x16 → 32, 32-bit accumulate (wraps)
+    shifted = psum >>> FRAC_BITS       // arithmetic shift
+    act_out = (HAS_RELU && shifted[31]) ? 0 : shifted[15:0]
+
+Here the whole batch is one matmul, then wrapped to 32 bits, shifted, ReLU'd
+and truncated to 16 bits, which gives the same bits as the per-cycle 32-bit
+accumulation. The matmul runs through float64 BLAS: every product is an
+integer below 2^30 in magnitude and there are at most 128 terms, so each
+partial sum is an integer below 2^53 and float64 represents it exactly.
+"""
+
+import os
+
+import numpy as np
+
+from actor_policy import ACTOR_SHAPES
+
+FRAC_BITS = 10
+WORD_BITS = 16
+ACC_BITS = 32
+CHUNK_ROWS = 1 << 16   # rows per matmul in FixedPointMLP.run (bounds memory)
+LAYERS = ("fc1", "fc2", "fc3")
+MASKED_LOGIT = -(1 << (WORD_BITS - 1))   # mask_out.sv: -16'sd32768
+
+
+# ============================================================
+# 定點數轉換
+# ============================================================
+def wrap(x, bits):
+    """Two's-complement wraparound of int64 values to ``bits`` bits."""
+    x = np.asarray(x, dtype=np.int64)
+    half = np.int64(1) << (bits - 1)
+    return ((x + half) & ((half << 1) - 1)) - half
+
+
+def quantize(x, frac_bits=FRAC_BITS, total_bits=WORD_BITS, rounding=False):
+    """
+    float → fixed-point integer, saturating to ``total_bits``.
+
+    rounding=False truncates toward zero like float_to_s5_10 (input encoding),
+    rounding=True rounds like extract_weights.float_to_fixed (weights).
+    """
+    scaled = np.asarray(x, dtype=np.float64) * (1 << frac_bits)
+    scaled = np.round(scaled) if rounding else np.trunc(scaled)
+    lo, hi = -(1 << (total_bits - 1)), (1 << (total_bits - 1)) - 1
+    return np.clip(scaled, lo, hi).astype(np.int64).astype(np.int16 if total_bits <= 16 else np.int32)
+
+
+def to_float(v, frac_bits=FRAC_BITS):
+    return np.asarray(v, dtype=np.float64) / (1 << frac_bits)
+
+
+def load_fixed_dir(weight_dir):
+    """Read fc*_weight.txt / fc*_bias.txt (16-bit two's complement binary lines)."""
+    weights = {}
+    for name, shape in ACTOR_SHAPES.items():
+        with open(os.path.join(weight_dir, f"{name}.txt")) as f:
+            vals = np.array([int(line, 2) for line in f if line.strip()], dtype=np.int64)
+        weights[name] = wrap(vals, WORD_BITS).astype(np.int16).reshape(shape)
+    return weights
+
+
+# ============================================================
+# 單層 FC（bit-true, batched）
+# ============================================================
+def fc_layer_fixed(act_in, W, B, has_relu=True, frac_bits=FRAC_BITS, stats=None):
+    """
+    Args:
+        act_in: (N, IN) or (IN,) int16 activations
+        W: (OUT, IN) int16 weights
+        B: (OUT,) int16 bias
+        has_relu: HAS_RELU parameter of the layer
+        frac_bits: FRAC_BITS parameter of the layer
+        stats: optional dict; "acc_wrap" / "out_wrap" are incremented by the
+            number of outputs whose 32-bit psum / 16-bit act_out wrapped around
+
+    Returns:
+        (N, OUT) or (OUT,) int16 act_out
+    """
+    x = np.asarray(act_in, dtype=np.float64)
+    acc = x @ np.asarray(W, dtype=np.float64).T                       # exact, see module doc
+    acc += np.asarray(B, dtype=np.float64) * (1 << frac_bits)
+    acc = acc.astype(np.int64)
+
+    if stats is not None:
+        true_out = acc >> frac_bits
+        if has_relu:
+            true_out = np.maximum(true_out, 0)
+        stats["acc_wrap"] = stats.get("acc_wrap", 0) + np.count_nonzero(acc != wrap(acc, ACC_BITS))
+        stats["out_wrap"] = stats.get("out_wrap", 0) + np.count_nonzero(true_out != wrap(true_out, WORD_BITS))
+
+    # int64 → int32 / int16 casts are two's-complement wraps (psum[31:0], shifted[15:0])
+    shifted = acc.astype(np.int32) >> frac_bits
+    if has_relu:
+        np.maximum(shifted, 0, out=shifted)
+    return shifted.astype(np.int16)
+
+
+def layer_shifts(act_fracs, weight_fracs):
+    """
+    FRAC_BITS parameter of each fc layer for per-layer formats.
+
+    A layer reading activations with a_in fractional bits, weights with w and
+    producing a_out needs psum >>> (a_in + w - a_out); the bias is stored with
+    a_out fractional bits so that bias <<< FRAC_BITS lines up with the psum.
+    S5.10 everywhere gives 10 + 10 - 10 = 10.
+    """
+    return tuple(a_in + w - a_out for a_in, w, a_out in zip(act_fracs[:-1], weight_fracs, act_fracs[1:]))
+
+
+class FixedPointMLP:
+    """33 → 128 → 128 → 10 的 bit-true 定點 MLP（等同 mlp_inference.sv）"""
+
+    def __init__(self, weights, frac_bits=FRAC_BITS, act_fracs=None, weight_fracs=None):
+        """
+        Args:
+            weights: dict name → int16 array in ACTOR_SHAPES layout
+            frac_bits: fractional bits of every word (uniform S5.10 by default)
+            act_fracs: per-layer override, fractional bits of (input, fc1, fc2, fc3) outputs
+            weight_fracs: per-layer override, fractional bits of (fc1, fc2, fc3) weights
+        """
+        self.frac_bits = frac_bits
+        self.act_fracs = tuple(act_fracs or (frac_bits,) * (len(LAYERS) + 1))
+        self.weight_fracs = tuple(weight_fracs or (frac_bits,) * len(LAYERS))
+        self.shifts = layer_shifts(self.act_fracs, self.weight_fracs)
+        if min(self.shifts) < 0:
+            raise ValueError(f"negative FRAC_BITS shift {self.shifts} for act_fracs={self.act_fracs}, "
+                             f"weight_fracs={self.weight_fracs}")
+        self.weights = {name: np.asarray(weights[name], dtype=np.int16).reshape(shape)
+                        for name, shape in ACTOR_SHAPES.items()}
+
+    @property
+    def in_frac(self):
+        return self.act_fracs[0]
+
+    @property
+    def out_frac(self):
+        return self.act_fracs[-1]
+
+    @property
+    def format_name(self):
+        """e.g. "S5.10", or per-layer fractional bits when the formats differ"""
+        if len(set(self.act_fracs + self.weight_fracs)) == 1:
+            return f"S{WORD_BITS - 1 - self.in_frac}.{self.in_frac}"
+        return f"act frac {self.act_fracs}, weight frac {self.weight_fracs}"
+
+    @classmethod
+    def from_dir(cls, weight_dir="fpga_weights_bin", frac_bits=FRAC_BITS):
+        return cls(load_fixed_dir(weight_dir), frac_bits=frac_bits)
+
+    @classmethod
+    def from_float(cls, weights, frac_bits=FRAC_BITS, act_fracs=None, weight_fracs=None, weight_bits=WORD_BITS):
+        """
+        Quantize float actor weights the same way extract_weights.py does
+        (round, saturate). Weights use weight_bits-wide words, biases 16 bits.
+        """
+        mlp = cls({name: np.zeros(shape, dtype=np.int16) for name, shape in ACTOR_SHAPES.items()},
+                  frac_bits=frac_bits, act_fracs=act_fracs, weight_fracs=weight_fracs)
+        for layer, w_frac, out_frac in zip(LAYERS, mlp.weight_fracs, mlp.act_fracs[1:]):
+            mlp.weights[f"{layer}_weight"] = quantize(weights[f"{layer}_weight"], w_frac, weight_bits, rounding=True)
+            mlp.weights[f"{layer}_bias"] = quantize(weights[f"{layer}_bias"], out_frac, rounding=True)
+        return mlp
+
+    def quantize_input(self, obs):
+        return quantize(obs, self.in_frac)
+
+    def run(self, x_fixed, stats=None):
+        """
+        (N, 33) or (33,) int16 → (act1, act2, act3) int16, one row per input.
+        stats: optional dict layer name → dict of wraparound counts (fc_layer_fixed)
+        """
+        x_fixed = np.asarray(x_fixed)
+        if x_fixed.ndim == 1:
+            return tuple(act[0] for act in self.run(x_fixed[None], stats))
+
+        n = len(x_fixed)
+        acts = tuple(np.empty((n, dim), dtype=np.int16) for dim in (
+            ACTOR_SHAPES["fc1_bias"][0], ACTOR_SHAPES["fc2_bias"][0], ACTOR_SHAPES["fc3_bias"][0]))
+        w = self.weights
+        if stats is not None:
+            for layer in LAYERS:
+                stats.setdefault(layer, {})
+        for start in range(0, n, CHUNK_ROWS):
+            rows = slice(start, start + CHUNK_ROWS)
+            act = x_fixed[rows]
+            for i, layer in enumerate(LAYERS):
+                act = fc_layer_fixed(act, w[f"{layer}_weight"], w[f"{layer}_bias"],
+                                     has_relu=layer != LAYERS[-1], frac_bits=self.shifts[i],
+                                     stats=None if stats is None else stats[layer])
+                acts[i][rows] = act
+        return acts
+
+    def logits(self, obs):
+        """float observations → fixed-point logits (int16)"""
+        return self.run(self.quantize_input(obs))[2]
+
+    def predict(self, obs, action_masks=None, deterministic=True):
+        """
+        MaskablePPO.predict 介面。與 mask_out.sv 相同：invalid action 設為
+        -32768 後取 argmax（同值取最小 index），所以一律是 deterministic。
+        """
+        obs = np.asarray(obs)
+        single = obs.ndim == 1
+        logits = self.logits(obs.reshape(-1, obs.shape[-1]))
+        if action_masks is not None:
+            mask = np.asarray(action_masks).reshape(logits.shape) != 0
+            logits = np.where(mask, logits, np.int16(MASKED_LOGIT))
+        actions = logits.argmax(axis=1)
+        return (int(actions[0]) if single else actions), None
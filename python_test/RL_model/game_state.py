@@ -71,3 +71,183 @@ class GameState:
 
     def get_opponent(self) -> PlayerState:
         return self.p2 if self.turn == "p1" else self.p1
+
+
+# ========================
+# Compact 表示法（整數編碼）
+# ========================
+# phase / turn 的整數編碼
+PHASE_LOAD = 0
+PHASE_ITEM = 1
+PHASE_SHOOT = 2
+PHASE_GAME_END = 3
+PHASE_NAMES = ("load", "item", "shoot", "game_end")
+PHASE_CODES = {name: code for code, name in enumerate(PHASE_NAMES)}
+
+P1 = 0
+P2 = 1
+TURN_NAMES = ("p1", "p2")
+TURN_CODES = {name: code for code, name in enumerate(TURN_NAMES)}
+
+# ItemState 欄位順序（與 buckshot_env.ITEM_LIST 相同）
+ITEM_NAMES = ("magnifier", "cigarette", "beer", "saw", "handcuff", "phone", "reverse")
+
+MAX_BULLETS = 8
+
+
+class CompactPlayerState:
+    """
+    PlayerState 的 compact 版本。
+    bullet_knowledge 改成兩個 bitmask：known (bit i = 知道第 i 顆)、
+    seen_live (bit i = 第 i 顆是 live)。
+    """
+
+    __slots__ = ("name", "hp", "items", "known", "seen_live", "handcuffed")
+
+    def __init__(self, name, hp=4, items=None, known=0, seen_live=0, handcuffed=False):
+        self.name = name
+        self.hp = hp
+        self.items = bytearray(len(ITEM_NAMES)) if items is None else bytearray(items)
+        self.known = known
+        self.seen_live = seen_live
+        self.handcuffed = handcuffed
+
+    def knowledge(self, index):
+        """None / "live" / "blank"，與 bullet_knowledge[index] 相同"""
+        if not (self.known >> index) & 1:
+            return None
+        return "live" if (self.seen_live >> index) & 1 else "blank"
+
+    def set_knowledge(self, index, live):
+        bit = 1 << index
+        self.known |= bit
+        if live:
+            self.seen_live |= bit
+        else:
+            self.seen_live &= ~bit
+
+    def copy(self):
+        return CompactPlayerState(self.name, self.hp, self.items, self.known,
+                                  self.seen_live, self.handcuffed)
+
+    def as_tuple(self):
+        return (self.hp, bytes(self.items), self.known, self.seen_live, self.handcuffed)
+
+    @classmethod
+    def from_player_state(cls, p: PlayerState, n_bullets):
+        if len(p.bullet_knowledge) != n_bullets:
+            raise ValueError(
+                f"{p.name}: bullet_knowledge has {len(p.bullet_knowledge)} entries, "
+                f"expected {n_bullets}")
+        known = seen_live = 0
+        for i, k in enumerate(p.bullet_knowledge):
+            if k is not None:
+                known |= 1 << i
+                if k == "live":
+                    seen_live |= 1 << i
+        items = [getattr(p.items, item) for item in ITEM_NAMES]
+        return cls(p.name, p.hp, items, known, seen_live, p.handcuffed)
+
+    def to_player_state(self, n_bullets) -> PlayerState:
+        items = ItemState(**{item: self.items[k] for k, item in enumerate(ITEM_NAMES)})
+        return PlayerState(
+            name=self.name,
+            hp=self.hp,
+            items=items,
+            bullet_knowledge=[self.knowledge(i) for i in range(n_bullets)],
+            handcuffed=self.handcuffed,
+        )
+
+
+class CompactGameState:
+    """
+    GameState 的 compact 版本，可與 GameState 無損互轉。
+
+    - magazine:      8-bit live bitmap，bit i = 第 i 顆子彈（與 FPGA UART byte 7 相同）
+    - current_index: 下一顆子彈的指標（FPGA byte 6 的 BulletBitmapPtr）
+    - phase / turn:  PHASE_* / P1, P2 整數
+    """
+
+    __slots__ = ("p1", "p2", "match", "turn", "magazine", "n_bullets", "current_index",
+                 "live_left", "blank_left", "saw_active", "reverse_active", "phase")
+
+    def __init__(self, p1=None, p2=None, match=1, turn=P1, magazine=0, n_bullets=0,
+                 current_index=0, live_left=0, blank_left=0, saw_active=False,
+                 reverse_active=False, phase=PHASE_LOAD):
+        self.p1 = CompactPlayerState("Player1") if p1 is None else p1
+        self.p2 = CompactPlayerState("Player2") if p2 is None else p2
+        self.match = match
+        self.turn = turn
+        self.magazine = magazine
+        self.n_bullets = n_bullets
+        self.current_index = current_index
+        self.live_left = live_left
+        self.blank_left = blank_left
+        self.saw_active = saw_active
+        self.reverse_active = reverse_active
+        self.phase = phase
+
+    # 工具方法
+    def bullet_is_live(self, index):
+        return (self.magazine >> index) & 1 == 1
+
+    def get_current_player(self) -> CompactPlayerState:
+        return self.p1 if self.turn == P1 else self.p2
+
+    def get_opponent(self) -> CompactPlayerState:
+        return self.p2 if self.turn == P1 else self.p1
+
+    def copy(self):
+        return CompactGameState(self.p1.copy(), self.p2.copy(), self.match, self.turn,
+                                self.magazine, self.n_bullets, self.current_index,
+                                self.live_left, self.blank_left, self.saw_active,
+                                self.reverse_active, self.phase)
+
+    def as_tuple(self):
+        """Hashable snapshot of the whole state (names excluded)."""
+        return (self.p1.as_tuple(), self.p2.as_tuple(), self.match, self.turn,
+                self.magazine, self.n_bullets, self.current_index, self.live_left,
+                self.blank_left, self.saw_active, self.reverse_active, self.phase)
+
+    # ---------------------------------------------------------
+    # 與 GameState 互轉
+    # ---------------------------------------------------------
+    @classmethod
+    def from_game_state(cls, gs: GameState):
+        n = len(gs.real_bullets)
+        if n > MAX_BULLETS:
+            raise ValueError(f"magazine has {n} bullets, at most {MAX_BULLETS} fit the bitmap")
+        magazine = 0
+        for i, b in enumerate(gs.real_bullets):
+            if b == "live":
+                magazine |= 1 << i
+        return cls(
+            p1=CompactPlayerState.from_player_state(gs.p1, n),
+            p2=CompactPlayerState.from_player_state(gs.p2, n),
+            match=gs.match,
+            turn=TURN_CODES[gs.turn],
+            magazine=magazine,
+            n_bullets=n,
+            current_index=gs.current_index,
+            live_left=gs.live_left,
+            blank_left=gs.blank_left,
+            saw_active=gs.saw_active,
+            reverse_active=gs.reverse_active,
+            phase=PHASE_CODES[gs.phase],
+        )
+
+    def to_game_state(self) -> GameState:
+        n = self.n_bullets
+        return GameState(
+            p1=self.p1.to_player_state(n),
+            p2=self.p2.to_player_state(n),
+            match=self.match,
+            turn=TURN_NAMES[self.turn],
+            real_bullets=["live" if self.bullet_is_live(i) else "blank" for i in range(n)],
+            current_index=self.current_index,
+            live_left=self.live_left,
+            blank_left=self.blank_left,
+            saw_active=self.saw_active,
+            reverse_active=self.reverse_active,
+            phase=PHASE_NAMES[self.phase],
+        )
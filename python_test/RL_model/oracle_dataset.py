@@ -0,0 +1,314 @@
+"""
+Oracle-distilled dataset for supervised pretraining of the PPO actor.
+
+1. generate: BuckshotEnv 對局，P2 的每個決策由 solver.py（expectimax）當老師，
+   把 (StateEncoder obs, action_mask, 老師的動作, 老師的勝率) 串流寫進
+   固定大小的 memory-mapped .npy shard（np.lib.format.open_memmap），
+   多個 worker process 各寫各的 shard，最後寫一份 manifest.json。
+2. behavior_cloning: 用這些 shard 對 MaskablePPO 的 actor（net_arch=[128, 128]）
+   做 behavior cloning（masked cross-entropy），train.py --pretrain 會在 PPO 開始前呼叫。
+
+    python oracle_dataset.py generate data/oracle --games 2000 --workers 8
+    python oracle_dataset.py bc data/oracle --epochs 10 --out models/bc_init
+    python train.py --train --pretrain data/oracle
+
+Shard 檔名：<dir>/<prefix><編號>_<field>.npy，field 見 FIELDS。
+- action 永遠是老師的動作；--epsilon 只改變實際執行的動作（讓資料涵蓋老師
+  自己不會走到的局面，標籤仍是老師的選擇）
+- value 是 solver 對這個局面的近似勝率（max Q，P2 觀點），不是老師真正的勝率：
+  只在目前彈匣內精確，換彈後不算任何道具；exact = 0 的那幾筆超過節點預算，
+  是短視版本的值（輪到 P1 之後雙方都當作沒有道具）。目前只存不訓練
+- 老師每個決策有節點預算（--max-nodes，見 solver.py），單一決策 < 0.3 秒
+- P2 被銬住的那一步沒有決策（env 會跳過），不記錄
+"""
+
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from actor_policy import N_ACTIONS, OBS_DIM
+from buckshot_env import BuckshotEnv
+from solver import CACHE_SIZE, MAX_NODES, Solver, SolverPolicy
+
+SHARD_ROWS = 1 << 16
+MANIFEST = "manifest.json"
+
+# field → (dtype, 每筆的 shape)
+FIELDS = {
+    "obs":    (np.float32, (OBS_DIM,)),
+    "mask":   (np.int8,    (N_ACTIONS,)),
+    "action": (np.int8,    ()),
+    "value":  (np.float32, ()),
+    "exact":  (np.int8,    ()),      # 1 = 在節點預算內完成完整搜尋
+}
+
+
+# ================================================================
+#   Shards
+# ================================================================
+class ShardWriter:
+    """
+    一筆一筆 append，寫進預先配置 rows 筆的 memmap；滿了就換下一個 shard。
+    close() 時最後一個沒寫滿的 shard 會截短重存。
+    """
+
+    def __init__(self, out_dir, prefix="", rows=SHARD_ROWS):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.rows = rows
+        self.shards = []        # [{"name": ..., "rows": n}, ...]
+        self._arrays = None
+        self._n = 0
+
+    def _path(self, name, field):
+        return os.path.join(self.out_dir, f"{name}_{field}.npy")
+
+    def _open(self):
+        name = f"{self.prefix}{len(self.shards):05d}"
+        self.shards.append({"name": name, "rows": 0})
+        self._arrays = {field: np.lib.format.open_memmap(self._path(name, field), mode="w+",
+                                                         dtype=dtype, shape=(self.rows,) + shape)
+                        for field, (dtype, shape) in FIELDS.items()}
+        self._n = 0
+
+    def append(self, obs, mask, action, value, exact=True):
+        if self._arrays is None or self._n == self.rows:
+            self._flush()
+            self._open()
+        i = self._n
+        self._arrays["obs"][i] = obs
+        self._arrays["mask"][i] = mask
+        self._arrays["action"][i] = action
+        self._arrays["value"][i] = value
+        self._arrays["exact"][i] = exact
+        self._n += 1
+        self.shards[-1]["rows"] = self._n
+
+    def _flush(self):
+        if self._arrays is None:
+            return
+        for arr in self._arrays.values():
+            arr.flush()
+        if self._n < self.rows:
+            name = self.shards[-1]["name"]
+            trimmed = {field: np.array(arr[:self._n]) for field, arr in self._arrays.items()}
+            self._arrays = None             # 先關掉 memmap 再覆寫
+            for field, arr in trimmed.items():
+                np.save(self._path(name, field), arr)
+        self._arrays = None
+
+    def close(self):
+        self._flush()
+        return self.shards
+
+
+def write_manifest(out_dir, shards, **meta):
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({"fields": list(FIELDS), "obs_dim": OBS_DIM, "shards": shards, **meta}, f, indent=2)
+
+
+class ShardDataset:
+    """manifest.json 列出的所有 shard，每個 field（manifest 的 fields）以 mmap_mode="r" 開啟"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.shards = [{field: np.load(os.path.join(path, f"{s['name']}_{field}.npy"), mmap_mode="r")
+                        for field in self.meta["fields"]}
+                       for s in self.meta["shards"] if s["rows"] > 0]
+
+    def __len__(self):
+        return sum(len(s["action"]) for s in self.shards)
+
+    def batches(self, batch_size, rng=None):
+        """一個 epoch 的 minibatch（field → ndarray）：shard 順序與 shard 內順序都打亂"""
+        rng = rng or np.random.default_rng()
+        for k in rng.permutation(len(self.shards)):
+            shard = self.shards[k]
+            order = rng.permutation(len(shard["action"]))
+            for start in range(0, len(order), batch_size):
+                idx = np.sort(order[start:start + batch_size])      # memmap 依序讀比較快
+                yield {field: np.asarray(arr[idx]) for field, arr in shard.items()}
+
+
+# ================================================================
+#   Generate
+# ================================================================
+class _RandomOpponent:
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+    def predict(self, obs, action_masks=None, deterministic=False):
+        return self.rng.choice(np.flatnonzero(action_masks)), None
+
+
+def _make_opponent(name, env, solver, seed):
+    if name == "solver":
+        return SolverPolicy(env, solver)
+    if name == "random":
+        return _RandomOpponent(seed)
+    from actor_policy import load_policy
+    return load_policy(name, seed=seed)
+
+
+def generate_shards(out_dir, n_games, seed=0, prefix="", epsilon=0.0, opponent="solver",
+                    cache_size=CACHE_SIZE, max_nodes=MAX_NODES, shard_rows=SHARD_ROWS):
+    """
+    玩 n_games 局並寫 shard。回傳 (shards, 統計 dict)。
+    opponent: "solver" / "random" / MaskablePPO .zip 或 .npz 路徑（P1）
+    """
+    solver = Solver(cache_size, max_nodes=max_nodes)
+    env = BuckshotEnv()
+    env._debug_logged = True
+    env.opponent_model = _make_opponent(opponent, env, solver, seed)
+    rng = np.random.default_rng(seed)
+    writer = ShardWriter(out_dir, prefix, shard_rows)
+
+    wins = samples = exact = 0
+    for g in range(n_games):
+        obs, _ = env.reset(seed=seed if g == 0 else None)
+        # P2 被銬住時 P1 可能在 reset 裡就打完整局
+        done, info = env.gs.phase == "game_end", {}
+        while not done:
+            mask = env.action_masks()
+            gs = env.gs
+            if gs.p2.handcuffed and gs.phase == "item":
+                action = N_ACTIONS - 1                      # 這一步會被跳過，沒有決策
+            else:
+                q = solver.action_values(gs)
+                action = int(np.nanargmax(q))
+                writer.append(obs, mask, action, q[action], solver.last_exact)
+                samples += 1
+                exact += solver.last_exact
+                if epsilon > 0 and rng.random() < epsilon:
+                    action = int(rng.choice(np.flatnonzero(mask)))
+            obs, _, terminated, truncated, info = env.step(action)
+            done = terminated or truncated
+        wins += bool(info.get("win", False))
+    return writer.close(), {"games": n_games, "wins": wins, "samples": samples, "exact": exact}
+
+
+def _worker(job):
+    return generate_shards(**job)
+
+
+def generate(out_dir, n_games, workers=1, seed=0, **kwargs):
+    """n_games 平均分給 workers 個 process（worker i 用 seed + i、prefix w{i}_），寫 manifest"""
+    counts = [n_games // workers + (i < n_games % workers) for i in range(workers)]
+    jobs = [dict(out_dir=out_dir, n_games=n, seed=seed + i, prefix=f"w{i}_", **kwargs)
+            for i, n in enumerate(counts) if n > 0]
+    t = time.time()
+    if len(jobs) == 1:
+        results = [_worker(jobs[0])]
+    else:
+        with Pool(len(jobs)) as pool:
+            results = pool.map(_worker, jobs)
+    elapsed = time.time() - t
+
+    shards = [s for r in results for s in r[0]]
+    stats = {key: sum(r[1][key] for r in results) for key in ("games", "wins", "samples", "exact")}
+    write_manifest(out_dir, shards, seed=seed, teacher="solver", **stats,
+                   **{k: v for k, v in kwargs.items() if k in ("epsilon", "opponent", "max_nodes")})
+
+    print(f"\n{'='*60}")
+    print(f"Oracle dataset: {out_dir}")
+    print(f"{'='*60}")
+    print(f"Games:        {stats['games']:,} ({workers} workers, {elapsed:.1f}s)")
+    print(f"Teacher wins: {stats['wins'] / max(stats['games'], 1):.2%}")
+    print(f"Samples:      {stats['samples']:,} in {len(shards)} shards")
+    print(f"Exact labels: {stats['exact'] / max(stats['samples'], 1):.2%} (rest: myopic budget fallback)")
+    print(f"{'='*60}\n")
+    return shards
+
+
+# ================================================================
+#   Behavior cloning
+# ================================================================
+def behavior_cloning(policy, dataset, epochs=5, batch_size=512, lr=1e-3, seed=None, verbose=1):
+    """
+    對 MaskableActorCriticPolicy 的 actor（mlp_extractor.policy_net + action_net）
+    最小化老師動作的 masked cross-entropy；critic 與 PPO 的 optimizer 不動。
+    回傳每個 epoch 的 (loss, 老師動作的 argmax 準確率)。
+    """
+    import torch
+
+    params = list(policy.mlp_extractor.policy_net.parameters()) + list(policy.action_net.parameters())
+    optimizer = torch.optim.Adam(params, lr=lr)
+    rng = np.random.default_rng(seed)
+    device = policy.device
+    history = []
+
+    policy.set_training_mode(True)
+    for epoch in range(epochs):
+        total_loss = correct = n = 0
+        t = time.time()
+        for batch in dataset.batches(batch_size, rng):
+            obs = torch.as_tensor(batch["obs"], device=device)
+            action = torch.as_tensor(batch["action"], dtype=torch.long, device=device)
+            dist = policy.get_distribution(obs, action_masks=batch["mask"])
+            loss = -dist.log_prob(action).mean()
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+            total_loss += loss.item() * len(action)
+            correct += (dist.distribution.logits.argmax(dim=1) == action).sum().item()
+            n += len(action)
+        history.append((total_loss / max(n, 1), correct / max(n, 1)))
+        if verbose:
+            print(f"BC epoch {epoch + 1}/{epochs}: loss {history[-1][0]:.4f} | "
+                  f"teacher agreement {history[-1][1]:.2%} | {time.time() - t:.1f}s")
+    policy.set_training_mode(False)
+    return history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Oracle-distilled dataset + behavior cloning")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    gen = sub.add_parser("generate", help="Play games with the solver as P2 teacher and write shards")
+    gen.add_argument("out", help="Output directory")
+    gen.add_argument("--games", type=int, default=1000)
+    gen.add_argument("--workers", type=int, default=os.cpu_count())
+    gen.add_argument("--seed", type=int, default=0)
+    gen.add_argument("--epsilon", type=float, default=0.0,
+                     help="Probability of executing a random legal action (label stays the teacher's)")
+    gen.add_argument("--opponent", default="solver", help="P1: solver, random, or a .zip / .npz policy")
+    gen.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="Solver transposition table per worker")
+    gen.add_argument("--max-nodes", type=int, default=MAX_NODES,
+                     help="Teacher node budget per decision (0 = unbounded, very slow)")
+    gen.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+
+    bc = sub.add_parser("bc", help="Behavior-clone a fresh MaskablePPO actor and save it")
+    bc.add_argument("data", help="Directory written by generate")
+    bc.add_argument("--out", default="models/bc_init")
+    bc.add_argument("--epochs", type=int, default=5)
+    bc.add_argument("--batch-size", type=int, default=512)
+    bc.add_argument("--lr", type=float, default=1e-3)
+    bc.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "generate":
+        generate(args.out, args.games, workers=max(1, min(args.workers, args.games)), seed=args.seed,
+                 epsilon=args.epsilon, opponent=args.opponent, cache_size=args.cache_size,
+                 max_nodes=args.max_nodes or None, shard_rows=args.shard_rows)
+    else:
+        from sb3_contrib import MaskablePPO
+        from train import POLICY_KWARGS
+        dataset = ShardDataset(args.data)
+        print(f"{len(dataset):,} samples from {args.data}")
+        model = MaskablePPO("MlpPolicy", BuckshotEnv(), policy_kwargs=POLICY_KWARGS, seed=args.seed)
+        behavior_cloning(model.policy, dataset, epochs=args.epochs, batch_size=args.batch_size,
+                         lr=args.lr, seed=args.seed)
+        model.save(args.out)
+        print(f"Saved {args.out}.zip")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,12 +6,13 @@ AI vs AI - 讓兩個 AI 自己對打。
 
 範例：
   python play_ai_vs_ai.py models/buckshot_final.zip models/buckshot_final.zip --num_games 10
+  python play_ai_vs_ai.py buckshot_actor.npz buckshot_actor.npz --num_games 10   # 不載入 torch
 """
 
 import argparse
 import random
 import numpy as np
-from sb3_contrib import MaskablePPO
+from actor_policy import load_policy  # .npz → NumpyActor（不需 torch），.zip → MaskablePPO
 
 from buckshot_env import BuckshotEnv, ITEM_LIST
 from game_state import GameState
@@ -29,7 +30,7 @@ def show_game_state(gs: GameState, verbose: bool = True):
     print(f"   Bullets: live={gs.live_left}, blank={gs.blank_left} (remaining={len(gs.real_bullets) - gs.current_index})")
 
 
-def ai_take_turn(env: BuckshotEnv, model: MaskablePPO, player_id: int, verbose: bool = True):
+def ai_take_turn(env: BuckshotEnv, model, player_id: int, verbose: bool = True):
     """
     讓 AI 完整執行一回合（item phase + shoot phase）
     player_id: 1 for P1, 2 for P2
@@ -190,8 +191,8 @@ def play_ai_vs_ai(model_p1_path: str, model_p2_path: str, num_games: int = 1, ve
     
     # 載入模型
     print("載入 AI 模型...")
-    model_p1 = MaskablePPO.load(model_p1_path)
-    model_p2 = MaskablePPO.load(model_p2_path)
+    model_p1 = load_policy(model_p1_path)
+    model_p2 = load_policy(model_p2_path)
     print("✓ 模型載入完成！\n")
     
     # 統計
@@ -272,8 +273,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="AI vs AI - 讓兩個 AI 模型互相對戰"
     )
-    parser.add_argument("model_p1", type=str, help="P1 的模型路徑")
-    parser.add_argument("model_p2", type=str, help="P2 的模型路徑")
+    parser.add_argument("model_p1", type=str, help="P1 的模型路徑（.zip 或 actor_policy.py 匯出的 .npz）")
+    parser.add_argument("model_p2", type=str, help="P2 的模型路徑（.zip 或 .npz）")
     parser.add_argument(
         "--num_games", "-n",
         type=int,
@@ -11,7 +11,7 @@ import shlex
 
 import random
 import numpy as np
-from sb3_contrib import MaskablePPO
+from actor_policy import load_policy  # .npz → NumpyActor（不需 torch），.zip → MaskablePPO
 
 from buckshot_env import BuckshotEnv, ITEM_LIST
 from game_state import GameState
@@ -226,7 +226,7 @@ def human_shoot(env: BuckshotEnv, gs: GameState, target: str):
 # ================================
 # AI P2：完整一回合（item + shoot）
 # ================================
-def ai_take_turn(env: BuckshotEnv, model: MaskablePPO):
+def ai_take_turn(env: BuckshotEnv, model):
     gs = env.gs
     print("\n========== AI 的回合 ==========")
 
@@ -345,7 +345,7 @@ def play_against_ai(model_path: str):
     print("=" * 70)
     print(f"載入 AI 模型：{model_path}")
 
-    model = MaskablePPO.load(model_path)
+    model = load_policy(model_path)
     print("✓ 模型載入完成！\n")
 
     # 建立環境（這裡不使用 env.reset()，避免 RL 版本的自動 P1 回合）
@@ -489,7 +489,7 @@ def play_against_ai(model_path: str):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Play Buckshot Roulette against trained AI (Human=P1, AI=P2)")
-    parser.add_argument("model", type=str, help="Path to trained model (e.g., models/buckshot_final.zip)")
+    parser.add_argument("model", type=str, help="Path to trained model (models/buckshot_final.zip or exported actor .npz)")
     args = parser.parse_args()
 
     try:
@@ -0,0 +1,157 @@
+"""
+Fixed-point vs float policy agreement benchmark.
+
+1. Plays games of BuckshotEnv (float actor vs float actor) and records every
+   encoded observation + action mask, from both the P2 and the P1 encoder.
+2. Runs the float actor and the bit-true S5.10 actor (weights quantized by
+   extract_weights.convert_to_fixed_binary) over the whole corpus in batch.
+3. Lets each policy play as P2 (argmax, like the FPGA) on the same game seeds
+   and compares win rates.
+
+Usage:
+    python quant_benchmark.py buckshot_final.zip --games 2000 --eval-games 2000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from actor_policy import MASKED_LOGIT, NumpyActor, load_actor_weights
+from buckshot_env import BuckshotEnv
+from fixed_point import FRAC_BITS, FixedPointMLP, WORD_BITS, to_float, wrap
+
+
+def quantize_weights(weights, frac_bits=FRAC_BITS):
+    """Quantize through extract_weights.convert_to_fixed_binary, exactly as exported."""
+    from extract_weights import convert_to_fixed_binary
+
+    fixed = {}
+    for name, bits in convert_to_fixed_binary(weights, frac_bits=frac_bits).items():
+        vals = np.array([int(b, 2) for b in bits], dtype=np.int64)
+        fixed[name] = wrap(vals, WORD_BITS).astype(np.int16).reshape(weights[name].shape)
+    return fixed
+
+
+class _Recorder:
+    """opponent_model wrapper that records every P1 (obs, mask) it is asked about."""
+
+    def __init__(self, model, obs_log, mask_log):
+        self.model = model
+        self.obs_log = obs_log
+        self.mask_log = mask_log
+
+    def predict(self, obs, action_masks=None, deterministic=False):
+        self.obs_log.append(obs)
+        self.mask_log.append(action_masks)
+        return self.model.predict(obs, action_masks=action_masks, deterministic=deterministic)
+
+
+def collect_corpus(weights, n_games, seed=0):
+    """
+    Play n_games with the float actor on both sides.
+
+    Returns:
+        obs (M, 33) float32, masks (M, 10) bool — P2 and P1 decisions mixed
+    """
+    obs_log, mask_log = [], []
+    env = BuckshotEnv(opponent_model=_Recorder(NumpyActor(weights, seed=seed), obs_log, mask_log))
+    env._debug_logged = True
+    p2 = NumpyActor(weights, seed=seed + 1)
+
+    for g in range(n_games):
+        obs, _ = env.reset(seed=seed if g == 0 else None)
+        done = False
+        while not done:
+            mask = env.action_masks()
+            obs_log.append(obs)
+            mask_log.append(mask)
+            action, _ = p2.predict(obs, action_masks=mask)
+            obs, _, terminated, truncated, _ = env.step(action)
+            done = terminated or truncated
+
+    return np.array(obs_log, dtype=np.float32), np.array(mask_log) != 0
+
+
+def masked_argmax(logits, masks, fill):
+    return np.where(masks, logits, fill).argmax(axis=1)
+
+
+def agreement_report(weights, fixed_mlp, obs, masks):
+    float_logits = NumpyActor(weights).logits(obs)
+    fixed_logits = fixed_mlp.logits(obs)
+    err = np.abs(float_logits - to_float(fixed_logits, fixed_mlp.out_frac))
+
+    argmax_agree = (float_logits.argmax(axis=1) == fixed_logits.argmax(axis=1)).mean()
+    masked_agree = (masked_argmax(float_logits, masks, MASKED_LOGIT)
+                    == masked_argmax(fixed_logits, masks, np.int16(-(1 << (WORD_BITS - 1))))).mean()
+    saturated = np.count_nonzero((fixed_logits == np.iinfo(np.int16).max) | (fixed_logits == np.iinfo(np.int16).min))
+
+    print(f"\n{'='*60}")
+    print(f"Fixed-point ({fixed_mlp.format_name}) vs Float Agreement")
+    print(f"{'='*60}")
+    print(f"States: {len(obs):,}")
+    print(f"Argmax agreement:        {argmax_agree:.4%}")
+    print(f"Masked-action agreement: {masked_agree:.4%}")
+    print(f"Saturated logits:        {saturated}")
+    print(f"Logit |error|: mean {err.mean():.5f} | p99 {np.percentile(err, 99):.5f} | max {err.max():.5f}")
+
+    # Histogram in LSB units of the fixed-point format
+    lsb = 1.0 / (1 << fixed_mlp.out_frac)
+    edges = [0, 0.5, 1, 2, 4, 8, 16, 64, np.inf]
+    counts, _ = np.histogram(err / lsb, bins=edges)
+    print("\nLogit |error| histogram (LSB units):")
+    for lo, hi, c in zip(edges[:-1], edges[1:], counts):
+        bar = "#" * int(50 * c / err.size)
+        print(f"  [{lo:>5g}, {hi:>5g}) {c:>9,} {c / err.size:7.2%} {bar}")
+
+    return argmax_agree, masked_agree
+
+
+def win_rate(policy, opponent_weights, n_games, seed=0):
+    """Win rate of ``policy`` as P2 (argmax) over games seeded seed, seed+1, ..."""
+    env = BuckshotEnv()
+    env._debug_logged = True
+    wins = 0
+    for g in range(n_games):
+        env.opponent_model = NumpyActor(opponent_weights, seed=seed + g)
+        obs, _ = env.reset(seed=seed + g)
+        done, info = False, {}
+        while not done:
+            action, _ = policy.predict(obs, action_masks=env.action_masks(), deterministic=True)
+            obs, _, terminated, truncated, info = env.step(action)
+            done = terminated or truncated
+        wins += bool(info.get("win", False))
+    return wins / n_games
+
+
+def main():
+    parser = argparse.ArgumentParser(description="S5.10 fixed-point vs float policy agreement benchmark")
+    parser.add_argument("model", type=str, help="MaskablePPO .zip or exported actor .npz")
+    parser.add_argument("--games", type=int, default=1000, help="Games played to collect observations")
+    parser.add_argument("--eval-games", type=int, default=1000, help="Games per policy for the win-rate delta")
+    parser.add_argument("--frac-bits", type=int, default=FRAC_BITS, help="Fractional bits of the 16-bit format")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    weights = load_actor_weights(args.model)
+    fixed_mlp = FixedPointMLP(quantize_weights(weights, args.frac_bits), frac_bits=args.frac_bits)
+
+    t = time.time()
+    obs, masks = collect_corpus(weights, args.games, seed=args.seed)
+    print(f"Collected {len(obs):,} observations from {args.games} games in {time.time() - t:.1f}s")
+
+    agreement_report(weights, fixed_mlp, obs, masks)
+
+    if args.eval_games:
+        wr_float = win_rate(NumpyActor(weights), weights, args.eval_games, seed=args.seed)
+        wr_fixed = win_rate(fixed_mlp, weights, args.eval_games, seed=args.seed)
+        print(f"\nWin rate as P2 vs float opponent ({args.eval_games} games, same seeds):")
+        print(f"  Float actor:       {wr_float:.2%}")
+        print(f"  Fixed-point actor: {wr_fixed:.2%}")
+        print(f"  Delta:             {wr_fixed - wr_float:+.2%}")
+    print(f"{'='*60}\n")
+
+
+if __name__ == "__main__":
+    main()
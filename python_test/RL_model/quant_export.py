@@ -0,0 +1,269 @@
+"""
+Quantization-aware export of the actor for the FPGA MLP.
+
+extract_weights.py writes S5.10 for every layer. This script measures
+weight and activation ranges over real encoded states from BuckshotEnv. It
+then picks the fractional bits of each layer's weights and outputs to
+minimize masked-argmax disagreement with the float actor. Finally it writes:
+
+    <out>/fc*_weight.txt, fc*_bias.txt   binary lines (same as fpga_weights_bin)
+    <out>/fc*_weight.mif, fc*_bias.mif   ROM init files (same layout as ai_model/model_weight)
+    <out>/quant_params.svh               per-layer FRAC_BITS etc. for mlp_inference.sv
+
+The fc*_layer_parallel.sv modules stay unchanged: with input fractional bits
+a_in, weight bits w and output bits a_out, a layer only needs
+FRAC_BITS = a_in + w - a_out and its bias stored with a_out fractional bits
+(see fixed_point.layer_shifts). The input stays S5.10 because mask_out.sv
+decodes the state with >>> 10.
+
+Usage:
+    python quant_export.py buckshot_final.zip --out fpga_weights_qat
+    python quant_export.py buckshot_final.zip --out fpga_weights_qat8 --weight-bits 8
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from actor_policy import MASKED_LOGIT, NumpyActor, load_actor_weights
+from fixed_point import FRAC_BITS, LAYERS, WORD_BITS, FixedPointMLP
+from quant_benchmark import agreement_report, collect_corpus, masked_argmax
+
+MAC_LANES = 16          # P of fc*_layer_parallel.sv (weights per ROM word)
+ROM_WORD_BITS = 16      # bits per MAC lane in the ROM word (q[(k*16) +: 16])
+
+
+# ================================================================
+#   Range measurement
+# ================================================================
+def max_frac_bits(max_abs, word_bits):
+    """Largest fractional-bit count that still represents ±max_abs in word_bits."""
+    if max_abs <= 0:
+        return word_bits - 1
+    limit = (1 << (word_bits - 1)) - 1
+    return int(np.floor(np.log2(limit / max_abs)))
+
+
+def float_activations(weights, obs):
+    """Float outputs of fc1 (ReLU), fc2 (ReLU), fc3 (logits) for every observation."""
+    acts = []
+    h = obs.astype(np.float64)
+    for layer in LAYERS:
+        h = h @ weights[f"{layer}_weight"].T + weights[f"{layer}_bias"]
+        if layer != LAYERS[-1]:
+            h = np.maximum(h, 0.0)
+        acts.append(h)
+    return acts
+
+
+def measure_ranges(weights, obs):
+    """layer → dict(weight=max|W|, bias=max|b|, act=max|output|) over the corpus"""
+    acts = float_activations(weights, obs)
+    ranges = {}
+    for layer, act in zip(LAYERS, acts):
+        ranges[layer] = {
+            "weight": float(np.abs(weights[f"{layer}_weight"]).max()),
+            "bias": float(np.abs(weights[f"{layer}_bias"]).max()),
+            "act": float(np.abs(act).max()),
+        }
+    return ranges
+
+
+# ================================================================
+#   Per-layer fractional-bit search
+# ================================================================
+def evaluate(weights, act_fracs, weight_fracs, weight_bits, obs, masks, float_actions):
+    """(masked-argmax disagreements, mean |logit error|) of one format choice"""
+    mlp = FixedPointMLP.from_float(weights, act_fracs=act_fracs, weight_fracs=weight_fracs,
+                                   weight_bits=weight_bits)
+    logits = mlp.logits(obs)
+    actions = masked_argmax(logits, masks, np.int16(-(1 << (WORD_BITS - 1))))
+    err = np.abs(logits / (1 << mlp.out_frac) - float_activations(weights, obs)[-1]).mean()
+    return int(np.count_nonzero(actions != float_actions)), float(err)
+
+
+def search_formats(weights, obs, masks, weight_bits=WORD_BITS, in_frac=FRAC_BITS, spread=2, verbose=True):
+    """
+    Greedy layer-by-layer search over (weight frac, output frac).
+
+    Every layer starts at the widest format that holds its measured range
+    (max_frac_bits). Candidates go from ``spread`` bits of extra headroom to
+    1 bit past the fit, which lets rare outliers saturate. Layers are fixed in
+    order fc1 → fc3. Ties go to the lower logit error.
+
+    Returns:
+        act_fracs (input, fc1, fc2, fc3), weight_fracs (fc1, fc2, fc3)
+    """
+    ranges = measure_ranges(weights, obs)
+    float_actions = masked_argmax(NumpyActor(weights).logits(obs), masks, MASKED_LOGIT)
+
+    fit_w = [max_frac_bits(ranges[l]["weight"], weight_bits) for l in LAYERS]
+    fit_a = [max_frac_bits(max(ranges[l]["act"], ranges[l]["bias"]), WORD_BITS) for l in LAYERS]
+    act_fracs = [in_frac] + fit_a
+    weight_fracs = list(fit_w)
+
+    for i, layer in enumerate(LAYERS):
+        best = None
+        for w in range(fit_w[i] - spread, fit_w[i] + 2):
+            for a in range(fit_a[i] - spread, fit_a[i] + 2):
+                trial_a = act_fracs[:i + 1] + [a] + act_fracs[i + 2:]
+                trial_w = weight_fracs[:i] + [w] + weight_fracs[i + 1:]
+                if act_fracs[i] + w - a < 0 or (i + 1 < len(LAYERS) and a + trial_w[i + 1] - trial_a[i + 2] < 0):
+                    continue
+                score = evaluate(weights, trial_a, trial_w, weight_bits, obs, masks, float_actions)
+                if best is None or score < best[0]:
+                    best = (score, w, a)
+        (mismatch, err), weight_fracs[i], act_fracs[i + 1] = best
+        if verbose:
+            print(f"  {layer}: weight frac {weight_fracs[i]:>2} | output frac {act_fracs[i + 1]:>2} | "
+                  f"disagreements {mismatch} | mean |logit err| {err:.5f}")
+
+    return tuple(act_fracs), tuple(weight_fracs)
+
+
+def saturation_report(weights, mlp, weight_bits, obs):
+    """layer → counts of clipped weights / biases and wrapped psums / outputs"""
+    stats = {}
+    mlp.run(mlp.quantize_input(obs), stats=stats)
+    report = {}
+    for layer, w_frac, out_frac in zip(LAYERS, mlp.weight_fracs, mlp.act_fracs[1:]):
+        w_limit = (1 << (weight_bits - 1)) - 1
+        b_limit = (1 << (WORD_BITS - 1)) - 1
+        report[layer] = {
+            "weight_clip": int(np.count_nonzero(np.abs(np.round(weights[f"{layer}_weight"] * (1 << w_frac))) > w_limit)),
+            "bias_clip": int(np.count_nonzero(np.abs(np.round(weights[f"{layer}_bias"] * (1 << out_frac))) > b_limit)),
+            "acc_wrap": int(stats[layer].get("acc_wrap", 0)),
+            "out_wrap": int(stats[layer].get("out_wrap", 0)),
+        }
+    return report
+
+
+# ================================================================
+#   Writers
+# ================================================================
+def to_bits(values, bits):
+    return [format(int(v) & ((1 << bits) - 1), f"0{bits}b") for v in np.ravel(values)]
+
+
+def save_txt(mlp, weight_bits, output_dir):
+    for layer in LAYERS:
+        for kind, bits in (("weight", weight_bits), ("bias", WORD_BITS)):
+            path = os.path.join(output_dir, f"{layer}_{kind}.txt")
+            with open(path, "w") as f:
+                f.write("\n".join(to_bits(mlp.weights[f"{layer}_{kind}"], bits)) + "\n")
+            print(f"✓ Saved: {path}")
+
+
+def write_mif(path, words):
+    """words: list of MSB-first bit strings, one per ROM address"""
+    with open(path, "w") as f:
+        f.write(f"DEPTH = {len(words)};\nWIDTH = {len(words[0])};\n")
+        f.write("ADDRESS_RADIX = DEC;\nDATA_RADIX = BIN;\nCONTENT\nBEGIN\n")
+        for addr, word in enumerate(words):
+            f.write(f"{addr} : {word};\n")
+        f.write("END;\n")
+    print(f"✓ Saved: {path}")
+
+
+def rom_words(columns):
+    """
+    Pack MAC_LANES values per ROM word, lane k at bits [k*16 +: 16] (LSB first),
+    unused lanes zero. columns: (n_groups*MAC_LANES or fewer, depth) int values.
+    """
+    n_out, depth = columns.shape
+    groups = -(-n_out // MAC_LANES)
+    padded = np.zeros((groups * MAC_LANES, depth), dtype=np.int64)
+    padded[:n_out] = columns
+    words = []
+    for g in range(groups):
+        lanes = padded[g * MAC_LANES:(g + 1) * MAC_LANES]
+        for addr in range(depth):
+            words.append("".join(to_bits(lanes[::-1, addr], ROM_WORD_BITS)))
+    return words
+
+
+def save_mif(mlp, output_dir):
+    """
+    fc*_weight.mif: address = group * IN_DIM + in_idx → W[group*16 + k, in_idx]
+    fc*_bias.mif:   address = group                   → b[group*16 + k]
+    (8-bit weights are sign-extended into the 16-bit lanes.)
+    """
+    for layer in LAYERS:
+        write_mif(os.path.join(output_dir, f"{layer}_weight.mif"), rom_words(mlp.weights[f"{layer}_weight"]))
+        write_mif(os.path.join(output_dir, f"{layer}_bias.mif"), rom_words(mlp.weights[f"{layer}_bias"][:, None]))
+
+
+def save_header(mlp, weight_bits, report, path):
+    lines = [
+        "// quant_params.svh — generated by quant_export.py",
+        "// Pass FCn_FRAC_BITS as the FRAC_BITS parameter of fcn_layer_parallel.",
+        "`ifndef QUANT_PARAMS_SVH",
+        "`define QUANT_PARAMS_SVH",
+        "",
+        f"localparam int WEIGHT_BITS       = {weight_bits};",
+        f"localparam int IN_FRAC_BITS      = {mlp.in_frac};",
+    ]
+    for i, layer in enumerate(LAYERS):
+        name = layer.upper()
+        sat = report[layer]
+        lines += [
+            "",
+            f"// {layer}: weight frac {mlp.weight_fracs[i]}, output frac {mlp.act_fracs[i + 1]} "
+            f"(clipped w/b {sat['weight_clip']}/{sat['bias_clip']}, wrapped outputs {sat['out_wrap']})",
+            f"localparam int {name}_FRAC_BITS     = {mlp.shifts[i]};",
+            f"localparam int {name}_W_FRAC_BITS   = {mlp.weight_fracs[i]};",
+            f"localparam int {name}_OUT_FRAC_BITS = {mlp.act_fracs[i + 1]};",
+        ]
+    lines += ["", "`endif", ""]
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+    print(f"✓ Saved: {path}")
+
+
+# ================================================================
+#   MAIN FUNCTION
+# ================================================================
+def quant_export(model_path, output_dir, weight_bits=WORD_BITS, n_games=1000, spread=2, seed=0):
+    print("=" * 70)
+    print(f"Quantization-aware export ({weight_bits}-bit weights, 16-bit activations)")
+    print("=" * 70)
+
+    weights = load_actor_weights(model_path)
+    obs, masks = collect_corpus(weights, n_games, seed=seed)
+    print(f"\nCalibration corpus: {len(obs):,} observations from {n_games} games")
+
+    print("\nMeasured ranges (max |value|):")
+    for layer, r in measure_ranges(weights, obs).items():
+        print(f"  {layer}: weight {r['weight']:.4f} | bias {r['bias']:.4f} | output {r['act']:.4f}")
+
+    print("\nSearching per-layer fractional bits...")
+    act_fracs, weight_fracs = search_formats(weights, obs, masks, weight_bits, spread=spread)
+    mlp = FixedPointMLP.from_float(weights, act_fracs=act_fracs, weight_fracs=weight_fracs, weight_bits=weight_bits)
+
+    report = saturation_report(weights, mlp, weight_bits, obs)
+    print("\nSaturation / wraparound counts:")
+    for layer, sat in report.items():
+        print(f"  {layer}: clipped weights {sat['weight_clip']} | clipped biases {sat['bias_clip']} | "
+              f"wrapped psums {sat['acc_wrap']} | wrapped outputs {sat['out_wrap']}")
+
+    agreement_report(weights, mlp, obs, masks)
+
+    os.makedirs(output_dir, exist_ok=True)
+    save_txt(mlp, weight_bits, output_dir)
+    save_mif(mlp, output_dir)
+    save_header(mlp, weight_bits, report, os.path.join(output_dir, "quant_params.svh"))
+    return mlp
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantization-aware export with per-layer fractional-bit search")
+    parser.add_argument("model", type=str, help="MaskablePPO .zip or exported actor .npz")
+    parser.add_argument("--out", type=str, default="fpga_weights_qat", help="Output directory")
+    parser.add_argument("--weight-bits", type=int, choices=[8, 16], default=16, help="Weight word width")
+    parser.add_argument("--games", type=int, default=1000, help="Games played for the calibration corpus")
+    parser.add_argument("--spread", type=int, default=2, help="Extra headroom bits tried per layer")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    quant_export(args.model, args.out, weight_bits=args.weight_bits, n_games=args.games,
+                 spread=args.spread, seed=args.seed)
@@ -1,5 +1,7 @@
 import numpy as np
 
+from fixed_point import fc_layer_fixed
+
 # ============================================================
 # 全域設定（照你的 MLP）
 # ============================================================
@@ -46,21 +48,8 @@ def load_bias_vector(filename, out_dim):
 # 單層 FC 模擬（bit-true）
 # ============================================================
 def fc_layer_s5_10(act_in, W, B, has_relu=True, frac_bits=FRAC_BITS):
-    IN_DIM, OUT_DIM = W.shape[1], W.shape[0]
-    acc = np.left_shift(B.astype(np.int32), frac_bits)
-    for i in range(IN_DIM):
-        x = np.int32(act_in[i])
-        for o in range(OUT_DIM):
-            acc[o] = np.int32(acc[o] + np.int32(x * np.int32(W[o, i])))
-    shifted = acc >> frac_bits
-    out = np.zeros(OUT_DIM, dtype=np.int16)
-    for o in range(OUT_DIM):
-        s = np.int32(shifted[o])
-        if has_relu and s < 0:
-            out[o] = np.int16(0)
-        else:
-            out[o] = np.int16(np.int32(s & 0xFFFF))
-    return out
+    # act_in 可為 (IN,) 或 (N, IN)；bit-true 細節見 fixed_point.fc_layer_fixed
+    return fc_layer_fixed(act_in, W, B, has_relu=has_relu, frac_bits=frac_bits)
 
 # ============================================================
 # MLP 結構（3 層）
@@ -75,6 +64,7 @@ class FixedMLP_S5_10:
         self.B3 = load_bias_vector ("fc3_bias.txt",   OUT_DIM)
 
     def run_from_fixed_input(self, x_fixed):
+        # x_fixed: (33,) 或一整批 (N, 33) int16
         act1 = fc_layer_s5_10(x_fixed, self.W1, self.B1, has_relu=True)
         act2 = fc_layer_s5_10(act1,    self.W2, self.B2, has_relu=True)
         act3 = fc_layer_s5_10(act2,    self.W3, self.B3, has_relu=False)
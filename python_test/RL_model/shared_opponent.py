@@ -0,0 +1,107 @@
+"""
+Shared-memory opponent weights for multiprocess self-play.
+
+The learner publishes the frozen opponent's actor weights once into a
+shared-memory block; every env worker maps the same block and copies the
+weights into its local NumpyActor only when the version counter changes,
+at the next episode boundary.
+
+Layout of the block: [version int64][fc1_weight, fc1_bias, ... float32]
+An odd version means a publish is in progress (seqlock).
+"""
+
+from multiprocessing import shared_memory
+
+import gymnasium as gym
+import numpy as np
+
+from actor_policy import ACTOR_SHAPES, NumpyActor
+
+_HEADER_BYTES = 8
+
+
+class SharedActorWeights:
+    """Actor weights living in a named shared-memory block."""
+
+    def __init__(self, name=None):
+        total = sum(int(np.prod(shape)) for shape in ACTOR_SHAPES.values())
+        self._owner = name is None
+        if self._owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=_HEADER_BYTES + 4 * total)
+            self.shm.buf[:_HEADER_BYTES] = bytes(_HEADER_BYTES)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self._version = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        flat = np.ndarray((total,), dtype=np.float32, buffer=self.shm.buf, offset=_HEADER_BYTES)
+        self.views = {}
+        offset = 0
+        for key, shape in ACTOR_SHAPES.items():
+            size = int(np.prod(shape))
+            self.views[key] = flat[offset:offset + size].reshape(shape)
+            offset += size
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def version(self):
+        return int(self._version[0])
+
+    def publish(self, weights):
+        """Write a new set of weights (learner side) and bump the version."""
+        v = self.version
+        self._version[0] = v + 1
+        for key, view in self.views.items():
+            view[...] = weights[key]
+        self._version[0] = v + 2
+
+    def read_into(self, actor):
+        """Copy the current weights into ``actor``; returns the version read."""
+        while True:
+            v = self.version
+            if v % 2:
+                continue
+            actor.load_weights(self.views)
+            if self.version == v:
+                return v
+
+    def close(self):
+        self._version = None
+        self.views = {}
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+class SharedOpponent:
+    """
+    opponent_model for a BuckshotEnv inside a worker process.
+    Keeps a private copy of the weights so an opponent never changes mid-game.
+    """
+
+    def __init__(self, shm_name, seed=None):
+        self.shared = SharedActorWeights(shm_name)
+        self.actor = NumpyActor(seed=seed)
+        self.version = None
+        self.refresh()
+
+    def refresh(self):
+        """Hot-swap to the latest published weights if the version changed."""
+        if self.shared.version != self.version:
+            self.version = self.shared.read_into(self.actor)
+
+    def predict(self, obs, action_masks=None, deterministic=False):
+        return self.actor.predict(obs, action_masks=action_masks, deterministic=deterministic)
+
+
+class OpponentRefreshWrapper(gym.Wrapper):
+    """Refresh the SharedOpponent at every episode boundary (reset)."""
+
+    def reset(self, **kwargs):
+        self.env.unwrapped.opponent_model.refresh()
+        return self.env.reset(**kwargs)
+
+    def action_masks(self, player="p2"):
+        return self.env.unwrapped.action_masks(player=player)
@@ -0,0 +1,470 @@
+"""
+Expectimax solver for BuckshotEnv.
+
+從目前的 GameState 算出輪到的玩家每個合法動作的勝率：玩家取 max、
+子彈 / 手機揭露 / 換彈是機率節點，規則與 buckshot_env.py 相同。
+
+    solver = Solver()
+    q = solver.action_values(env.gs)        # (10,) 勝率，不合法的動作是 nan
+    action = solver.best_action(env.gs)
+
+模型上的簡化（其餘都是精確的 expectimax）：
+- 子彈知識當作雙方共有：用輪到的玩家自己的 bullet_knowledge 當作 belief
+  （放大鏡 / 手機揭露的結果對手也「知道」）。
+- 勝率只在目前的彈匣內是精確的。換彈之後（新的彈匣依 VALID_COMBOS
+  均勻抽、先手 1/2）env 每次隨機發的新道具不算，且預設連手上剩下的道具
+  也不算：換彈後當作雙方都沒有道具的遊戲，所以彈匣打完時還留著的道具
+  價值是 0，solver 永遠不會選擇「留著道具」。Solver(carry_items=True)
+  會把手上的道具帶進下一個彈匣，只略掉隨機發的新道具，但要算的局面多很多
+  （單一決策可能要幾十秒以上），只適合離線分析。
+  道具只會越用越少，每個 round 至少一發 live，遞迴有限。
+- 每個決策有節點預算（max_nodes，走訪的局面數，table 命中也算）。超過
+  預算就放棄這次的完整搜尋，改用短視版本：只有目前這個回合能用道具，
+  輪到對手之後雙方都當作沒有道具。已經算完的局面留在 table 裡，預算
+  不影響它們的值。預設 20,000：100 場 solver 對 solver（2,901 個決策）
+  平均約 17 ms、p95 約 0.1 秒、最慢 < 0.3 秒，約 16% 的決策用短視版本
+  （regret report 會印出比例）。max_nodes=None 不設上限，單一決策可能
+  要好幾秒，只適合離線分析。
+
+剪枝（都不改變勝率）：沒滿血先抽菸；鋸子 / 反轉 / 手銬延到 ready 前一起決定；
+沒有效果的道具不展開；已經必勝就不再展開其他動作。
+
+Transposition table: 以輪到的玩家為準的 canonical state tuple（雙方互換後
+同一個局面共用）→ 勝率，functools.lru_cache（LRU 淘汰）。
+
+Usage:
+    python solver.py                              # 隨機 P2 的 regret
+    python solver.py models/buckshot_final.zip --games 200
+    python solver.py --games 5 --carry-items --max-nodes 0   # 換彈後保留手上的道具、不限預算（很慢）
+"""
+
+import argparse
+import functools
+import gc
+import math
+import sys
+import time
+
+import numpy as np
+
+from deal_tables import VALID_COMBOS
+from game_state import ITEM_NAMES
+
+MAGNIFIER, CIGARETTE, BEER, SAW, HANDCUFF, PHONE, REVERSE = range(len(ITEM_NAMES))
+N_ACTIONS = 10
+SHOOT_ENEMY, SHOOT_SELF, READY = 0, 1, 9
+MAX_HP = 4
+CACHE_SIZE = 1 << 20        # transposition table 最多保留的局面數
+MAX_NODES = 20_000          # 每個決策完整搜尋最多走訪的局面數（含 table 命中；None = 不限）
+
+# 彈匣中每一顆的 belief
+UNKNOWN, BLANK, LIVE = 0, 1, 2
+
+_NO_ITEMS = (0,) * len(ITEM_NAMES)
+_ACTIVE_ITEMS = (MAGNIFIER, PHONE, BEER)     # 會揭露 / 改變彈匣的道具
+
+# 換彈後的新 round：(彈匣, live, blank, 機率)
+_FRESH_ROUNDS = tuple(((UNKNOWN,) * (live + blank), live, blank, 1 / len(VALID_COMBOS))
+                      for live, blank in VALID_COMBOS)
+
+
+# ================================================================
+#   Canonical state
+# ================================================================
+# state = (hp_me, hp_opp, items_me, items_opp, opp_cuffed, saw, reverse, mag, live, blank, shoot_phase)
+#   me          輪到的玩家（item phase 不會是被銬住的狀態：被銬的回合一開始就被跳過）
+#   items_*     ITEM_NAMES 順序的數量 tuple
+#   mag         剩下的子彈（current_index 起）的 belief tuple，UNKNOWN / BLANK / LIVE
+#   live/blank  剩下的 live / blank 數（原始子彈，與 gs.live_left / blank_left 相同）
+#   shoot_phase 已經 ready（只能開槍）
+
+def state_key(gs, player=None):
+    """GameState → canonical state（player 的 bullet_knowledge 當 belief，預設 = 輪到的玩家）"""
+    me, opp = (gs.p1, gs.p2) if gs.turn == "p1" else (gs.p2, gs.p1)
+    view = me if player is None else getattr(gs, player)
+    if gs.phase not in ("item", "shoot"):
+        raise ValueError(f"no decision in phase {gs.phase!r}")
+    # 已經 ready 的玩家身上的手銬（env 沒有在回合開始時處理到的）只影響下一個回合，這裡忽略
+    if me.handcuffed and gs.phase == "item":
+        raise ValueError(f"{gs.turn} is handcuffed; its turn is skipped before any decision")
+    mag = tuple(UNKNOWN if k is None else (LIVE if k == "live" else BLANK)
+                for k in view.bullet_knowledge[gs.current_index:len(gs.real_bullets)])
+    return (max(me.hp, 0), max(opp.hp, 0),
+            tuple(getattr(me.items, name) for name in ITEM_NAMES),
+            tuple(getattr(opp.items, name) for name in ITEM_NAMES),
+            opp.handcuffed, gs.saw_active, gs.reverse_active,
+            mag, gs.live_left, gs.blank_left, gs.phase == "shoot")
+
+
+def _p_live(mag, live, index):
+    """mag[index] 是 live 的機率（沒看過的位置彼此可交換）"""
+    status = mag[index]
+    if status != UNKNOWN:
+        return 1.0 if status == LIVE else 0.0
+    unknown = mag.count(UNKNOWN)
+    return (live - mag.count(LIVE)) / unknown
+
+
+def _reveal(mag, index, status):
+    return mag[:index] + (status,) + mag[index + 1:]
+
+
+def _use(items, item):
+    return items[:item] + (items[item] - 1,) + items[item + 1:]
+
+
+# ================================================================
+#   Solver
+# ================================================================
+class _BudgetExceeded(Exception):
+    pass
+
+
+class Solver:
+    """
+    value(state): 輪到的玩家的勝率（最佳對最佳）。
+    cache_size: transposition table 大小（lru_cache 的 maxsize；None = 不淘汰）
+    carry_items: 換彈後保留雙方手上的道具（False = 當作沒有道具的遊戲，快很多）
+    max_nodes:   每次 action_values 完整搜尋的節點預算；超過就改用短視版本
+    myopic:      輪到對手之後雙方都當作沒有道具（預算 fallback 用）
+    """
+
+    def __init__(self, cache_size=CACHE_SIZE, carry_items=False, max_nodes=MAX_NODES, myopic=False):
+        self.carry_items = carry_items
+        self.max_nodes = max_nodes
+        self.myopic = myopic
+        self._nodes = 0
+        self._budget = None
+        self._fallback = None
+        self.last_exact = True      # 最近一次 action_values 是否在預算內完成
+        self.decisions = 0
+        self.fallbacks = 0
+        self._table = functools.lru_cache(maxsize=cache_size)(self._value)
+        self.reload_value = functools.lru_cache(maxsize=cache_size)(self._reload_value)
+        # 一個 round 最多 ~20 層，換彈後接著遞迴下一個 round
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 20000))
+
+    def cache_info(self):
+        return self._table.cache_info()
+
+    def clear(self):
+        self._table.cache_clear()
+        self.reload_value.cache_clear()
+
+    # ---------------------------------------------------------
+    # public
+    # ---------------------------------------------------------
+    def action_values(self, gs, player=None):
+        """(10,) 每個動作的勝率（輪到的玩家），不合法的動作是 nan；動作編號同 BuckshotEnv"""
+        # 搜尋不產生循環參照；table 裡上百萬個 tuple 會讓 GC 每次掃描都花好幾百 ms
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        self._nodes, self._budget = 0, self.max_nodes
+        try:
+            state = state_key(gs, player)
+            self.decisions += 1
+            q = self._q_values(state)
+            self.last_exact = True
+        except _BudgetExceeded:
+            # 中途放棄的局面不會進 cache（例外不被 lru_cache 記住），table 仍然正確
+            if self._fallback is None:
+                self._fallback = Solver(self._table.cache_info().maxsize, max_nodes=None, myopic=True)
+            q = self._fallback._q_values(state)
+            self.last_exact = False
+            self.fallbacks += 1
+        finally:
+            self._budget = None
+            if gc_enabled:
+                gc.enable()
+        return q
+
+    def _q_values(self, state):
+        q = np.full(N_ACTIONS, np.nan)
+        for action in self.legal_actions(state):
+            q[action] = self.q_value(state, action)
+        return q
+
+    def best_action(self, gs, player=None):
+        return int(np.nanargmax(self.action_values(gs, player)))
+
+    @staticmethod
+    def legal_actions(state):
+        items_me, shoot_phase = state[2], state[10]
+        if shoot_phase:
+            return [SHOOT_ENEMY, SHOOT_SELF]
+        return [2 + item for item in range(len(ITEM_NAMES)) if items_me[item] > 0] + [READY]
+
+    def q_value(self, state, action):
+        """state 下做 action 的勝率"""
+        if action == READY:
+            return self.value(state[:10] + (True,))
+        if action in (SHOOT_ENEMY, SHOOT_SELF):
+            return self._shoot(state, action == SHOOT_SELF)
+        return self._use_item(state, action - 2)
+
+    # ---------------------------------------------------------
+    # 節點
+    # ---------------------------------------------------------
+    def value(self, state):
+        """state 的勝率（查 transposition table）；有預算時 table 命中也算一個節點"""
+        if self._budget is not None:
+            self._nodes += 1
+            if self._nodes > self._budget:
+                raise _BudgetExceeded
+        return self._table(state)
+
+    def _value(self, state):
+        if state[10]:
+            return max(self._shoot(state, False), self._shoot(state, True))
+        # 沒滿血就先抽菸：血量只會因為開槍減少，早抽不會比晚抽差
+        if state[2][CIGARETTE] > 0 and state[0] < MAX_HP:
+            return self._use_item(state, CIGARETTE)
+        best = self._ready_value(state)
+        for item in _ACTIVE_ITEMS:
+            if best >= 1.0:
+                break
+            # 沒有效果的道具只是少一個道具，不會比不用好
+            if state[2][item] > 0 and not self._no_op(state, item):
+                best = max(best, self._use_item(state, item))
+        # 手銬只有在啤酒退掉最後一顆（換彈）之前用才跟最後再用不一樣：銬住的狀態會帶進下一個彈匣
+        if (best < 1.0 and state[2][HANDCUFF] > 0 and not state[4]
+                and len(state[7]) == 1 and state[2][BEER] > 0):
+            best = max(best, self._use_item(state, HANDCUFF))
+        return best
+
+    def _ready_value(self, state):
+        """
+        鋸子 / 反轉 / 手銬不產生資訊，效果也不會被放大鏡 / 手機 / 啤酒改變，
+        所以一律延到 ready 前再決定要不要用：在這裡一次取 max。
+        """
+        hp_me, hp_opp, items_me, items_opp, opp_cuffed, saw, reverse, mag, live, blank, _ = state
+        best = 0.0
+        for use_saw in (False, True) if items_me[SAW] > 0 and not saw else (False,):
+            for use_reverse in (False, True) if items_me[REVERSE] > 0 and not reverse else (False,):
+                for use_cuff in (False, True) if items_me[HANDCUFF] > 0 and not opp_cuffed else (False,):
+                    items = items_me
+                    for item, used in ((SAW, use_saw), (REVERSE, use_reverse), (HANDCUFF, use_cuff)):
+                        if used:
+                            items = _use(items, item)
+                    best = max(best, self.value((hp_me, hp_opp, items, items_opp, opp_cuffed or use_cuff,
+                                                 saw or use_saw, reverse or use_reverse,
+                                                 mag, live, blank, True)))
+        return best
+
+    @staticmethod
+    def _no_op(state, item):
+        hp_me, _, _, _, opp_cuffed, saw, reverse, mag, _, _, _ = state
+        if item == CIGARETTE:
+            return hp_me >= MAX_HP
+        if item == MAGNIFIER:
+            return mag[0] != UNKNOWN
+        if item == SAW:
+            return saw
+        if item == REVERSE:
+            return reverse
+        if item == HANDCUFF:
+            return opp_cuffed
+        if item == PHONE:
+            return all(s != UNKNOWN for s in mag[-3:]) if len(mag) > 3 else mag[-1] != UNKNOWN
+        return False
+
+    def _use_item(self, state, item):
+        hp_me, hp_opp, items_me, items_opp, opp_cuffed, saw, reverse, mag, live, blank, _ = state
+        items_me = _use(items_me, item)
+
+        if item == CIGARETTE:
+            return self.value((min(hp_me + 1, MAX_HP), hp_opp, items_me, items_opp, opp_cuffed,
+                               saw, reverse, mag, live, blank, False))
+        if item == SAW:
+            saw = True
+        elif item == REVERSE:
+            reverse = True
+        elif item == HANDCUFF:
+            opp_cuffed = True
+        elif item == MAGNIFIER:
+            return self._chance(mag, live, 0, lambda status: self.value(
+                (hp_me, hp_opp, items_me, items_opp, opp_cuffed, saw, reverse,
+                 _reveal(mag, 0, status), live, blank, False)))
+        elif item == PHONE:
+            # 剩 ≤ 3 顆：揭露最後一顆；否則最後三顆中隨機一顆
+            n = len(mag)
+            candidates = [n - 1] if n <= 3 else [n - 3, n - 2, n - 1]
+            return sum(self._chance(mag, live, i, lambda status, i=i: self.value(
+                (hp_me, hp_opp, items_me, items_opp, opp_cuffed, saw, reverse,
+                 _reveal(mag, i, status), live, blank, False))) for i in candidates) / len(candidates)
+        elif item == BEER:
+            def eject(status):
+                rest_live, rest_blank = (live - 1, blank) if status == LIVE else (live, blank - 1)
+                if len(mag) == 1:
+                    return self._reload(hp_me, hp_opp, items_me, items_opp, opp_cuffed)
+                return self.value((hp_me, hp_opp, items_me, items_opp, opp_cuffed, saw, reverse,
+                                   mag[1:], rest_live, rest_blank, False))
+            return self._chance(mag, live, 0, eject)
+
+        return self.value((hp_me, hp_opp, items_me, items_opp, opp_cuffed, saw, reverse,
+                           mag, live, blank, False))
+
+    def _shoot(self, state, at_self):
+        hp_me, hp_opp, items_me, items_opp, opp_cuffed, saw, reverse, mag, live, blank, _ = state
+        damage = 2 if saw else 1
+
+        def fire(status):
+            rest_live, rest_blank = (live - 1, blank) if status == LIVE else (live, blank - 1)
+            hit = (status == LIVE) != reverse
+            me, opp = hp_me, hp_opp
+            if hit:
+                if at_self:
+                    me -= damage
+                    if me <= 0:
+                        return 0.0
+                else:
+                    opp -= damage
+                    if opp <= 0:
+                        return 1.0
+            keep_turn = at_self and not hit
+            if len(mag) == 1:
+                return self._reload(me, opp, items_me, items_opp, opp_cuffed)
+            rest = mag[1:]
+            if keep_turn:
+                return self.value((me, opp, items_me, items_opp, opp_cuffed, False, False,
+                                   rest, rest_live, rest_blank, False))
+            return self._pass_turn(me, opp, items_me, items_opp, opp_cuffed, rest, rest_live, rest_blank)
+
+        return self._chance(mag, live, 0, fire)
+
+    def _pass_turn(self, hp_me, hp_opp, items_me, items_opp, opp_cuffed, mag, live, blank):
+        """換對手行動（被銬的話跳過並解除手銬）；回傳原本玩家的勝率"""
+        if self.myopic:
+            items_me = items_opp = _NO_ITEMS
+        if opp_cuffed:
+            return self.value((hp_me, hp_opp, items_me, items_opp, False, False, False,
+                               mag, live, blank, False))
+        return 1.0 - self.value((hp_opp, hp_me, items_opp, items_me, False, False, False,
+                                 mag, live, blank, False))
+
+    def _reload(self, hp_me, hp_opp, items_me, items_opp, opp_cuffed):
+        if not self.carry_items:
+            items_me = items_opp = _NO_ITEMS
+        return self.reload_value(hp_me, hp_opp, items_me, items_opp, opp_cuffed)
+
+    def _reload_value(self, hp_me, hp_opp, items_me, items_opp, opp_cuffed):
+        """換彈（不發新道具）：combo 均勻、先手 1/2；回傳 me 的勝率"""
+        total = 0.0
+        for mag, live, blank, p in _FRESH_ROUNDS:
+            mine = self.value((hp_me, hp_opp, items_me, items_opp, opp_cuffed, False, False,
+                               mag, live, blank, False))
+            theirs = self._pass_turn(hp_me, hp_opp, items_me, items_opp, opp_cuffed, mag, live, blank)
+            total += p * 0.5 * (mine + theirs)
+        return total
+
+    @staticmethod
+    def _chance(mag, live, index, outcome):
+        """mag[index] 的機率節點：outcome(LIVE / BLANK) 依機率加權"""
+        p = _p_live(mag, live, index)
+        if p >= 1.0:
+            return outcome(LIVE)
+        if p <= 0.0:
+            return outcome(BLANK)
+        return p * outcome(LIVE) + (1.0 - p) * outcome(BLANK)
+
+
+# ================================================================
+#   Oracle opponent / regret
+# ================================================================
+class SolverPolicy:
+    """
+    predict() 介面同 MaskablePPO，可當 BuckshotEnv 的 opponent_model（oracle 對手）。
+    solver 需要完整的 GameState，所以直接讀 env.gs（obs 只用來對齊介面）。
+    """
+
+    def __init__(self, env, solver=None):
+        self.env = env
+        self.solver = solver or Solver()
+
+    def predict(self, obs, action_masks=None, deterministic=True):
+        return self.solver.best_action(self.env.gs), None
+
+
+def regret_report(policy, n_games=100, seed=0, solver=None, opponent=None):
+    """
+    policy 當 P2 玩 n_games，每個決策算 solver 的 regret = max Q - Q(選的動作)。
+    Q 是 solver 的近似（只在目前彈匣內精確，見 module docstring），不是真正的最佳解。
+    opponent: P1（預設 SolverPolicy）
+    """
+    from buckshot_env import BuckshotEnv
+
+    solver = solver or Solver()
+    env = BuckshotEnv()
+    env._debug_logged = True
+    env.opponent_model = opponent or SolverPolicy(env, solver)
+
+    regrets, wins = [], 0
+    t = time.time()
+    for g in range(n_games):
+        obs, _ = env.reset(seed=seed if g == 0 else None)
+        # P2 被銬住時 P1 可能在 reset 裡就打完整局
+        done, info = env.gs.phase == "game_end", {}
+        while not done:
+            mask = env.action_masks()
+            action, _ = policy.predict(obs, action_masks=mask, deterministic=True)
+            action = int(action)
+            if env.gs.p2.handcuffed and env.gs.phase == "item":
+                q = None            # 被銬：這一步會被跳過，沒有決策
+            else:
+                q = solver.action_values(env.gs)
+            if q is not None and not math.isnan(q[action]):
+                regrets.append(np.nanmax(q) - q[action])
+            obs, _, terminated, truncated, info = env.step(action)
+            done = terminated or truncated
+        wins += bool(info.get("win", False))
+    regrets = np.asarray(regrets)
+    elapsed = time.time() - t
+
+    print(f"\n{'='*60}")
+    print(f"Solver regret over {n_games} games ({len(regrets):,} P2 decisions, {elapsed:.1f}s)")
+    reload_model = "held items only" if solver.carry_items else "no items"
+    print(f"Reference: exact within the magazine; after a reload {reload_model}, no new deal")
+    print(f"{'='*60}")
+    print(f"Win rate:               {wins / n_games:.2%}")
+    print(f"Solver-best decisions:  {np.mean(regrets < 1e-9):.2%}")
+    print(f"Mean regret (win prob): {regrets.mean():.4f}")
+    print(f"p95 / max regret:       {np.percentile(regrets, 95):.4f} / {regrets.max():.4f}")
+    if solver.max_nodes is not None:
+        print(f"Budget fallbacks:       {solver.fallbacks:,} / {solver.decisions:,} solver calls "
+              f"(max_nodes={solver.max_nodes:,}, myopic after the turn)")
+    print(f"Transposition table:    {solver.cache_info()}")
+    print(f"{'='*60}\n")
+    return regrets
+
+
+class _RandomPolicy:
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+    def predict(self, obs, action_masks=None, deterministic=False):
+        return self.rng.choice(np.flatnonzero(action_masks)), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Expectimax solver: regret of a policy playing as P2")
+    parser.add_argument("model", nargs="?", help="MaskablePPO .zip or exported actor .npz (default: random P2)")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="Transposition table entries")
+    parser.add_argument("--carry-items", action="store_true",
+                        help="Keep held items across reloads (slower; still ignores the random new deal)")
+    parser.add_argument("--max-nodes", type=int, default=MAX_NODES,
+                        help="Per-decision node budget before the myopic fallback (0 = unbounded, offline only)")
+    args = parser.parse_args()
+
+    if args.model:
+        from actor_policy import load_policy
+        policy = load_policy(args.model, seed=args.seed)
+    else:
+        policy = _RandomPolicy(args.seed)
+    regret_report(policy, args.games, seed=args.seed, solver=Solver(args.cache_size, carry_items=args.carry_items,
+                                                                  max_nodes=args.max_nodes or None))
+
+
+if __name__ == "__main__":
+    main()
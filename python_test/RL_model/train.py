@@ -6,22 +6,30 @@ Self-play implementation using MaskablePPO from Stable-Baselines3
 import os
 import numpy as np
 import torch
-import tempfile
+from functools import partial
 from stable_baselines3.common.callbacks import BaseCallback
 from stable_baselines3.common.monitor import Monitor
 from sb3_contrib import MaskablePPO
 from buckshot_env import BuckshotEnv
+from actor_policy import NumpyActor, extract_actor_weights
+from shared_opponent import SharedActorWeights, SharedOpponent, OpponentRefreshWrapper
+
+POLICY_KWARGS = dict(
+    net_arch=[128, 128],  # Two hidden layers: 33 → 128 → 128 → 10
+    activation_fn=torch.nn.ReLU  # Change from default Tanh to ReLU
+)
 
 
 class SelfPlayCallback(BaseCallback):
     """
     Callback to update opponent model periodically during self-play training
     """
-    def __init__(self, update_freq=10000, metrics_callback=None, verbose=1):
+    def __init__(self, update_freq=10000, metrics_callback=None, shared_opponent=None, verbose=1):
         super().__init__(verbose)
         self.update_freq = update_freq
         self.opponent_update_count = 0
         self.metrics_callback = metrics_callback
+        self.shared_opponent = shared_opponent  # SharedActorWeights in subproc mode
 
     def _on_step(self) -> bool:
         # Update opponent every update_freq steps
@@ -36,20 +44,11 @@ class SelfPlayCallback(BaseCallback):
                 print(f"Opponent update count: {self.opponent_update_count + 1}")
                 print(f"{'='*60}\n")
 
-            # Create a frozen copy of the current policy by saving and reloading
-            # This ensures opponent doesn't update when self.model trains
-            with tempfile.TemporaryDirectory() as tmpdir:
-                temp_path = os.path.join(tmpdir, "temp_opponent")
-                self.model.save(temp_path)
-                frozen_opponent = MaskablePPO.load(temp_path, device=self.model.device)
-
-                # Update opponent in all environments with frozen copy
-                # Access unwrapped BuckshotEnv (not Monitor wrapper)
-                for env in self.training_env.envs:
-                    if hasattr(env, 'env'):
-                        env.env.opponent_model = frozen_opponent  # Unwrap Monitor
-                    else:
-                        env.opponent_model = frozen_opponent  # Fallback
+            if self.shared_opponent is not None:
+                # Subproc workers pick up the new weights at their next episode
+                self.shared_opponent.publish(extract_actor_weights(self.model.policy))
+            else:
+                self._set_frozen_opponent()
 
             self.opponent_update_count += 1
 
@@ -59,6 +58,19 @@ class SelfPlayCallback(BaseCallback):
 
         return True
 
+    def _set_frozen_opponent(self):
+        # Create a frozen in-memory copy of the current actor weights
+        # This ensures opponent doesn't update when self.model trains
+        frozen_opponent = NumpyActor(extract_actor_weights(self.model.policy))
+
+        # Update opponent in all environments with frozen copy
+        # Access unwrapped BuckshotEnv (not Monitor wrapper)
+        for env in self.training_env.envs:
+            if hasattr(env, 'env'):
+                env.env.opponent_model = frozen_opponent  # Unwrap Monitor
+            else:
+                env.opponent_model = frozen_opponent  # Fallback
+
 
 class MetricsCallback(BaseCallback):
     """
@@ -143,9 +155,19 @@ class MetricsCallback(BaseCallback):
         return True
 
 
-def make_env():
-    """Create a single environment instance"""
-    env = BuckshotEnv()
+def make_env(opponent_shm_name=None):
+    """
+    Create a single environment instance
+
+    Args:
+        opponent_shm_name: SharedActorWeights block to take the opponent from
+            (subproc mode); None leaves the opponent to SelfPlayCallback
+    """
+    if opponent_shm_name is None:
+        env = BuckshotEnv()
+    else:
+        env = BuckshotEnv(opponent_model=SharedOpponent(opponent_shm_name))
+        env = OpponentRefreshWrapper(env)
     env = Monitor(env)
     return env
 
@@ -160,7 +182,11 @@ def train(
     opponent_update_freq=10000,
     save_freq=50000,
     model_dir="models",
-    log_dir="logs"
+    log_dir="logs",
+    vec_env="dummy",
+    seed=None,
+    pretrain=None,
+    pretrain_epochs=5
 ):
     """
     Train Buckshot Roulette agent with self-play
@@ -176,6 +202,13 @@ def train(
         save_freq: Steps between model saves
         model_dir: Directory to save models
         log_dir: Directory for tensorboard logs
+        vec_env: "dummy" (all envs in this process), "subproc" (one worker
+            process per env, opponent weights shared via shared memory) or
+            "batched" (in-process, opponent decisions batched across envs)
+        seed: Seeds PPO and env i with seed + i (same seed → same run); None = random
+        pretrain: oracle_dataset.py shard directory; the actor is behavior-cloned
+            on it before PPO starts (and the first frozen opponent is that actor)
+        pretrain_epochs: Behavior cloning epochs over the pretrain dataset
     """
 
     # Create directories
@@ -199,7 +232,7 @@ def train(
     print("Buckshot Roulette Self-Play Training")
     print("="*60)
     print(f"Total timesteps: {total_timesteps:,}")
-    print(f"Parallel envs: {n_envs}")
+    print(f"Parallel envs: {n_envs} ({vec_env})")
     print(f"Learning rate: {learning_rate}")
     print(f"Batch size: {batch_size}")
     print(f"Steps per update: {n_steps}")
@@ -207,18 +240,24 @@ def train(
     print("="*60 + "\n")
 
     # Create vectorized environment (no opponent initially)
-    from stable_baselines3.common.vec_env import DummyVecEnv
-    env = DummyVecEnv([make_env for _ in range(n_envs)])
+    from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecMonitor
+    from batched_opponent import BatchedOpponentVecEnv
+    shared_opponent = None
+    if vec_env == "subproc":
+        shared_opponent = SharedActorWeights()
+        env = SubprocVecEnv([partial(make_env, shared_opponent.name) for _ in range(n_envs)])
+    elif vec_env == "batched":
+        # Bare BuckshotEnv (coroutine step); VecMonitor replaces per-env Monitor
+        env = VecMonitor(BatchedOpponentVecEnv([BuckshotEnv for _ in range(n_envs)]))
+    else:
+        env = DummyVecEnv([make_env for _ in range(n_envs)])
 
     # Create model with custom MLP architecture
     print("Creating MaskablePPO model with MLP architecture [128, 128]...")
     model = MaskablePPO(
         "MlpPolicy",
         env,
-        policy_kwargs=dict(
-            net_arch=[128, 128],  # Two hidden layers: 33 → 128 → 128 → 10
-            activation_fn=torch.nn.ReLU  # Change from default Tanh to ReLU
-        ),
+        policy_kwargs=POLICY_KWARGS,
         learning_rate=learning_rate,
         n_steps=n_steps,
         batch_size=batch_size,
@@ -229,19 +268,28 @@ def train(
         ent_coef=0.01,        # Entropy coefficient (encourage exploration)
         verbose=1,
         tensorboard_log=None,
+        seed=seed,            # Also seeds each env's game RNG via reset(seed)
         device=device         # Use GPU if available, otherwise CPU
     )
 
     print(f"Model created! Total parameters: ~21,000")
     print(f"Network: Input(33) → Hidden(128) → Hidden(128) → Output(10)\n")
 
+    if pretrain:
+        from oracle_dataset import ShardDataset, behavior_cloning
+        dataset = ShardDataset(pretrain)
+        print(f"Behavior cloning on {len(dataset):,} oracle samples from {pretrain}...")
+        behavior_cloning(model.policy, dataset, epochs=pretrain_epochs, seed=seed)
+        print()
+
     # Initialize opponent model in all environments (important for self-play to work from start)
     # Create a frozen copy to ensure opponent doesn't update during first interval
     print("Initializing opponent model in all environments...")
-    with tempfile.TemporaryDirectory() as tmpdir:
-        temp_path = os.path.join(tmpdir, "initial_opponent")
-        model.save(temp_path)
-        initial_opponent = MaskablePPO.load(temp_path, device=device)
+    if shared_opponent is not None:
+        # Workers load the published weights on their first reset
+        shared_opponent.publish(extract_actor_weights(model.policy))
+    else:
+        initial_opponent = NumpyActor(extract_actor_weights(model.policy))
 
         # Access unwrapped BuckshotEnv (not Monitor wrapper)
         for env_obj in env.envs:
@@ -260,6 +308,7 @@ def train(
     selfplay_callback = SelfPlayCallback(
         update_freq=opponent_update_freq,
         metrics_callback=metrics_callback,
+        shared_opponent=shared_opponent,
         verbose=1
     )
 
@@ -284,6 +333,10 @@ def train(
         model.save(interrupt_path)
         print(f"Model saved to {interrupt_path}")
 
+    finally:
+        if shared_opponent is not None:
+            shared_opponent.close()
+
     env.close()
     return model
 
@@ -367,6 +420,13 @@ if __name__ == "__main__":
     parser.add_argument("--timesteps", type=int, default=1_000_000, help="Total training timesteps")
     parser.add_argument("--n-envs", type=int, default=4, help="Number of parallel environments")
     parser.add_argument("--lr", type=float, default=3e-4, help="Learning rate")
+    parser.add_argument("--vec-env", choices=["dummy", "subproc", "batched"], default="dummy",
+                        help="Run envs in-process (dummy), one worker process per env (subproc), "
+                             "or in-process with batched opponent inference (batched)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for a reproducible run")
+    parser.add_argument("--pretrain", type=str, default=None,
+                        help="Behavior-clone the actor on an oracle_dataset.py directory before PPO")
+    parser.add_argument("--pretrain-epochs", type=int, default=5, help="Behavior cloning epochs")
 
     args = parser.parse_args()
 
@@ -374,7 +434,11 @@ if __name__ == "__main__":
         train(
             total_timesteps=args.timesteps,
             n_envs=args.n_envs,
-            learning_rate=args.lr
+            learning_rate=args.lr,
+            vec_env=args.vec_env,
+            seed=args.seed,
+            pretrain=args.pretrain,
+            pretrain_epochs=args.pretrain_epochs
         )
     elif args.eval:
         evaluate(args.eval, n_episodes=100)
@@ -382,4 +446,6 @@ if __name__ == "__main__":
         print("Usage:")
         print("  Train: python train.py --train")
         print("  Train with custom settings: python train.py --train --timesteps 2000000 --n-envs 8")
+        print("  Train across processes: python train.py --train --n-envs 32 --vec-env subproc")
+        print("  Warm-start from oracle data: python train.py --train --pretrain data/oracle")
         print("  Evaluate: python train.py --eval models/buckshot_final")
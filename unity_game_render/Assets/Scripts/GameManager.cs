@@ -3,6 +3,9 @@ using System.Collections;
 using System.Collections.Generic;
 using System.IO;
 using System.Diagnostics;
+using System.Collections.Concurrent;
+using System.Net.Sockets;
+using System.Threading;
 
 public class GameManager : MonoBehaviour
 {   
@@ -52,9 +55,24 @@ public class GameManager : MonoBehaviour
     TextMesh healthBlueText;
 
     // Python Processes
+    [Header("Python Bridge")]
+    public bool singleProcessBridge = true; // bridge.py（一個 process）；關閉則沿用兩個 script
     Process uartProcess;
     Process jsonProcess;
 
+    // Command transport：socket 推送（預設），關閉則輪詢 Commands/ 資料夾
+    [Header("Command Transport")]
+    public bool useCommandSocket = true;
+    public int commandPort = 50007;
+    Thread commandSocketThread;
+    volatile bool commandSocketRunning;
+    TcpClient commandSocket;
+    ConcurrentQueue<string> socketCommands = new ConcurrentQueue<string>();
+
+    // 結束時把 game_logs/events.bin 移到 session_logs/（capture_analytics.py 離線分析用）
+    [Header("Session Logs")]
+    public bool archiveSessionLog = true;
+
     // Maps
     Dictionary<string, GameObject> itemMap;
     Dictionary<string, string> spawnMap;
@@ -87,11 +105,16 @@ public class GameManager : MonoBehaviour
 
     void OnApplicationQuit()
     {
+        StopCommandSocket();
         StopPythonScripts();
 
         string scriptDir = Path.Combine(Application.dataPath, "..", "..", "python_code");
         string logsDir = Path.Combine(scriptDir, "game_logs");
 
+        // 封存失敗時保留 game_logs，不要連 events.bin 一起刪掉
+        if (archiveSessionLog && !ArchiveSessionLog(scriptDir, logsDir))
+            return;
+
         if (Directory.Exists(logsDir))
         {
             try
@@ -106,10 +129,47 @@ public class GameManager : MonoBehaviour
         }
     }
 
+    bool ArchiveSessionLog(string scriptDir, string logsDir)
+    {
+        string eventLog = Path.Combine(logsDir, "events.bin");
+        if (!File.Exists(eventLog))
+            return true;
+        try
+        {
+            string archiveDir = Path.Combine(scriptDir, "session_logs");
+            Directory.CreateDirectory(archiveDir);
+            string dst = Path.Combine(archiveDir, $"events_{System.DateTime.Now:yyyyMMdd_HHmmss}.bin");
+            File.Move(eventLog, dst);
+            UnityEngine.Debug.Log($"Archived session log to {dst}");
+            return true;
+        }
+        catch (System.Exception e)
+        {
+            UnityEngine.Debug.LogError($"Failed to archive session log (keeping game_logs): {e.Message}");
+            return false;
+        }
+    }
+
     void StartPythonScripts()
     {
         string pythonPath = "python"; // Or full path to python.exe if not in PATH
         string scriptDir = Path.Combine(Application.dataPath, "..", "..", "python_code");
+        string transportArgs = useCommandSocket ? $" --transport tcp --command-port {commandPort}" : "";
+
+        if (singleProcessBridge)
+        {
+            // UART 解碼 → 狀態轉移 → command 檔，同一個 process
+            string bridgeScript = Path.Combine(scriptDir, "bridge.py");
+            uartProcess = new Process();
+            uartProcess.StartInfo.FileName = pythonPath;
+            uartProcess.StartInfo.Arguments = $"\"{bridgeScript}\"" + transportArgs;
+            uartProcess.StartInfo.WorkingDirectory = scriptDir;
+            uartProcess.StartInfo.UseShellExecute = false;
+            uartProcess.StartInfo.CreateNoWindow = true;
+            uartProcess.Start();
+            UnityEngine.Debug.Log("Started Python bridge script.");
+            return;
+        }
         
         // Start UART to JSON script
         string uartScript = Path.Combine(scriptDir, "python_uart_to_json.py");
@@ -126,7 +186,7 @@ public class GameManager : MonoBehaviour
         string jsonScript = Path.Combine(scriptDir, "python_json_to_command.py");
         jsonProcess = new Process();
         jsonProcess.StartInfo.FileName = pythonPath;
-        jsonProcess.StartInfo.Arguments = $"\"{jsonScript}\"";
+        jsonProcess.StartInfo.Arguments = $"\"{jsonScript}\"" + transportArgs;
         jsonProcess.StartInfo.WorkingDirectory = scriptDir;
         jsonProcess.StartInfo.UseShellExecute = false;
         jsonProcess.StartInfo.CreateNoWindow = true;
@@ -139,6 +199,8 @@ public class GameManager : MonoBehaviour
         if (uartProcess != null && !uartProcess.HasExited)
         {
             uartProcess.Kill();
+            // Kill() 不等 process 結束；Windows 上 events.bin 還開著就無法搬移
+            uartProcess.WaitForExit(1000);
             uartProcess.Dispose();
             UnityEngine.Debug.Log("Stopped UART to JSON Python script.");
         }
@@ -146,6 +208,7 @@ public class GameManager : MonoBehaviour
         if (jsonProcess != null && !jsonProcess.HasExited)
         {
             jsonProcess.Kill();
+            jsonProcess.WaitForExit(1000);
             jsonProcess.Dispose();
             UnityEngine.Debug.Log("Stopped JSON to Command Python script.");
         }
@@ -172,6 +235,21 @@ public class GameManager : MonoBehaviour
     }
     IEnumerator CommandPoller()
     {
+        if (useCommandSocket)
+        {
+            // socket 由背景 thread 收，這裡每個 frame 把收到的 command 移到 commandQueue
+            StartCommandSocket();
+            while (true)
+            {
+                while (socketCommands.TryDequeue(out string line))
+                {
+                    commandQueue.Enqueue(line);
+                    UnityEngine.Debug.Log($"[CommandSocket] 新 command: {line}");
+                }
+                yield return null;
+            }
+        }
+
         while (true)
         {
             LoadAndDeleteCommandsOnce();
@@ -180,6 +258,106 @@ public class GameManager : MonoBehaviour
             yield return new WaitForSeconds(0.2f);
         }
     }
+    void StartCommandSocket()
+    {
+        commandSocketRunning = true;
+        commandSocketThread = new Thread(CommandSocketLoop) { IsBackground = true, Name = "CommandSocket" };
+        commandSocketThread.Start();
+    }
+
+    void StopCommandSocket()
+    {
+        commandSocketRunning = false;
+        try { commandSocket?.Close(); } catch (System.Exception) { }
+        commandSocketThread?.Join(500);
+    }
+
+    // 背景 thread：連到 Python 的 CommandServer，一行一個 command；斷線就重連
+    // 協定：連線第一行 "@<session>"，每個 batch 是 "#<seq> <n>" 加 n 行 command。
+    // 收齊整個 batch 才排進佇列；Python 斷線後會整批重送，seq 已執行過的 batch 直接丟掉，
+    // 所以開槍 / 道具不會因為重送而播兩次。
+    void CommandSocketLoop()
+    {
+        string session = null;
+        long lastSeq = -1;
+        while (commandSocketRunning)
+        {
+            try
+            {
+                commandSocket = new TcpClient();
+                commandSocket.NoDelay = true;
+                commandSocket.Connect("127.0.0.1", commandPort);
+                using (var reader = new StreamReader(commandSocket.GetStream()))
+                {
+                    string line;
+                    List<string> batch = null;   // 收到一半的 batch；斷線就丟掉
+                    long batchSeq = -1;
+                    int batchSize = 0;
+                    while (commandSocketRunning && (line = reader.ReadLine()) != null)
+                    {
+                        line = line.Trim();
+                        if (string.IsNullOrEmpty(line))
+                            continue;
+
+                        if (line.StartsWith("@"))
+                        {
+                            // 新的 Python process：seq 從 0 重新開始
+                            string id = line.Substring(1);
+                            if (id != session)
+                            {
+                                session = id;
+                                lastSeq = -1;
+                            }
+                            continue;
+                        }
+
+                        if (line.StartsWith("#"))
+                        {
+                            string[] parts = line.Substring(1).Split(' ');
+                            batchSeq = long.Parse(parts[0]);
+                            batchSize = int.Parse(parts[1]);
+                            batch = new List<string>(batchSize);
+                        }
+                        else if (batch != null)
+                        {
+                            batch.Add(line);
+                        }
+                        else
+                        {
+                            socketCommands.Enqueue(line);   // 沒有 header（舊版 server）
+                            continue;
+                        }
+
+                        if (batch.Count < batchSize)
+                            continue;
+                        if (batchSeq > lastSeq)
+                        {
+                            foreach (string cmd in batch)
+                                socketCommands.Enqueue(cmd);
+                            lastSeq = batchSeq;
+                        }
+                        else
+                        {
+                            UnityEngine.Debug.Log($"[CommandSocket] 略過重送的 batch #{batchSeq}");
+                        }
+                        batch = null;
+                    }
+                }
+            }
+            catch (System.Exception)
+            {
+                // Python 端還沒啟動或已斷線，稍後重連
+            }
+            finally
+            {
+                commandSocket?.Close();
+            }
+
+            if (commandSocketRunning)
+                Thread.Sleep(200);
+        }
+    }
+
     void LoadAndDeleteCommandsOnce()
     {
         string dirPath = Path.Combine(Application.dataPath, "..", "..", "Commands");
@@ -194,16 +372,21 @@ public class GameManager : MonoBehaviour
         {
             try
             {
-                string line = File.ReadAllText(file).Trim();
+                // 一個檔案 = 一次狀態轉移的所有 command，一行一個（Python 端 atomic rename 寫入）
+                string[] lines = File.ReadAllLines(file);
 
                 File.Delete(file);
 
-                if (string.IsNullOrEmpty(line))
-                    continue;
+                foreach (string raw in lines)
+                {
+                    string line = raw.Trim();
+                    if (string.IsNullOrEmpty(line))
+                        continue;
 
-                commandQueue.Enqueue(line);
+                    commandQueue.Enqueue(line);
 
-                UnityEngine.Debug.Log($"[CommandPoller] 新 command: {Path.GetFileName(file)} -> {line}");
+                    UnityEngine.Debug.Log($"[CommandPoller] 新 command: {Path.GetFileName(file)} -> {line}");
+                }
             }
             catch (IOException)
             {